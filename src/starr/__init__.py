@@ -1,9 +1,33 @@
-import starr.simulation
-import starr.simulation_object
-import starr.geometry_component
-import starr.physics_component
-import starr.graphics_component
-import starr.canvas
-import starr.topology
+"""
+starr, physics based mechanical simulations of 2D objects.
+
+The submodules and the main classes are imported on first access, so that
+import starr does not load matplotlib, descartes or the video writer. These
+are only imported once a Canvas or GraphicsComponent is actually used (see
+tests/test_imports.py).
+"""
+
+import importlib
+
+_submodules = ["simulation", "simulation_object", "geometry_component",
+               "physics_component", "graphics_component", "canvas",
+               "topology"]
+_classes = {"Simulation": "starr.simulation",
+            "SimulationObject": "starr.simulation_object",
+            "GeometryComponent": "starr.geometry_component",
+            "PhysicsComponent": "starr.physics_component",
+            "GraphicsComponent": "starr.graphics_component",
+            "Canvas": "starr.canvas"}
 __all__ = ["Simulation", "SimulationObject", "GeometryComponent",
            "PhysicsComponent", "GraphicsComponent", "Canvas"]
+
+
+def __getattr__(name):
+    if name in _classes:
+        return getattr(importlib.import_module(_classes[name]), name)
+    if name in _submodules:
+        return importlib.import_module("starr."+name)
+    raise AttributeError("module 'starr' has no attribute '{}'".format(name))
+
+def __dir__():
+    return sorted(list(globals())+list(_classes)+_submodules)
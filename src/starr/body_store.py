@@ -0,0 +1,209 @@
+"""
+A structure-of-arrays store for the state of all bodies in a simulation.
+
+Positions and rotations are stored per SimulationObject, velocities,
+accelerations, masses, energies and momenta per PhysicsComponent (periodic
+clones share the physics component of the object they were cloned from).
+Objects and physics components bound to a store read and write their state
+through properties which index into the contiguous arrays, so integration,
+energy and momentum can be computed for all bodies in single vectorized
+operations.
+"""
+
+import numpy as np
+
+
+class StoredAttribute():
+    """
+    descriptor for an attribute which lives in the array of the same name of a
+    BodyStore while its owner is attached to a store, and in the instance
+    otherwise
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = '_'+name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if instance.store is None:
+            return getattr(instance, self.private_name)
+        return getattr(instance.store, self.name)[instance.store_index]
+
+    def __set__(self, instance, value):
+        if instance.store is None:
+            setattr(instance, self.private_name, value)
+        else:
+            getattr(instance.store, self.name)[instance.store_index] = value
+
+
+class Stored():
+    """
+    mixin for classes whose StoredAttributes can be bound to a BodyStore
+    """
+    store = None
+    store_index = None
+    stored_attributes = ()
+
+    def attach(self, store, index):
+        self.store = store
+        self.store_index = index
+
+    def detach(self):
+        if self.store is None:
+            return
+        values = {}
+        for name in self.stored_attributes:
+            values[name] = np.copy(getattr(self, name))
+            if values[name].ndim == 0:
+                values[name] = values[name].item()
+        self.store = None
+        self.store_index = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+class BodyStore():
+
+    def __init__(self):
+        self.objects = []
+        self.bodies = []
+        self.position = np.zeros((0, 2))
+        self.rotation = np.zeros(0)
+        self.object_body = np.zeros(0, dtype=int)
+        self.object_group = np.zeros(0, dtype=int)
+        self.velocity = np.zeros((0, 2))
+        self.acceleration = np.zeros((0, 2))
+        self.momentum = np.zeros((0, 2))
+        self.mass = np.zeros(0)
+        self.kinetic_energy = np.zeros(0)
+        self.static = np.zeros(0, dtype=bool)
+
+    def sync(self, objects, groups=None):
+        """
+        makes sure that exactly the given objects (and their physics
+        components) are bound to the store, rebuilding the arrays if the
+        objects have changed. groups is an optional list with the group index
+        of every object.
+        """
+        if len(objects) == len(self.objects) and all(
+                obj is stored for obj, stored in zip(objects, self.objects)):
+            if groups is not None:
+                self.object_group = np.array(groups, dtype=int)
+            return
+        self.rebuild(objects, groups)
+
+    def rebuild(self, objects, groups=None):
+        bodies = []
+        body_index = {}
+        object_body = np.zeros(len(objects), dtype=int)
+        for i_obj, obj in enumerate(objects):
+            key = id(obj.physics)
+            if key not in body_index:
+                body_index[key] = len(bodies)
+                bodies.append(obj.physics)
+            object_body[i_obj] = body_index[key]
+
+        position = np.array([obj.position for obj in objects],
+                            dtype=float).reshape(-1, 2)
+        rotation = np.array([obj.rotation for obj in objects], dtype=float)
+        velocity = np.array([body.velocity for body in bodies],
+                            dtype=float).reshape(-1, 2)
+        acceleration = np.array([body.acceleration for body in bodies],
+                                dtype=float).reshape(-1, 2)
+        momentum = np.array([body.momentum for body in bodies],
+                            dtype=float).reshape(-1, 2)
+        mass = np.array([body.mass for body in bodies], dtype=float)
+        kinetic_energy = np.array([body.kinetic_energy for body in bodies],
+                                  dtype=float)
+        static = np.array([body.static for body in bodies], dtype=bool)
+
+        new_objects = set(id(obj) for obj in objects)
+        for obj in self.objects:
+            if id(obj) not in new_objects:
+                obj.detach()
+        new_bodies = set(id(body) for body in bodies)
+        for body in self.bodies:
+            if id(body) not in new_bodies:
+                body.detach()
+
+        self.objects = list(objects)
+        self.bodies = bodies
+        self.position = position
+        self.rotation = rotation
+        self.object_body = object_body
+        if groups is None:
+            self.object_group = np.arange(len(objects))
+        else:
+            self.object_group = np.array(groups, dtype=int)
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.momentum = momentum
+        self.mass = mass
+        self.kinetic_energy = kinetic_energy
+        self.static = static
+
+        for i_obj, obj in enumerate(self.objects):
+            obj.attach(self, i_obj)
+        for i_body, body in enumerate(self.bodies):
+            body.attach(self, i_body)
+
+    def body_index(self, objects):
+        """
+        indices of the bodies (physics components) of the given objects
+        """
+        object_index = [obj.store_index for obj in objects]
+        return self.object_body[object_index]
+
+    def integrate(self, time_step):
+        """
+        same update as PhysicsComponent.update_kinematics for all bodies
+        """
+        self.velocity += self.acceleration
+        self.position += time_step*self.velocity[self.object_body]
+        self.acceleration[:] = 0.
+        self.update_energy()
+
+    def update_energy(self):
+        speed_squared = np.sum(self.velocity**2, axis=1)
+        self.kinetic_energy[:] = 0.5*self.mass*speed_squared
+        self.momentum[:] = self.mass[:, None]*self.velocity
+
+    def group_mean(self, values):
+        """
+        mean of a per object quantity over the objects of each group, objects
+        with a negative group index (e.g. the world buffer) are ignored
+        """
+        grouped = self.object_group >= 0
+        group = self.object_group[grouped]
+        values = values[grouped]
+        counts = np.bincount(group)
+        if values.ndim == 1:
+            return np.bincount(group, weights=values)/counts
+        means = np.zeros((counts.size, values.shape[1]))
+        for column in range(values.shape[1]):
+            means[:, column] = np.bincount(group,
+                                           weights=values[:, column])/counts
+        return means
+
+    def get_energy(self):
+        """
+        mean kinetic energy of the groups, as in Simulation.report_diags
+        """
+        group_energy = self.group_mean(self.kinetic_energy[self.object_body])
+        return np.mean(group_energy)
+
+    def get_momentum(self):
+        group_momentum = self.group_mean(self.momentum[self.object_body])
+        return np.mean(group_momentum, axis=0)
+
+    def get_max_velocity(self):
+        """
+        maximum over the groups of the speed of the first object of a group
+        """
+        first = np.ones(self.object_group.size, dtype=bool)
+        first[1:] = self.object_group[1:] != self.object_group[:-1]
+        first &= self.object_group >= 0
+        speed = np.linalg.norm(self.velocity[self.object_body[first]], axis=1)
+        return np.max(speed)
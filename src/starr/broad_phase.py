@@ -0,0 +1,365 @@
+"""
+Implements broad-phase collision detection used for physics based mechanical
+simulations. A broad-phase receives the axis aligned bounding boxes of all
+objects taking part in a step and returns the index pairs which may be in
+contact. Only these pairs are passed to the (expensive) shapely narrow-phase.
+Classes:
+BroadPhase(abstract)
+BruteForce
+SpatialHash
+SweepAndPrune
+"""
+
+import itertools
+from abc import ABC, abstractmethod
+import numpy as np
+import shapely.geometry
+from shapely.prepared import prep
+
+
+def get_bounds(objects):
+    """
+    returns a (n_objects, 4) array of (minx, miny, maxx, maxy) bounding boxes
+    """
+    bounds = np.zeros((len(objects), 4))
+    for i_obj, obj in enumerate(objects):
+        bounds[i_obj, :] = obj.geometry.bounds()
+    return bounds
+
+def bounds_overlap(bounds, pairs):
+    """
+    for an (n_pairs, 2) array of indices into bounds, returns a boolean mask
+    of the pairs whose bounding boxes overlap
+    """
+    b1 = bounds[pairs[:, 0]]
+    b2 = bounds[pairs[:, 1]]
+    return ((b1[:, 0] <= b2[:, 2]) & (b2[:, 0] <= b1[:, 2]) &
+            (b1[:, 1] <= b2[:, 3]) & (b2[:, 1] <= b1[:, 3]))
+
+def periodic_bounds_overlap(bounds, pairs, box):
+    """
+    bounds_overlap in a periodic box of side lengths box centred at the
+    origin, the bounding boxes are compared at their closest periodic images
+    (minimum image convention)
+    """
+    centers = 0.5*(bounds[:, :2]+bounds[:, 2:])
+    half = 0.5*(bounds[:, 2:]-bounds[:, :2])
+    delta = centers[pairs[:, 1]]-centers[pairs[:, 0]]
+    delta -= box*np.round(delta/box)
+    reach = half[pairs[:, 0]]+half[pairs[:, 1]]
+    return np.all(np.abs(delta) <= reach, axis=1)
+
+def make_broad_phase(name, **kws):
+    factory_dict = {'brute_force': BruteForce,
+                    'spatial_hash': SpatialHash,
+                    'sweep_and_prune': SweepAndPrune}
+    if name not in factory_dict:
+        raise ValueError("unknown broad phase: {}, ".format(name) +
+                         "choose from {}".format(list(factory_dict.keys())))
+    return factory_dict[name](**kws)
+
+
+class BroadPhase(ABC):
+
+    box = None
+
+    def set_box(self, box):
+        """
+        periodic box of side lengths box (centred at the origin) or None.
+        With a box, pairs are also reported across the edges of the box, the
+        caller moves the second object of a pair to its closest periodic
+        image (minimum image convention).
+        """
+        self.box = box
+
+    @abstractmethod
+    def candidate_pairs(self, bounds, polygons=None, keys=None):
+        """
+        returns a list of index pairs (i, j) with i < j which may be in
+        contact. polygons is an optional list of shapely polygons in the same
+        order as bounds which may be used to refine the search. keys is an
+        optional list of hashable object identities, used by broad-phases
+        which keep state between steps to detect a change of objects.
+        """
+        pass
+
+
+class BruteForce(BroadPhase):
+    """
+    every pair of objects is a candidate, O(n**2). In a periodic box only
+    the pairs whose bounding boxes overlap at their closest images are
+    reported, so far apart objects are not moved to an image for nothing.
+    """
+
+    def candidate_pairs(self, bounds, polygons=None, keys=None):
+        pairs = list(itertools.combinations(range(bounds.shape[0]), 2))
+        if self.box is None or len(pairs) == 0:
+            return pairs
+        pairs = np.array(pairs)
+        pairs = pairs[periodic_bounds_overlap(bounds, pairs, self.box)]
+        return [tuple(pair) for pair in pairs.tolist()]
+
+
+class SpatialHash(BroadPhase):
+    """
+    uniform grid (cell list) broad-phase. Objects are binned into square cells
+    by their bounding box on every call, only objects sharing a cell (and
+    having overlapping bounding boxes) are reported as candidates.
+
+    Objects which would cover more than max_cells cells (e.g. the world
+    buffer) are not binned. Instead they are tested against the occupied cells
+    only, using the polygon of the object if it is available. This keeps a
+    ring shaped buffer from being paired with every object in the interior.
+    """
+
+    def __init__(self, cell_size=None, max_cells=64):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self._prepared = {}
+
+    def get_cell_size(self, extent):
+        if self.cell_size is not None:
+            return self.cell_size
+        median = np.median(extent)
+        small = extent[extent <= 4.*median]
+        return np.max(small)
+
+    def cell_ranges(self, bounds, cell_size):
+        lower = np.floor(bounds[:, :2]/cell_size).astype(np.int64)
+        upper = np.floor(bounds[:, 2:]/cell_size).astype(np.int64)
+        return lower, upper
+
+    def candidate_pairs(self, bounds, polygons=None, keys=None):
+        n_objects = bounds.shape[0]
+        if n_objects < 2:
+            return []
+        extent = np.max(bounds[:, 2:]-bounds[:, :2], axis=1)
+        cell_size = self.get_cell_size(extent)
+        if cell_size <= 0.:
+            return BruteForce().candidate_pairs(bounds)
+        if self.box is not None:
+            return self.periodic_candidate_pairs(bounds, cell_size)
+        lower, upper = self.cell_ranges(bounds, cell_size)
+        n_cells = np.prod(upper-lower+1, axis=1)
+        large = n_cells > self.max_cells
+
+        cells = {}
+        for i_obj in np.flatnonzero(~large):
+            for ix in range(lower[i_obj, 0], upper[i_obj, 0]+1):
+                for iy in range(lower[i_obj, 1], upper[i_obj, 1]+1):
+                    cells.setdefault((ix, iy), []).append(i_obj)
+
+        pairs = []
+        for members in cells.values():
+            if len(members) > 1:
+                pairs += itertools.combinations(members, 2)
+
+        large_objects = np.flatnonzero(large)
+        self.prune_prepared(large_objects, polygons)
+        for i_large in large_objects:
+            for i_obj in self.query_large(i_large, lower, upper, cells,
+                                          cell_size, polygons):
+                pairs.append((i_obj, i_large))
+        pairs += itertools.combinations(large_objects, 2)
+
+        if len(pairs) == 0:
+            return []
+        pairs = np.sort(np.array(pairs, dtype=np.int64), axis=1)
+        pairs = np.unique(pairs, axis=0)
+        pairs = pairs[bounds_overlap(bounds, pairs)]
+        return [tuple(pair) for pair in pairs.tolist()]
+
+    def periodic_candidate_pairs(self, bounds, cell_size):
+        """
+        candidate pairs in the periodic box: the cells are stretched so that
+        a whole number of them fits into the box and cell indices wrap
+        around, every object is binned
+        """
+        n_cells = np.maximum(np.floor(self.box/cell_size), 1).astype(np.int64)
+        cell_size = self.box/n_cells
+        lower = np.floor((bounds[:, :2]+0.5*self.box)/cell_size).astype(np.int64)
+        upper = np.floor((bounds[:, 2:]+0.5*self.box)/cell_size).astype(np.int64)
+        upper = np.minimum(upper, lower+n_cells-1)
+
+        cells = {}
+        for i_obj in range(bounds.shape[0]):
+            for ix in range(lower[i_obj, 0], upper[i_obj, 0]+1):
+                for iy in range(lower[i_obj, 1], upper[i_obj, 1]+1):
+                    cell = (ix % n_cells[0], iy % n_cells[1])
+                    cells.setdefault(cell, []).append(i_obj)
+
+        pairs = []
+        for members in cells.values():
+            if len(members) > 1:
+                pairs += itertools.combinations(members, 2)
+        if len(pairs) == 0:
+            return []
+        pairs = np.sort(np.array(pairs, dtype=np.int64), axis=1)
+        pairs = np.unique(pairs, axis=0)
+        pairs = pairs[periodic_bounds_overlap(bounds, pairs, self.box)]
+        return [tuple(pair) for pair in pairs.tolist()]
+
+    def query_large(self, i_large, lower, upper, cells, cell_size, polygons):
+        """
+        returns the objects in occupied cells touched by a large object
+        """
+        if polygons is not None:
+            prepared = self.get_prepared(polygons[i_large])
+        else:
+            prepared = None
+        members = set()
+        for cell, cell_members in cells.items():
+            if (cell[0] < lower[i_large, 0] or cell[0] > upper[i_large, 0] or
+                cell[1] < lower[i_large, 1] or cell[1] > upper[i_large, 1]):
+                continue
+            if prepared is not None:
+                box = shapely.geometry.box(cell[0]*cell_size,
+                                           cell[1]*cell_size,
+                                           (cell[0]+1)*cell_size,
+                                           (cell[1]+1)*cell_size)
+                if not prepared.intersects(box):
+                    continue
+            members.update(cell_members)
+        return members
+
+    def prune_prepared(self, large_objects, polygons):
+        if polygons is None:
+            return
+        keep = set(id(polygons[i_large]) for i_large in large_objects)
+        for key in list(self._prepared.keys()):
+            if key not in keep:
+                del self._prepared[key]
+
+    def get_prepared(self, polygon):
+        key = id(polygon)
+        if key not in self._prepared or self._prepared[key][0] is not polygon:
+            self._prepared[key] = (polygon, prep(polygon))
+        return self._prepared[key][1]
+
+
+class SweepAndPrune(BroadPhase):
+    """
+    incremental sweep-and-prune broad-phase. For each axis the bounding box
+    endpoints are kept in a sorted list between calls. As objects only move a
+    short distance per step the lists are nearly sorted, so they are re-sorted
+    with an insertion sort. Every swap of a lower with an upper endpoint
+    means a pair starts or stops overlapping on that axis, which is used to
+    update the set of overlapping pairs without testing all of them.
+
+    After each call the pairs which started or stopped overlapping are
+    available in self.added and self.removed.
+    """
+
+    def __init__(self):
+        self.keys = None
+        self.pairs = set()
+        self.added = set()
+        self.removed = set()
+        self.axes = None
+
+    def set_box(self, box):
+        if box is not None:
+            raise ValueError("sweep_and_prune does not support periodic "+
+                             "boxes, use brute_force or spatial_hash")
+
+    def candidate_pairs(self, bounds, polygons=None, keys=None):
+        self.update(bounds, keys=keys)
+        return sorted(self.pairs)
+
+    def update(self, bounds, keys=None):
+        """
+        updates the overlapping pairs for new bounds, returns the sets of pairs
+        which were added and removed since the previous call
+        """
+        if keys is None:
+            keys = list(range(bounds.shape[0]))
+        else:
+            keys = list(keys)
+        if keys != self.keys:
+            previous = self.pairs
+            self.keys = keys
+            self.initialise(bounds)
+            self.added = self.pairs - previous
+            self.removed = previous - self.pairs
+            return self.added, self.removed
+        self.added = set()
+        self.removed = set()
+        for axis in range(2):
+            self.sort_axis(axis, bounds)
+        return self.added, self.removed
+
+    def initialise(self, bounds):
+        n_objects = bounds.shape[0]
+        self.axes = []
+        for axis in range(2):
+            owners = np.tile(np.arange(n_objects), 2)
+            is_max = np.repeat([False, True], n_objects)
+            values = np.concatenate([bounds[:, axis], bounds[:, axis+2]])
+            order = np.lexsort((is_max, values))
+            self.axes.append([owners[order].tolist(), is_max[order].tolist()])
+
+        pairs = set()
+        owners, is_max = self.axes[0]
+        active = set()
+        for owner, upper in zip(owners, is_max):
+            if upper:
+                active.discard(owner)
+                continue
+            for other in active:
+                if (bounds[owner, 1] <= bounds[other, 3] and
+                    bounds[other, 1] <= bounds[owner, 3]):
+                    pairs.add((min(owner, other), max(owner, other)))
+            active.add(owner)
+        self.pairs = pairs
+
+    def sort_axis(self, axis, bounds):
+        owners, is_max = self.axes[axis]
+        lower = bounds[:, axis].tolist()
+        upper = bounds[:, axis+2].tolist()
+        values = [upper[owner] if is_upper else lower[owner]
+                  for owner, is_upper in zip(owners, is_max)]
+        for i_end in range(1, len(values)):
+            j_end = i_end
+            value = values[j_end]
+            # ties are broken as in initialise, lower before upper
+            # endpoints, so that touching boxes overlap
+            while j_end > 0 and (values[j_end-1] > value or
+                                 (values[j_end-1] == value and
+                                  is_max[j_end-1] and not is_max[j_end])):
+                owner = owners[j_end]
+                other = owners[j_end-1]
+                if is_max[j_end] and not is_max[j_end-1]:
+                    self.remove_pair(owner, other)
+                elif not is_max[j_end] and is_max[j_end-1]:
+                    if self.overlap(bounds, owner, other):
+                        self.add_pair(owner, other)
+                values[j_end], values[j_end-1] = values[j_end-1], values[j_end]
+                owners[j_end], owners[j_end-1] = other, owner
+                is_max[j_end], is_max[j_end-1] = is_max[j_end-1], is_max[j_end]
+                j_end -= 1
+
+    def overlap(self, bounds, owner, other):
+        return (bounds[owner, 0] <= bounds[other, 2] and
+                bounds[other, 0] <= bounds[owner, 2] and
+                bounds[owner, 1] <= bounds[other, 3] and
+                bounds[other, 1] <= bounds[owner, 3])
+
+    def add_pair(self, owner, other):
+        pair = (min(owner, other), max(owner, other))
+        if pair in self.pairs:
+            return
+        self.pairs.add(pair)
+        if pair in self.removed:
+            self.removed.discard(pair)
+        else:
+            self.added.add(pair)
+
+    def remove_pair(self, owner, other):
+        pair = (min(owner, other), max(owner, other))
+        if pair not in self.pairs:
+            return
+        self.pairs.discard(pair)
+        if pair in self.added:
+            self.added.discard(pair)
+        else:
+            self.removed.add(pair)
@@ -1,5 +1,73 @@
-from matplotlib.animation import FFMpegWriter
-import matplotlib.pyplot as plt
+import subprocess
+import matplotlib
+from matplotlib.animation import adjusted_figsize
+
+
+class BufferWriter():
+    """
+    writes movie frames as raw rgba video to an ffmpeg process. A frame is
+    either the whole figure rendered by savefig or the already rendered
+    (e.g. blitted) canvas buffer, which avoids rendering the figure again.
+    """
+
+    frame_format = 'rgba'
+
+    def __init__(self, fps=10, codec='h264', bitrate=None):
+        self.fps = fps
+        self.codec = codec
+        self.bitrate = bitrate
+        self.proc = None
+
+    def setup(self, fig, outfile, dpi=100):
+        self.fig = fig
+        self.outfile = outfile
+        self.dpi = dpi
+        width, height = fig.get_size_inches()
+        if self.codec == 'h264':
+            # h264 needs an even number of pixels in both directions
+            width, height = adjusted_figsize(width, height, dpi, 2)
+            fig.set_size_inches(width, height, forward=True)
+        self.size_inches = (width, height)
+        self.frame_size = (int(round(width*dpi)), int(round(height*dpi)))
+        command = [matplotlib.rcParams['animation.ffmpeg_path'],
+                   '-f', 'rawvideo', '-vcodec', 'rawvideo',
+                   '-s', '%dx%d' % self.frame_size,
+                   '-pix_fmt', self.frame_format,
+                   '-framerate', str(self.fps), '-loglevel', 'error',
+                   '-i', 'pipe:', '-vcodec', self.codec]
+        if self.codec == 'h264':
+            command += ['-pix_fmt', 'yuv420p']
+        if self.bitrate is not None:
+            command += ['-b', '%dk' % self.bitrate]
+        command += ['-y', outfile]
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+
+    def grab_frame(self, from_buffer=False, **savefig_kwargs):
+        if self.proc is None:
+            raise RuntimeError("writer has not been set up, call setup() first")
+        if from_buffer:
+            self.proc.stdin.write(self.fig.canvas.buffer_rgba())
+            return
+        # the figure may have been resized since setup
+        self.fig.set_size_inches(*self.size_inches)
+        self.fig.savefig(self.proc.stdin, format=self.frame_format,
+                         dpi=self.dpi, **savefig_kwargs)
+
+    def finish(self):
+        if self.proc is None:
+            raise RuntimeError("writer has not been set up, call setup() first")
+        proc = self.proc
+        self.proc = None
+        proc.stdin.close()
+        error = proc.stderr.read()
+        proc.wait()
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(
+                proc.returncode, proc.args, stderr=error.decode(errors='replace'))
+
+
 class Canvas():
 
     def __init__(self, fig, axes):
@@ -12,23 +80,80 @@ class Canvas():
         self.axes.set_ylim([-view_port, view_port])
         self.fig.canvas.draw()
         self.report_text = None
-        background = fig.canvas.copy_from_bbox(axes.bbox)
+        self.renderer = None
+        self.animated = []
+        self.background = fig.canvas.copy_from_bbox(axes.bbox)
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
         self.writer = None
 
+    def on_draw(self, event):
+        """
+        caches the background (everything but the animated artists) after
+        every full redraw of the figure
+        """
+        if self.fig.canvas.is_saving():
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.axes.bbox)
+        for artist in self.animated:
+            self.axes.draw_artist(artist)
+
+    def add_animated(self, artist):
+        """
+        registers an artist which changes every frame, animated artists are
+        excluded from the cached background and drawn on top of it by blit
+        """
+        artist.set_animated(True)
+        self.animated.append(artist)
+
+    def blit(self):
+        """
+        restores the cached background and redraws only the animated artists
+        """
+        self.fig.canvas.restore_region(self.background)
+        for artist in self.animated:
+            self.axes.draw_artist(artist)
+        self.fig.canvas.blit(self.axes.bbox)
+
     def set_view_port(self, view_port):
         self.view_port = view_port
         self.axes.set_xlim([-view_port, view_port])
         self.axes.set_ylim([-view_port, view_port])
         self.fig.canvas.draw()
 
+    def pixel_size(self):
+        """
+        width of one screen pixel in data units
+        """
+        return 2.*self.view_port/self.axes.bbox.width
+
     def saving(self, dpi=100, fps=10):
         self.fps = fps
-        self.writer = FFMpegWriter(fps=self.fps)
+        self.writer = BufferWriter(fps=self.fps)
         self.writer.setup(self.fig, "writer_test.mp4", dpi)
+        # setup may round the figure to an even number of pixels
+        self.fig.canvas.draw()
+
+    def pipes_buffer(self):
+        """
+        True if the rendered canvas buffer can be written to the writer as a
+        frame, i.e. it is an rgba buffer of the size of the movie frames
+        """
+        canvas = self.fig.canvas
+        return (self.writer.frame_format == 'rgba' and
+                hasattr(canvas, 'buffer_rgba') and
+                canvas.get_width_height(physical=True) ==
+                self.writer.frame_size)
 
     def write(self):
         if self.writer is None:
             raise ValueError("writer has not been initialised, try calling Canvas.saving()")
+        if len(self.animated) > 0:
+            self.blit()
+            if self.pipes_buffer():
+                # the blitted buffer is the frame, grab_frame would render
+                # the whole figure again
+                self.writer.grab_frame(from_buffer=True)
+                return
         self.writer.grab_frame()
 
     def finish(self):
@@ -43,7 +168,9 @@ class Canvas():
             x_pos = -self.view_port*0.95
             y_pos = self.view_port*0.95
             for msg in messages:
-                self.report_text.append(plt.text(x_pos, y_pos, "{}: {:.0f}".format(msg[0], msg[1])))
+                self.report_text.append(self.axes.text(x_pos, y_pos, "{}: {:.0f}".format(msg[0], msg[1])))
+                if len(self.animated) > 0:
+                    self.add_animated(self.report_text[-1])
                 y_pos -= self.view_port*0.05
         else:
             for i_msg, msg in enumerate(messages):
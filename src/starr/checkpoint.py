@@ -0,0 +1,267 @@
+"""
+Checkpoint and restart of the complete state of a Simulation.
+
+A checkpoint is a single .npz file of plain arrays: the shape parameters,
+circle resolution, position and rotation of every object (periodic clones
+included), the index of the group and of the physics component (body) every
+object belongs to, velocity, acceleration, mass and static flag of every
+body, the colours of the objects (as RGBA), the world keywords, the step
+counter and the state of the random number generator of the simulation.
+Matplotlib patches and shapely polygons are not stored. On restore, Circle
+and Rectangle polygons are rebuilt lazily from the shape parameters the
+first time they are accessed, the body frame polygons of GeneralPolygon
+objects are restored from their coordinates in one vectorized call.
+"""
+
+import json
+import numpy as np
+import shapely
+from starr.geometry_component import (Circle, Rectangle, GeneralPolygon,
+                                      DEFAULT_CIRCLE_RESOLUTION)
+from starr.physics_component import PhysicsComponent
+from starr.graphics_component import GraphicsComponent
+from starr.simulation_object import SimulationObject, ObjectGroup
+
+CIRCLE, RECTANGLE, GENERAL_POLYGON = 0, 1, 2
+FORMAT_VERSION = 2
+
+
+def geometry_parameters(geometry):
+    """
+    shape code and the (radius, side_length_a, side_length_b) parameters
+    """
+    parameters = np.full(3, np.nan)
+    if isinstance(geometry, Circle):
+        parameters[0] = geometry.radius
+        return CIRCLE, parameters
+    if isinstance(geometry, Rectangle):
+        parameters[1] = geometry.side_length_a
+        parameters[2] = geometry.side_length_b
+        return RECTANGLE, parameters
+    if isinstance(geometry, GeneralPolygon):
+        return GENERAL_POLYGON, parameters
+    raise ValueError("can not checkpoint geometry of type {}".format(
+        type(geometry).__name__))
+
+def make_geometry(shape, parameters, resolution):
+    if shape == CIRCLE:
+        return Circle(parameters[0], int(resolution))
+    if shape == RECTANGLE:
+        return Rectangle(parameters[1], parameters[2])
+    return None
+
+def rng_state_arrays(state):
+    version, internal_state, gauss_next = state
+    if gauss_next is None:
+        gauss_next = np.nan
+    return (np.array(version), np.array(internal_state, dtype=np.int64),
+            np.array(gauss_next))
+
+def rng_state_from_arrays(version, internal_state, gauss_next):
+    gauss_next = float(gauss_next)
+    if np.isnan(gauss_next):
+        gauss_next = None
+    return (int(version), tuple(int(value) for value in internal_state),
+            gauss_next)
+
+def rgba(color):
+    """
+    any matplotlib color (name, hex string or the RGBA tuples set by
+    recolor_groups) as an array of 4 floats
+    """
+    from matplotlib.colors import to_rgba
+    return np.array(to_rgba(color), dtype=float)
+
+def stored_color(color):
+    """
+    color of a graphics component from a checkpoint, RGBA tuples in the
+    current format and color strings in format version 1
+    """
+    if np.ndim(color) == 0:
+        return str(color)
+    return tuple(float(value) for value in color)
+
+def json_default(value):
+    """
+    converts the numpy values of the world keywords for json
+    """
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError("can not checkpoint world keyword of type {}".format(
+        type(value).__name__))
+
+def save_checkpoint(simulation, path, compressed=False):
+    """
+    writes the state of simulation to path (.npz)
+    """
+    objects = []
+    group = []
+    for i_group, obj_group in enumerate(simulation.object_groups):
+        objects += obj_group.objects
+        group += [i_group]*len(obj_group.objects)
+    n_objects = len(objects)
+
+    bodies = []
+    body_index = {}
+    object_body = np.zeros(n_objects, dtype=int)
+    shape = np.zeros(n_objects, dtype=int)
+    parameters = np.zeros((n_objects, 3))
+    resolution = np.zeros(n_objects, dtype=int)
+    position = np.zeros((n_objects, 2))
+    rotation = np.zeros(n_objects)
+    has_graphics = np.zeros(n_objects, dtype=bool)
+    color = []
+    edge_color = []
+    fill = np.zeros(n_objects, dtype=bool)
+    general_polygons = []
+    for i_obj, obj in enumerate(objects):
+        key = id(obj.physics)
+        if key not in body_index:
+            body_index[key] = len(bodies)
+            bodies.append(obj.physics)
+        object_body[i_obj] = body_index[key]
+        shape[i_obj], parameters[i_obj] = geometry_parameters(obj.geometry)
+        if shape[i_obj] == CIRCLE:
+            resolution[i_obj] = obj.geometry.resolution
+        if shape[i_obj] == GENERAL_POLYGON:
+            general_polygons.append(obj.geometry.local_polygon)
+        position[i_obj] = obj.position
+        rotation[i_obj] = obj.rotation
+        if obj.graphics is not None:
+            has_graphics[i_obj] = True
+            color.append(rgba(obj.graphics.color))
+            edge_color.append(rgba(obj.graphics.edge_color))
+            fill[i_obj] = obj.graphics.fill
+        else:
+            color.append(np.full(4, np.nan))
+            edge_color.append(np.full(4, np.nan))
+
+    polygon_arrays = {'polygon_coords': np.zeros((0, 2))}
+    if len(general_polygons) > 0:
+        geometry_type, coords, offsets = shapely.to_ragged_array(
+            general_polygons)
+        polygon_arrays['polygon_coords'] = coords
+        for i_offsets, offset in enumerate(offsets):
+            polygon_arrays['polygon_offsets_{}'.format(i_offsets)] = offset
+
+    rng_version, rng_internal, rng_gauss = rng_state_arrays(
+        simulation.rng.getstate())
+    i_step = getattr(simulation, 'i_step', 0)
+    n_particles = getattr(simulation, 'n_particles', len(simulation.object_groups))
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'world_keys': np.array(json.dumps(simulation.world.keys,
+                                            default=json_default)),
+        'i_step': np.array(i_step),
+        'n_particles': np.array(n_particles),
+        'n_groups': np.array(len(simulation.object_groups)),
+        'group_periodic': np.array([obj_group.periodic for obj_group
+                                    in simulation.object_groups], dtype=bool),
+        'object_group': np.array(group, dtype=int),
+        'object_body': object_body,
+        'shape': shape,
+        'parameters': parameters,
+        'resolution': resolution,
+        'position': position,
+        'rotation': rotation,
+        'has_graphics': has_graphics,
+        'color': np.array(color, dtype=float).reshape(-1, 4),
+        'edge_color': np.array(edge_color, dtype=float).reshape(-1, 4),
+        'fill': fill,
+        'velocity': np.array([body.velocity for body in bodies],
+                             dtype=float).reshape(-1, 2),
+        'acceleration': np.array([body.acceleration for body in bodies],
+                                 dtype=float).reshape(-1, 2),
+        'mass': np.array([body.mass for body in bodies], dtype=float),
+        'static': np.array([body.static for body in bodies], dtype=bool),
+        'rng_version': rng_version,
+        'rng_internal': rng_internal,
+        'rng_gauss': rng_gauss}
+    arrays.update(polygon_arrays)
+    if compressed:
+        np.savez_compressed(path, **arrays)
+    else:
+        np.savez(path, **arrays)
+
+def restore_objects(simulation, data):
+    """
+    rebuilds the object groups of simulation from the checkpoint arrays
+    """
+    bodies = []
+    for mass, static, velocity, acceleration in zip(
+            data['mass'], data['static'], data['velocity'],
+            data['acceleration']):
+        body = PhysicsComponent(float(mass), static=bool(static))
+        body.velocity = np.array(velocity)
+        body.acceleration = np.array(acceleration)
+        body.update_energy()
+        body.update_momentum()
+        bodies.append(body)
+
+    if 'resolution' in data:
+        resolution = data['resolution']
+    else:
+        resolution = np.full(data['shape'].size, DEFAULT_CIRCLE_RESOLUTION)
+    general = np.flatnonzero(data['shape'] == GENERAL_POLYGON)
+    if general.size > 0:
+        offsets = []
+        i_offsets = 0
+        while 'polygon_offsets_{}'.format(i_offsets) in data:
+            offsets.append(data['polygon_offsets_{}'.format(i_offsets)])
+            i_offsets += 1
+        polygons = shapely.from_ragged_array(shapely.GeometryType.POLYGON,
+                                             data['polygon_coords'],
+                                             tuple(offsets))
+
+    groups = [ObjectGroup() for i_group in range(int(data['n_groups']))]
+    for obj_group, periodic in zip(groups, data['group_periodic']):
+        obj_group.periodic = bool(periodic)
+    i_general = 0
+    for i_obj in range(data['shape'].size):
+        geometry = make_geometry(data['shape'][i_obj], data['parameters'][i_obj],
+                                 resolution[i_obj])
+        position = np.array(data['position'][i_obj])
+        rotation = float(data['rotation'][i_obj])
+        if data['shape'][i_obj] == GENERAL_POLYGON:
+            geometry = GeneralPolygon(polygons[i_general])
+            i_general += 1
+        if data['has_graphics'][i_obj]:
+            graphics = GraphicsComponent(stored_color(data['color'][i_obj]),
+                                         bool(data['fill'][i_obj]),
+                                         stored_color(
+                                             data['edge_color'][i_obj]))
+        else:
+            graphics = None
+        obj = SimulationObject(geometry, bodies[data['object_body'][i_obj]],
+                               graphics)
+        obj.position = position
+        obj.rotation = rotation
+        # the polygon is created lazily at the stored position and rotation
+        geometry.create_polygon(position, rotation)
+        groups[data['object_group'][i_obj]].append(obj)
+    simulation.object_groups = groups
+
+def load_checkpoint(path, fig=None, axes=None, **simulation_kws):
+    """
+    returns a new Simulation with the state stored in path, further keywords
+    are passed to Simulation (e.g. broad_phase or vectorized)
+    """
+    from starr.simulation import Simulation
+    with np.load(path) as archive:
+        data = {name: archive[name] for name in archive.files}
+    if int(data['format_version']) not in (1, FORMAT_VERSION):
+        raise ValueError("unsupported checkpoint format version: {}".format(
+            int(data['format_version'])))
+    world_keys = json.loads(str(data['world_keys']))
+    simulation = Simulation(world_keys, fig=fig, axes=axes, **simulation_kws)
+    restore_objects(simulation, data)
+    simulation.i_step = int(data['i_step'])
+    simulation.n_particles = int(data['n_particles'])
+    simulation.rng.setstate(rng_state_from_arrays(data['rng_version'],
+                                                  data['rng_internal'],
+                                                  data['rng_gauss']))
+    if simulation.canvas is not None:
+        for obj in simulation.all_objects():
+            if obj.graphics is not None:
+                obj.graphics.update(obj.geometry, simulation.canvas)
+    return simulation
@@ -0,0 +1,106 @@
+"""
+Runs ensembles of independent simulations (different seeds and/or keywords)
+in a pool of worker processes.
+
+The prototype Simulation (world and objects, already arranged) is set up once
+in the parent process and handed to every worker when the worker starts. With
+the 'fork' start method (the default where available) this costs nothing, the
+workers inherit the prototype from the parent. For every configuration a
+worker runs a deep copy of the prototype with its own random stream
+(Simulation.set_seed), so runs never share random state and the results do
+not depend on which worker ran them or in which order. Configurations
+without a seed get one spawned from the random stream of the prototype
+(numpy SeedSequence), a copied stream would repeat the same numbers in
+every run.
+
+The results of all runs are collected into arrays indexed by configuration.
+"""
+
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+_prototype = None
+
+
+def set_prototype(prototype):
+    global _prototype
+    _prototype = prototype
+
+def run_configuration(configuration):
+    """
+    runs one configuration on a copy of the prototype of this process,
+    configuration is a dict with 'seed', 'object_kws' and 'sim_kws'
+    """
+    simulation = copy.deepcopy(_prototype)
+    sim_kws = dict(configuration['sim_kws'])
+    sim_kws['verbose'] = False
+    state = simulation.run(dict(configuration['object_kws']), sim_kws,
+                           seed=configuration['seed'])
+    result = simulation.group_state()
+    result['n_steps'] = state['n_steps']
+    result['energy'] = state['energy'][-1]
+    result['valid'] = simulation.valid_configuration()
+    return result
+
+def member_seeds(prototype, n_members):
+    """
+    independent seeds for n_members runs, spawned from the random stream of
+    the prototype
+    """
+    sequence = np.random.SeedSequence(prototype.rng.getrandbits(64))
+    return [int(child.generate_state(1, dtype=np.uint64)[0])
+            for child in sequence.spawn(n_members)]
+
+def make_configurations(seeds, object_kws, sim_kws):
+    """
+    one configuration per seed with the same keywords, a seed of None is
+    replaced by a spawned one in run_ensemble
+    """
+
+    return [{'seed': seed, 'object_kws': object_kws, 'sim_kws': sim_kws}
+            for seed in seeds]
+
+def collect_results(results):
+    """
+    stacks the per run result dicts into arrays with the run as first axis
+    """
+    collected = {}
+    for name in results[0]:
+        collected[name] = np.array([result[name] for result in results])
+    return collected
+
+def run_ensemble(prototype, configurations, n_workers=None,
+                 start_method='fork'):
+    """
+    runs every configuration on a copy of prototype, distributed over
+    n_workers processes (default: number of cores). Returns a dict of
+    arrays: position, velocity and rotation of every group, n_steps, final
+    energy and valid (no overlaps) of every run. Configurations without a
+    seed (or with None) get one from member_seeds. start_method is the
+    multiprocessing start method, 'fork' is replaced by the platform default
+    where it is not available.
+    """
+    if len(configurations) == 0:
+        raise ValueError("no configurations to run")
+    if prototype.canvas is not None:
+        raise ValueError("ensembles run headless, create the prototype "+
+                         "without fig and axes")
+    seeds = member_seeds(prototype, len(configurations))
+    configurations = [dict(configuration, seed=seed)
+                      if configuration.get('seed') is None else configuration
+                      for configuration, seed in zip(configurations, seeds)]
+    if start_method not in multiprocessing.get_all_start_methods():
+        start_method = None
+    context = multiprocessing.get_context(start_method)
+    if n_workers == 1:
+        set_prototype(prototype)
+        results = [run_configuration(configuration)
+                   for configuration in configurations]
+        return collect_results(results)
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context,
+                             initializer=set_prototype,
+                             initargs=(prototype,)) as executor:
+        results = list(executor.map(run_configuration, configurations))
+    return collect_results(results)
@@ -0,0 +1,254 @@
+"""
+Event driven molecular dynamics for systems of hard disks.
+
+Instead of moving all objects by a fixed time step and resolving overlaps
+afterwards, the exact time of the next collision of every disk is computed
+analytically and kept in a priority queue. The simulation then jumps from one
+collision to the next, so disks never overlap and no time step has to be
+chosen. Events are invalidated lazily: every disk carries a collision counter
+and an event is discarded when popped if the counter of its owner changed
+since the event was predicted.
+
+With a growth rate the radii grow linearly in time (Lubachevsky-Stillinger
+compression), r(t) = r(0)*(1+growth_rate*t). Collision times are then the
+roots of a quadratic in which the contact distance grows as well, and the
+collision rules add the growth speed to the normal velocities so that the
+disks separate after every collision.
+
+Only Circle objects in a rectangular world with physical boundaries are
+supported.
+"""
+
+import heapq
+import numpy as np
+from starr.geometry_component import Circle, Rectangle
+
+LEFT, RIGHT, DOWN, UP = -1, -2, -3, -4
+
+
+def contact_times(separation, relative_velocity, sigma, sigma_speed=0.):
+    """
+    times until pairs of disks at separation (n_pairs, 2) moving with
+    relative_velocity touch, i.e. |separation+relative_velocity*t| equals
+    the contact distance sigma+sigma_speed*t. np.inf if they never touch
+    while approaching, 0 if they already overlap and approach.
+    """
+    sigma_speed = np.broadcast_to(sigma_speed, np.shape(sigma))
+    a = np.sum(relative_velocity**2, axis=1)-sigma_speed**2
+    b = np.sum(separation*relative_velocity, axis=1)-sigma*sigma_speed
+    c = np.sum(separation**2, axis=1)-sigma**2
+    discriminant = b**2-a*c
+    times = np.full(b.size, np.inf)
+    approaching = (((b < 0.) | (a < 0.)) & (discriminant >= 0.) &
+                   (a != 0.))
+    times[approaching] = -(b[approaching]+np.sqrt(
+        discriminant[approaching]))/a[approaching]
+    return np.maximum(times, 0.)
+
+
+class EventDrivenEngine():
+
+    def __init__(self, objects, world, restitution=1.0, growth_rate=0.):
+        for obj in objects:
+            if not isinstance(obj.geometry, Circle):
+                raise ValueError("event driven simulations are only "+
+                                 "implemented for Circle objects")
+        if (world.boundary_type != 'Physical' or
+                not isinstance(world.boundary.geometry, Rectangle)):
+            raise ValueError("event driven simulations require a rectangular "+
+                             "world with a physical boundary")
+        if len(world.obstacles()) > 0:
+            raise ValueError("event driven simulations do not support "+
+                             "obstacles")
+        self.objects = objects
+        self.restitution = restitution
+        n_objects = len(objects)
+        self.position = np.array([obj.position for obj in objects],
+                                 dtype=float).reshape(-1, 2)
+        self.velocity = np.array([obj.physics.velocity for obj in objects],
+                                 dtype=float).reshape(-1, 2)
+        self.radius = np.array([obj.geometry.radius for obj in objects],
+                               dtype=float)
+        self.growth_speed = self.radius*growth_rate
+        self.mass = np.array([obj.physics.mass for obj in objects],
+                             dtype=float)
+        self.local_time = np.zeros(n_objects)
+        self.collision_count = np.zeros(n_objects, dtype=int)
+        self.time = 0.
+        self.n_events = 0
+
+        geometry = world.boundary.geometry
+        center = np.array(world.boundary.position, dtype=float)
+        self.walls = {LEFT: center[0]-0.5*geometry.side_length_a,
+                      RIGHT: center[0]+0.5*geometry.side_length_a,
+                      DOWN: center[1]-0.5*geometry.side_length_b,
+                      UP: center[1]+0.5*geometry.side_length_b}
+
+        self.queue = []
+        self.sequence = 0
+        for i_obj in range(n_objects):
+            self.predict(i_obj)
+
+    def positions_at(self, time):
+        return self.position+self.velocity*(time-self.local_time)[:, None]
+
+    def radius_at(self, time):
+        return self.radius+self.growth_speed*time
+
+    def move(self, i_obj, time):
+        self.position[i_obj] += self.velocity[i_obj]*(time-self.local_time[i_obj])
+        self.local_time[i_obj] = time
+
+    def wall_time(self, i_obj, position):
+        """
+        time until disk i_obj hits a wall and the wall it hits
+        """
+        best_time = np.inf
+        best_wall = None
+        growth_speed = self.growth_speed[i_obj]
+        radius = self.radius[i_obj]+growth_speed*self.time
+        for axis, (low, high) in enumerate([(LEFT, RIGHT), (DOWN, UP)]):
+            velocity = self.velocity[i_obj, axis]
+            for wall, speed, distance in [
+                    (high, velocity+growth_speed,
+                     self.walls[high]-radius-position[axis]),
+                    (low, velocity-growth_speed,
+                     self.walls[low]+radius-position[axis])]:
+                if speed == 0. or (wall == high) != (speed > 0.):
+                    continue
+                wall_time = max(distance/speed, 0.)
+                if wall_time < best_time:
+                    best_time = wall_time
+                    best_wall = wall
+        return best_time, best_wall
+
+    def pair_times(self, i_obj, positions):
+        """
+        times until disk i_obj hits every other disk (np.inf if never)
+        """
+        separation = positions-positions[i_obj]
+        relative_velocity = self.velocity-self.velocity[i_obj]
+        radius = self.radius_at(self.time)
+        sigma = radius+radius[i_obj]
+        sigma_speed = self.growth_speed+self.growth_speed[i_obj]
+        times = contact_times(separation, relative_velocity, sigma,
+                              sigma_speed)
+        times[i_obj] = np.inf
+        return times
+
+    def predict(self, i_obj):
+        """
+        pushes the next event of disk i_obj onto the queue
+        """
+        positions = self.positions_at(self.time)
+        event_time, partner = self.wall_time(i_obj, positions[i_obj])
+        if len(self.objects) > 1:
+            times = self.pair_times(i_obj, positions)
+            j_obj = int(np.argmin(times))
+            if times[j_obj] < event_time:
+                event_time = times[j_obj]
+                partner = j_obj
+        if partner is None:
+            return
+        if partner >= 0:
+            partner_count = self.collision_count[partner]
+        else:
+            partner_count = 0
+        heapq.heappush(self.queue, (self.time+event_time, self.sequence,
+                                    i_obj, partner,
+                                    self.collision_count[i_obj],
+                                    partner_count))
+        self.sequence += 1
+
+    def collide(self, i_obj, j_obj):
+        separation = self.position[j_obj]-self.position[i_obj]
+        normal = separation/np.linalg.norm(separation)
+        normal_velocity = (np.dot(self.velocity[j_obj]-self.velocity[i_obj],
+                                  normal)-
+                           self.growth_speed[i_obj]-self.growth_speed[j_obj])
+        impulse = -(1.+self.restitution)*normal_velocity/(
+            1./self.mass[i_obj]+1./self.mass[j_obj])
+        self.velocity[i_obj] -= impulse*normal/self.mass[i_obj]
+        self.velocity[j_obj] += impulse*normal/self.mass[j_obj]
+
+    def bounce(self, i_obj, wall):
+        axis = 0 if wall in (LEFT, RIGHT) else 1
+        growth_speed = self.growth_speed[i_obj]
+        if wall in (LEFT, DOWN):
+            growth_speed = -growth_speed
+        self.velocity[i_obj, axis] = -(self.restitution*
+                                       self.velocity[i_obj, axis]+
+                                       (1.+self.restitution)*growth_speed)
+
+    def step(self):
+        """
+        pops the next event from the queue. Returns True if it was a valid
+        collision, False if it was outdated (or the queue is empty).
+        """
+        if len(self.queue) == 0:
+            return False
+        event_time, _, i_obj, partner, count, partner_count = heapq.heappop(
+            self.queue)
+        if count != self.collision_count[i_obj]:
+            return False
+        self.time = event_time
+        if partner >= 0 and partner_count != self.collision_count[partner]:
+            # the partner changed course, look for a new event of the owner
+            self.predict(i_obj)
+            return False
+        self.move(i_obj, event_time)
+        if partner >= 0:
+            self.move(partner, event_time)
+            self.collide(i_obj, partner)
+            self.collision_count[partner] += 1
+        else:
+            self.bounce(i_obj, partner)
+        self.collision_count[i_obj] += 1
+        self.n_events += 1
+        self.predict(i_obj)
+        if partner >= 0:
+            self.predict(partner)
+        return True
+
+    def advance(self, end_time, max_events=None):
+        """
+        processes all events up to end_time (or until max_events collisions
+        have been processed in total) and moves all disks to that time
+        """
+        while len(self.queue) > 0 and self.queue[0][0] <= end_time:
+            if max_events is not None and self.n_events >= max_events:
+                end_time = self.time
+                break
+            self.step()
+        self.time = end_time
+        self.position = self.positions_at(end_time)
+        self.local_time[:] = end_time
+
+    def rescale_velocities(self, kinetic_energy):
+        """
+        scales all velocities to the total kinetic_energy (the collisions of
+        growing disks heat the system) and predicts all events anew
+        """
+        energy = 0.5*np.sum(self.mass*np.sum(self.velocity**2, axis=1))
+        if energy == 0.:
+            return
+        self.position = self.positions_at(self.time)
+        self.local_time[:] = self.time
+        self.velocity *= np.sqrt(kinetic_energy/energy)
+        self.queue = []
+        for i_obj in range(len(self.objects)):
+            self.predict(i_obj)
+
+    def write_back(self):
+        """
+        copies positions, velocities and radii at the current time to the
+        objects
+        """
+        positions = self.positions_at(self.time)
+        radius = self.radius_at(self.time)
+        for i_obj, obj in enumerate(self.objects):
+            if radius[i_obj] != obj.geometry.radius:
+                obj.geometry.scale(radius[i_obj]/obj.geometry.radius)
+            obj.position = np.array(positions[i_obj])
+            obj.physics.velocity = np.array(self.velocity[i_obj])
+            obj.physics.update_energy()
@@ -0,0 +1,140 @@
+"""
+Asynchronous frame pipeline, decouples rendering and video encoding from the
+physics loop.
+
+The simulation publishes snapshots of its state into a small set of reusable
+FrameBuffers (double buffering by default): while the render thread draws
+one buffer, the next snapshot is written into the other. Published buffers
+are handed over through a bounded queue. Snapshots are only taken every
+frame_interval steps and/or at most frame_rate times per (wall clock) second.
+If the render thread falls behind so that no buffer is free, the frame is
+dropped instead of stalling the physics.
+
+Matplotlib is not thread safe with interactive (GUI) backends, so drawing on
+the render thread needs a non-interactive canvas such as FigureCanvasAgg.
+"""
+
+import queue
+import threading
+import time
+import numpy as np
+
+
+class FrameBuffer():
+    """
+    reusable storage for one snapshot. Arrays are copied into memory which is
+    kept between frames and only grows, other values are stored as given.
+    """
+
+    def __init__(self):
+        self.arrays = {}
+        self.data = {}
+        self.i_step = None
+
+    def store(self, name, value):
+        if not isinstance(value, np.ndarray):
+            self.data[name] = value
+            return
+        array = self.arrays.get(name)
+        if array is None or array.size < value.size or array.dtype != value.dtype:
+            array = np.empty(max(value.size, 1), dtype=value.dtype)
+            self.arrays[name] = array
+        flat = array[:value.size]
+        flat[:] = value.ravel()
+        self.data[name] = flat.reshape(value.shape)
+
+    def fill(self, i_step, state):
+        self.i_step = i_step
+        for name, value in state.items():
+            self.store(name, value)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+
+class FramePipeline():
+
+    def __init__(self, draw, frame_interval=1, frame_rate=None, n_buffers=2):
+        """
+        draw is called in the render thread with a FrameBuffer for every
+        frame which is not dropped
+        """
+        if n_buffers < 1:
+            raise ValueError("the frame pipeline needs at least one buffer")
+        self.draw = draw
+        self.frame_interval = frame_interval
+        self.frame_rate = frame_rate
+        self.free = queue.Queue()
+        for i_buffer in range(n_buffers):
+            self.free.put(FrameBuffer())
+        self.ready = queue.Queue(maxsize=n_buffers)
+        self.thread = None
+        self.error = None
+        self.last_publish = None
+        self.n_published = 0
+        self.n_dropped = 0
+        self.n_drawn = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.render_loop, daemon=True)
+        self.thread.start()
+
+    def due(self, i_step):
+        """
+        True if a frame should be taken at step i_step
+        """
+        if self.frame_interval is not None and i_step % self.frame_interval != 0:
+            return False
+        if self.frame_rate is not None and self.last_publish is not None:
+            if time.perf_counter()-self.last_publish < 1./self.frame_rate:
+                return False
+        return True
+
+    def publish(self, i_step, make_state):
+        """
+        takes a snapshot if one is due at step i_step. make_state returns a
+        dict with the state to draw and is only called if a buffer is free.
+        Returns True if the frame was published, False if it was skipped or
+        dropped.
+        """
+        if not self.due(i_step):
+            return False
+        if self.error is not None:
+            raise self.error
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.n_dropped += 1
+            return False
+        buffer.fill(i_step, make_state())
+        self.ready.put(buffer)
+        self.last_publish = time.perf_counter()
+        self.n_published += 1
+        return True
+
+    def render_loop(self):
+        while True:
+            buffer = self.ready.get()
+            if buffer is None:
+                break
+            try:
+                if self.error is None:
+                    self.draw(buffer)
+                    self.n_drawn += 1
+            except Exception as error:
+                self.error = error
+            finally:
+                self.free.put(buffer)
+
+    def stop(self, raise_error=True):
+        """
+        draws the frames which are still queued, stops the render thread and
+        re-raises an error raised while drawing if raise_error is set (unset
+        it while another error propagates, so that error is not masked)
+        """
+        if self.thread is not None:
+            self.ready.put(None)
+            self.thread.join()
+            self.thread = None
+        if raise_error and self.error is not None:
+            raise self.error
@@ -0,0 +1,84 @@
+"""
+Builds the polygons of many simulation objects from their body frame
+vertices as a single shapely 2 geometry array, so that all of them are placed
+with one coordinate operation instead of one transformation per object.
+"""
+
+import numpy as np
+import shapely
+
+
+def rotate_coordinates(coords, index, centers, angles):
+    """
+    rotates coords (n_coords, 2) by angles (degrees, one per geometry) about
+    centers (n_geometries, 2), index maps every coordinate to its geometry
+    """
+    theta = np.radians(angles)[index]
+    cos = np.cos(theta)
+    sin = np.sin(theta)
+    relative = coords-centers[index]
+    rotated = np.empty_like(coords)
+    rotated[:, 0] = cos*relative[:, 0]-sin*relative[:, 1]
+    rotated[:, 1] = sin*relative[:, 0]+cos*relative[:, 1]
+    return rotated+centers[index]
+
+
+def materialize(geometries):
+    """
+    builds the missing world frame polygons of the geometry components in
+    one go: the body frame coordinates of all of them are rotated and
+    translated with one coordinate operation and written back as the cached
+    polygons. Returns the polygons of all geometries as an object array.
+    """
+    missing = [geo for geo in geometries if geo._polygon is None]
+    if len(missing) > 0:
+        local = np.array([geo.local_polygon for geo in missing], dtype=object)
+        positions = np.array([geo._position for geo in missing], dtype=float)
+        rotations = np.array([geo._rotation for geo in missing], dtype=float)
+        coords, index = shapely.get_coordinates(local, return_index=True)
+        if np.any(rotations != 0.):
+            coords = rotate_coordinates(coords, index,
+                                        np.zeros_like(positions), rotations)
+        placed = shapely.set_coordinates(local.copy(),
+                                         coords+positions[index])
+        for geo, polygon in zip(missing, placed):
+            geo._polygon = polygon
+    return np.array([geo._polygon for geo in geometries], dtype=object)
+
+
+class PolygonView():
+    """
+    read only sequence of the polygons of a list of objects, a polygon is
+    only built when it is accessed
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __getitem__(self, i_obj):
+        return self.objects[i_obj].geometry.polygon
+
+
+class GeometryArray():
+    """
+    bulk update of the polygons of a list of objects. The update only
+    records the new position and rotation of every geometry component, the
+    polygons are built on demand from the body frame vertices, either one by
+    one on access of obj.geometry.polygon or for many objects at once with
+    materialize (self.polygons).
+    """
+
+    def __init__(self):
+        self.objects = []
+
+    def update(self, objects):
+        self.objects = objects
+        for obj in objects:
+            obj.geometry.update(obj)
+
+    @property
+    def polygons(self):
+        return materialize([obj.geometry for obj in self.objects])
@@ -8,18 +8,19 @@ GeneralPolygon
 
 """
 
+import copy
 import numpy as np
 from abc import ABC, abstractmethod
-import matplotlib.pyplot as plt
+import shapely
 import shapely.geometry
 from shapely.geometry.point import Point
 from shapely.geometry.linestring import LineString
-from shapely.geometry.polygon import LinearRing, Polygon
+from shapely.geometry.polygon import Polygon
 import shapely.affinity as affinity
-from starr.misc import pairwise
 from shapely.ops import unary_union
 
 def plot_line_string(line_string, color='k'):
+    import matplotlib.pyplot as plt
     x = [line_string.coords[0][0], line_string.coords[1][0]]
     y = [line_string.coords[0][1], line_string.coords[1][1]]
     plt.plot(x,y, lw=3.0, color=color, zorder=10)
@@ -56,28 +57,155 @@ def make_union(object_list):
 
 
 
+DEFAULT_CIRCLE_RESOLUTION = 16
+MIN_CIRCLE_RESOLUTION = 2
+
+
+def place_polygon(polygon, position, rotation):
+    """
+    moves a polygon given in the body frame to the world frame: rotation
+    (degrees, counter clockwise) about the body origin, then translation by
+    position
+    """
+    position = np.asarray(position, dtype=float)
+    if rotation == 0.:
+        return shapely.transform(polygon, lambda coords: coords+position)
+    theta = np.radians(rotation)
+    matrix = np.array([[np.cos(theta), np.sin(theta)],
+                       [-np.sin(theta), np.cos(theta)]])
+    return shapely.transform(polygon,
+                             lambda coords: coords @ matrix+position)
+
+
+def segment_distances(starts, ends, points):
+    """
+    distances of points to the segments from starts to ends, all arrays
+    broadcast along the first axis
+    """
+    segments = ends-starts
+    relative = points-starts
+    length2 = np.sum(segments**2, axis=-1)
+    projection = np.sum(relative*segments, axis=-1)
+    fraction = np.divide(projection, length2, out=np.zeros_like(projection),
+                         where=length2 > 0.)
+    fraction = np.clip(fraction, 0., 1.)[..., None]
+    return np.linalg.norm(relative-fraction*segments, axis=-1)
+
+def edge_normals(starts, ends):
+    """
+    unit normals (segment direction rotated by +90 degrees) of the segments
+    from starts to ends
+    """
+    segments = ends-starts
+    segments = segments/np.linalg.norm(segments, axis=-1, keepdims=True)
+    return np.stack([-segments[..., 1], segments[..., 0]], axis=-1)
+
+def closest_edge_normals(polygons, points):
+    """
+    batched get_normal: for every polygon, the normal of the edge of its
+    exterior closest to the point with the same index
+    """
+    rings = shapely.get_exterior_ring(polygons)
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    edge = index[:-1] == index[1:]
+    starts = coords[:-1][edge]
+    ends = coords[1:][edge]
+    owner = index[:-1][edge]
+    distances = segment_distances(starts, ends, points[owner])
+    order = np.lexsort((distances, owner))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = owner[order][1:] != owner[order][:-1]
+    closest = order[first]
+    return edge_normals(starts[closest], ends[closest])
+
+
 class GeometryComponent(ABC):
+    """
+    the shape is stored once as a polygon in the body frame (local_polygon),
+    the state is only the position and rotation of the body. The world frame
+    polygon is built from these on first access and cached until the body
+    moves.
+    """
 
     def __init__(self):
         self._position = np.zeros(2)
         self._rotation = 0.0
-        self.polygon = None
+        self._polygon = None
+        self._local_polygon = None
+        self._local_bounds = None
+
+    @property
+    def local_polygon(self):
+        if self._local_polygon is None:
+            self._local_polygon = self.make_local_polygon()
+        return self._local_polygon
+
+    @property
+    def polygon(self):
+        """
+        the shapely polygon in the world frame, built on demand
+        """
+        if self._polygon is None:
+            self._polygon = place_polygon(self.local_polygon, self._position,
+                                          self._rotation)
+        return self._polygon
+
+    @polygon.setter
+    def polygon(self, polygon):
+        """
+        sets the cached world frame polygon, it has to match the current
+        position and rotation
+        """
+        self._polygon = polygon
 
     def update(self, simulation_object):
         new_pos = simulation_object.position
         new_rot = simulation_object.rotation
-        translation = new_pos-self._position
-        rotation = new_rot-self._rotation
-        self.polygon = affinity.translate(self.polygon,
-                                          xoff=translation[0],
-                                          yoff=translation[1])
-        self.polygon = affinity.rotate(self.polygon,
-                                       rotation)
-        self._position = np.array(new_pos)
+        if np.array_equal(new_pos, self._position) and new_rot == self._rotation:
+            return
+        self._position = np.array(new_pos, dtype=float)
         self._rotation = new_rot
+        self._polygon = None
+
+    def shifted(self, shift):
+        """
+        copy of the geometry translated by shift, sharing the body frame
+        polygon (used for periodic images)
+        """
+        image = copy.copy(self)
+        image._position = self._position+shift
+        if self._polygon is not None:
+            image._polygon = shapely.transform(self._polygon,
+                                               lambda coords: coords+shift)
+        return image
 
-    @abstractmethod
     def create_polygon(self, position, rotation):
+        self._position = np.array(position, dtype=float)
+        self._rotation = rotation
+        self._polygon = None
+
+    def reset_shape(self):
+        """
+        drops the cached polygons and bounds after the shape changed
+        """
+        self._local_polygon = None
+        self._local_bounds = None
+        self._polygon = None
+
+    def scale(self, factor):
+        """
+        scales the shape in place by factor about the body origin
+        """
+        local_polygon = affinity.scale(self.local_polygon, factor, factor,
+                                       origin=(0., 0.))
+        self.reset_shape()
+        self._local_polygon = local_polygon
+
+    @abstractmethod
+    def make_local_polygon(self):
+        """
+        the shape as a polygon in the body frame
+        """
         pass
 
     def get_regular_grid_ranges(self, origin, spacing, include_edges=False):
@@ -96,39 +224,69 @@ class GeometryComponent(ABC):
         return outer.difference(inner)
 
     def area(self):
-        return self.polygon.area
+        return self.local_polygon.area
+
+    def bounds(self):
+        """
+        bounding box (minx, miny, maxx, maxy), from the body frame bounds
+        without building the polygon if the body is not rotated
+        """
+        if self._polygon is not None or self._rotation != 0.:
+            return self.polygon.bounds
+        if self._local_bounds is None:
+            self._local_bounds = np.array(self.local_polygon.bounds)
+        return tuple(self._local_bounds+np.tile(self._position, 2))
 
     def get_normal(self, collision):
-        side = 0
-        min_distance = np.inf
-        collision_side = None
-        for p0, p1 in pairwise(self.polygon.exterior.coords):
-            line = LineString( [p0,p1])
-            ring = LinearRing( [p0,p1,collision])
-            poly = Polygon(ring)
-            distance = poly.area/line.length
-            if distance < min_distance:
-                min_distance = distance
-                collision_side = side
-            side += 1
-
-        points = self.polygon.exterior.coords[collision_side:collision_side+2]
-        seg_vec = np.array(points[1])-np.array(points[0])
-        seg_vec = seg_vec/np.linalg.norm(seg_vec)
-        normal = np.array([-1*seg_vec[1], seg_vec[0]])
-        return normal
+        """
+        normal of the edge of the exterior closest to the point collision
+        """
+        coords = np.asarray(self.polygon.exterior.coords)
+        distances = segment_distances(coords[:-1], coords[1:], collision)
+        collision_side = np.argmin(distances)
+        return edge_normals(coords[collision_side],
+                            coords[collision_side+1])
+
+
+def circle_resolution(radius, tolerance, max_resolution=64):
+    """
+    smallest number of segments per quarter circle for which the polygon
+    deviates at most tolerance from a circle of radius
+    """
+    if tolerance >= radius:
+        return MIN_CIRCLE_RESOLUTION
+    max_angle = 2.*np.arccos(1.-tolerance/radius)
+    resolution = int(np.ceil(0.5*np.pi/max_angle))
+    return int(np.clip(resolution, MIN_CIRCLE_RESOLUTION, max_resolution))
 
 
 class Circle(GeometryComponent):
-
-    def __init__(self, radius):
+    """
+    circle of radius, approximated by a polygon with resolution segments per
+    quarter circle. Bounds and area are exact and do not need the polygon,
+    contacts with other circles and axis aligned rectangles are computed
+    analytically (see narrow_phase), so the polygon is only built for
+    drawing and for contacts with other shapes.
+    """
+
+    def __init__(self, radius, resolution=DEFAULT_CIRCLE_RESOLUTION):
         super().__init__()
         self.radius = radius
+        self.resolution = resolution
 
-    def create_polygon(self, position, rotation):
-        circ = Point(position).buffer(1)
-        circ = affinity.rotate(circ, rotation)
-        self.polygon = affinity.scale(circ, self.radius, self.radius)
+    def make_local_polygon(self):
+        return Point(0., 0.).buffer(self.radius, quad_segs=self.resolution)
+
+    def scale(self, factor):
+        self.radius *= factor
+        self.reset_shape()
+
+    def area(self):
+        return np.pi*self.radius**2
+
+    def bounds(self):
+        return (self._position[0]-self.radius, self._position[1]-self.radius,
+                self._position[0]+self.radius, self._position[1]+self.radius)
 
     def get_normal(self, collision):
         normal_dir = collision-self._position
@@ -142,14 +300,16 @@ class Rectangle(GeometryComponent):
         self.side_length_a = side_length_a
         self.side_length_b = side_length_b
 
-    def create_polygon(self, position, rotation):
-        minx = position[0]-self.side_length_a*0.5
-        miny = position[1]-self.side_length_b*0.5
-        maxx = position[0]+self.side_length_a*0.5
-        maxy = position[1]+self.side_length_b*0.5
-        box = shapely.geometry.box(minx, miny, maxx, maxy)
-        box = affinity.rotate(box, rotation)
-        self.polygon = box
+    def make_local_polygon(self):
+        return shapely.geometry.box(-self.side_length_a*0.5,
+                                    -self.side_length_b*0.5,
+                                    self.side_length_a*0.5,
+                                    self.side_length_b*0.5)
+
+    def scale(self, factor):
+        self.side_length_a *= factor
+        self.side_length_b *= factor
+        self.reset_shape()
 
     def get_regular_grid_ranges(self, origin, spacing):
         x0 = -(0.5*self.side_length_a)
@@ -174,8 +334,12 @@ class Rectangle(GeometryComponent):
 class GeneralPolygon(GeometryComponent):
 
     def __init__(self, polygon):
+        """
+        polygon is the shape in the body frame, i.e. in the world frame for
+        a body at the origin without rotation
+        """
         super().__init__()
-        self.polygon = polygon
+        self._local_polygon = polygon
 
-    def create_polygon(self, position, rotation):
-        pass
+    def make_local_polygon(self):
+        return self._local_polygon
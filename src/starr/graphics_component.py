@@ -1,5 +1,3 @@
-from descartes import PolygonPatch
-
 class GraphicsComponent():
 
     def __init__(self, color, fill, edge_color):
@@ -9,6 +7,10 @@ class GraphicsComponent():
         self.patch = None
 
     def update(self, geometry_component, canvas):
+        if canvas.renderer is not None:
+            # drawn by the renderer of the canvas
+            return
+        from descartes import PolygonPatch
         if self.patch is None:
             self.patch = PolygonPatch(geometry_component.polygon,
                                     fc=self.color, ec=self.edge_color,
@@ -23,4 +25,5 @@ class GraphicsComponent():
             self.patch.set_facecolor(self.color)
 
     def remove(self):
-        self.patch.remove()
+        if self.patch is not None:
+            self.patch.remove()
@@ -0,0 +1,205 @@
+"""
+Removal of overlaps by energy minimization instead of dynamics.
+
+Every overlapping pair of objects (and every object reaching into a wall) is
+given the harmonic energy 0.5*overlap**2, the positions are relaxed with the
+fast inertial relaxation engine (FIRE, Bitzek et al. 2006): damped dynamics
+with unit masses in which the velocity is mixed towards the force and set to
+zero whenever it points uphill, while the time step grows as long as the
+energy goes down.
+
+Objects are described as axis aligned boxes of half extents h rounded by a
+radius r: circles have h = 0, unrotated rectangles r = 0. The overlap of two
+such shapes is the overlap of a point with the box of half extents h1+h2
+rounded by r1+r2, so the forces of all pairs are computed in one vectorized
+pass. Pairs are taken from a neighbour (Verlet) list of the pairs closer than
+a skin, which is rebuilt only after an object moved by half the skin.
+"""
+
+import numpy as np
+from starr.geometry_component import Circle, Rectangle
+from starr.broad_phase import SpatialHash
+
+
+def particle_extents(objects):
+    """
+    half extents (n, 2) and radii (n) of the objects as rounded boxes
+    """
+    half_extents = np.zeros((len(objects), 2))
+    radius = np.zeros(len(objects))
+    for i_obj, obj in enumerate(objects):
+        geometry = obj.geometry
+        if isinstance(geometry, Circle):
+            radius[i_obj] = geometry.radius
+        elif isinstance(geometry, Rectangle) and obj.rotation == 0.:
+            half_extents[i_obj] = [0.5*geometry.side_length_a,
+                                   0.5*geometry.side_length_b]
+        else:
+            raise ValueError("overlap minimization is only implemented for "+
+                             "Circle and unrotated Rectangle objects")
+    return half_extents, radius
+
+def pair_overlaps(delta, half_extents, radius):
+    """
+    overlaps (n_pairs) and unit normals (n_pairs, 2) pointing from the first
+    to the second object of pairs of rounded boxes with the combined half
+    extents and radii, delta is the separation of their centres
+    """
+    closest = np.clip(delta, -half_extents, half_extents)
+    outside = delta-closest
+    distance = np.linalg.norm(outside, axis=1)
+    overlap = radius-distance
+    normal = np.zeros_like(delta)
+    apart = distance > 0.
+    normal[apart] = outside[apart]/distance[apart, None]
+    # centre inside the box: push out along the axis of least penetration
+    inside = np.flatnonzero(~apart)
+    depth = half_extents[inside]-np.abs(delta[inside])
+    axis = np.argmin(depth, axis=1)
+    overlap[inside] = radius[inside]+depth[np.arange(inside.size), axis]
+    normal[inside, axis] = np.where(delta[inside, axis] < 0., -1., 1.)
+    return overlap, normal
+
+def wall_overlaps(positions, extents, walls):
+    """
+    overlaps (n, 4) of objects with the given extents (n, 2) beyond the walls
+    (minx, miny, maxx, maxy), positive if the object reaches into the wall
+    """
+    return np.stack([walls[0]-(positions[:, 0]-extents[:, 0]),
+                     walls[1]-(positions[:, 1]-extents[:, 1]),
+                     positions[:, 0]+extents[:, 0]-walls[2],
+                     positions[:, 1]+extents[:, 1]-walls[3]], axis=1)
+
+
+class FireMinimizer():
+    """
+    FIRE relaxation of the positions (n, 2) of rounded boxes (see
+    particle_extents) inside the walls (minx, miny, maxx, maxy) or in a
+    periodic box of side lengths box. Every shape is inflated by tolerance,
+    so once all overlaps are below tolerance the shapes are disjoint.
+    """
+
+    def __init__(self, positions, half_extents, radius, walls=None, box=None,
+                 tolerance=1e-3, skin=None, time_step=0.1,
+                 max_time_step=1.0):
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.half_extents = np.asarray(half_extents, dtype=float)
+        self.radius = np.asarray(radius, dtype=float)+tolerance
+        self.walls = walls
+        self.box = box
+        self.tolerance = tolerance
+        extents = self.half_extents+self.radius[:, None]
+        if skin is None:
+            skin = 0.5*np.median(np.max(extents, axis=1))
+        self.skin = skin
+        self.time_step = time_step
+        self.max_time_step = max_time_step
+        self.velocity = np.zeros_like(self.positions)
+        self.alpha_start = 0.1
+        self.alpha = self.alpha_start
+        self.n_positive = 0
+        self.n_iterations = 0
+        self.n_rebuilds = 0
+        self.energy = 0.
+        self.spatial_hash = SpatialHash()
+        self.spatial_hash.set_box(box)
+        self.pairs = None
+        self.reference = None
+
+    def build_neighbors(self):
+        """
+        pairs of objects whose bounding boxes come closer than the skin
+        """
+        extents = self.half_extents+self.radius[:, None]+0.5*self.skin
+        bounds = np.concatenate([self.positions-extents,
+                                 self.positions+extents], axis=1)
+        pairs = self.spatial_hash.candidate_pairs(bounds)
+        self.pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.reference = np.array(self.positions)
+        self.n_rebuilds += 1
+
+    def update_neighbors(self):
+        if self.pairs is not None:
+            moved = np.max(np.linalg.norm(self.positions-self.reference,
+                                          axis=1))
+            if moved <= 0.5*self.skin:
+                return
+        self.build_neighbors()
+
+    def forces(self):
+        """
+        forces (n, 2) on all objects and the largest overlap, the energy at
+        the current positions is kept in self.energy
+        """
+        self.update_neighbors()
+        n_objects = len(self.positions)
+        forces = np.zeros((n_objects, 2))
+        max_overlap = 0.
+        self.energy = 0.
+        if len(self.pairs) > 0:
+            first = self.pairs[:, 0]
+            second = self.pairs[:, 1]
+            delta = self.positions[second]-self.positions[first]
+            if self.box is not None:
+                delta -= self.box*np.round(delta/self.box)
+            overlap, normal = pair_overlaps(
+                delta, self.half_extents[first]+self.half_extents[second],
+                self.radius[first]+self.radius[second])
+            overlap = np.maximum(overlap, 0.)
+            pair_forces = overlap[:, None]*normal
+            for axis in range(2):
+                forces[:, axis] += (
+                    np.bincount(second, pair_forces[:, axis],
+                                minlength=n_objects)-
+                    np.bincount(first, pair_forces[:, axis],
+                                minlength=n_objects))
+            max_overlap = np.max(overlap)
+            self.energy += 0.5*np.sum(overlap**2)
+        if self.walls is not None:
+            extents = self.half_extents+self.radius[:, None]
+            overlap = np.maximum(wall_overlaps(self.positions, extents,
+                                               self.walls), 0.)
+            forces[:, 0] += overlap[:, 0]-overlap[:, 2]
+            forces[:, 1] += overlap[:, 1]-overlap[:, 3]
+            max_overlap = max(max_overlap, np.max(overlap))
+            self.energy += 0.5*np.sum(overlap**2)
+        return forces, max_overlap
+
+    def step(self, forces):
+        """
+        one FIRE step with the forces at the current positions
+        """
+        power = np.sum(forces*self.velocity)
+        if power > 0.:
+            force_norm = np.linalg.norm(forces)
+            if force_norm > 0.:
+                self.velocity = ((1.-self.alpha)*self.velocity+
+                                 self.alpha*np.linalg.norm(self.velocity)*
+                                 forces/force_norm)
+            if self.n_positive > 5:
+                self.time_step = min(1.1*self.time_step, self.max_time_step)
+                self.alpha *= 0.99
+            self.n_positive += 1
+        elif power < 0.:
+            # uphill, with zero power (e.g. at rest at the start) the
+            # velocity is only accelerated along the forces
+            self.velocity[:] = 0.
+            self.time_step *= 0.5
+            self.alpha = self.alpha_start
+            self.n_positive = 0
+        self.velocity += self.time_step*forces
+        self.positions += self.time_step*self.velocity
+
+    def minimize(self, max_iterations=10000):
+        """
+        relaxes the positions until the largest overlap is below the
+        tolerance or for max_iterations steps, returns the largest overlap
+        (of the inflated shapes)
+        """
+        forces, max_overlap = self.forces()
+        while (max_overlap >= self.tolerance and
+               self.n_iterations < max_iterations):
+            self.step(forces)
+            self.n_iterations += 1
+            forces, max_overlap = self.forces()
+        return max_overlap
@@ -1,7 +1,6 @@
 import numpy as np
 import itertools
 from itertools import tee
-import matplotlib.pyplot as plt
 
 
 def pairwise(iterable):
@@ -48,6 +47,7 @@ def is_iterable(obj):
     return hasattr(type(obj), '__iter__') and not isinstance(obj, str)
 
 def plot_vector(start, end, color):
+    import matplotlib.pyplot as plt
     x = [start[0],end[0]]
     y = [start[1],end[1]]
 
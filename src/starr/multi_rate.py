@@ -0,0 +1,328 @@
+"""
+Multi-rate (block) time stepping for physics based mechanical simulations.
+
+Instead of one global time step for all objects, every object group is put
+into a level at the start of a block. A group on level L takes steps of
+block_step/2**L, so slow groups in uncrowded regions are updated (and
+collision tested) only a few times per block while fast or crowded groups
+are updated up to 2**max_level times.
+
+The level of a group is the coarsest one on which a single step moves it at
+most the distance to its nearest neighbour, a group with no neighbour within
+the distance it travels over the whole block takes one step per block.
+
+The block is processed in 2**max_level fine sub-steps. At every sub-step the
+groups whose next step starts at that time are active and are moved to the
+end time of their step right away. A group which is not active therefore
+sits at the end time of its own (longer) step, and is drifted back
+ballistically whenever it has to be compared with active groups. If the
+swept bounds of an active group touch those of an inactive group, the
+inactive group is synchronised (drifted back to the current time) and
+promoted to the level of the active group for the rest of the block, so
+colliding groups always share the same time and time step.
+
+The broad-phase runs once per block, on the bounds of every object swept over
+the whole block (and the longest step past its end). A sub-step only tests
+the pairs of this list which contain an active group, and the active groups
+against the static layer, so inactive groups cost nothing. When a collision
+changes the velocity of a group, its bounds are swept anew over the rest of
+the block and matched against the swept bounds of all other objects, so the
+list covers every contact of the block.
+"""
+
+import numpy as np
+import shapely
+from starr.broad_phase import (get_bounds, bounds_overlap,
+                               periodic_bounds_overlap)
+from starr.geometry_array import materialize
+
+
+class MultiRateStepper():
+
+    def __init__(self, simulation, max_level=3):
+        self.simulation = simulation
+        self.max_level = max_level
+        self.level = np.zeros(0, dtype=int)
+        self.next_index = np.zeros(0, dtype=int)
+        self.n_updates = 0
+
+    def collect(self):
+        """
+        all objects of the simulation followed by the static world objects,
+        the group index of every object (-1 for static objects) and the
+        velocity of every object
+        """
+        objects = []
+        owner = []
+        for i_group, group in enumerate(self.simulation.object_groups):
+            objects += group.objects
+            owner += [i_group]*len(group.objects)
+        static_objects = self.simulation.static_objects()
+        objects += static_objects
+        owner += [-1]*len(static_objects)
+        velocity = np.zeros((len(objects), 2))
+        for i_obj, obj in enumerate(objects):
+            if obj.physics is not None and not obj.physics.static:
+                velocity[i_obj] = obj.physics.velocity
+        return objects, np.array(owner, dtype=int), velocity
+
+    def candidate_pairs(self, objects, owner, bounds):
+        """
+        index pairs of objects from different groups with overlapping bounds,
+        the static objects at the end of objects are matched through the
+        static layer and the analytic walls of the world
+        """
+        n_moving = np.count_nonzero(owner >= 0)
+        pairs = self.moving_pairs(objects, owner, bounds)
+        pairs += self.static_pairs(objects, owner, bounds[:n_moving],
+                                   np.arange(n_moving))
+        return pairs
+
+    def moving_pairs(self, objects, owner, bounds):
+        """
+        index pairs of objects from different groups with overlapping bounds
+        """
+        n_moving = np.count_nonzero(owner >= 0)
+        keys = [id(obj) for obj in objects[:n_moving]]
+        pairs = []
+        for i_obj, j_obj in self.simulation.broad_phase.candidate_pairs(
+                bounds[:n_moving], keys=keys):
+            if owner[i_obj] != owner[j_obj]:
+                pairs.append((i_obj, j_obj))
+        return pairs
+
+    def static_pairs(self, objects, owner, bounds, query):
+        """
+        index pairs of the moving objects query, with the given bounds, and
+        the static objects (or the analytic walls) they may touch
+        """
+        n_moving = np.count_nonzero(owner >= 0)
+        world = self.simulation.world
+        pairs = []
+        for i_query, i_static in world.static_layer.query(bounds).tolist():
+            pairs.append((query[i_query], n_moving+i_static))
+        if world.analytic_walls:
+            # collect appends the buffer (standing in for the walls) last
+            i_walls = len(objects)-1
+            for i_query in world.touching_walls(bounds):
+                pairs.append((query[i_query], i_walls))
+        return pairs
+
+    def overlapping(self, bounds, pairs):
+        """
+        mask of the index pairs whose bounds overlap (at their closest
+        periodic images if the broad-phase has a box)
+        """
+        box = self.simulation.broad_phase.box
+        if box is None:
+            return bounds_overlap(bounds, pairs)
+        return periodic_bounds_overlap(bounds, pairs, box)
+
+    def query_pairs(self, objects, owner, bounds, query):
+        """
+        index pairs of the moving objects query with all moving objects of
+        other groups whose bounds overlap theirs
+        """
+        n_moving = np.count_nonzero(owner >= 0)
+        others = np.arange(n_moving)
+        pairs = np.stack([np.repeat(query, n_moving),
+                          np.tile(others, len(query))], axis=1)
+        pairs = pairs[owner[pairs[:, 0]] != owner[pairs[:, 1]]]
+        return np.sort(pairs[self.overlapping(bounds, pairs)], axis=1)
+
+    def clearance(self, objects, owner, reach):
+        """
+        distance from every group to its nearest neighbour (another group or
+        a static object). Neighbours are searched within reach (per object)
+        of every object, groups without one have an infinite clearance.
+        """
+        n_groups = len(self.simulation.object_groups)
+        gap = np.full(n_groups, np.inf)
+        bounds = get_bounds(objects)+np.outer(reach,
+                                              np.array([-1., -1., 1., 1.]))
+        pairs = self.candidate_pairs(objects, owner, bounds)
+        if len(pairs) == 0:
+            return gap
+        pairs = np.array(pairs)
+        walls = np.array([self.simulation.is_wall_pair(objects[i_obj],
+                                                       objects[j_obj])
+                          for i_obj, j_obj in pairs])
+        pair_gap = np.zeros(len(pairs))
+        geometries = [self.simulation.image_geometries(objects[i_obj],
+                                                       objects[j_obj])
+                      for i_obj, j_obj in pairs[~walls]]
+        pair_gap[~walls] = shapely.distance(
+            materialize([geo1 for geo1, geo2 in geometries]),
+            materialize([geo2 for geo1, geo2 in geometries]))
+        if np.any(walls):
+            pair_gap[walls] = self.simulation.world.wall_distance(
+                get_bounds([objects[i_obj] for i_obj in pairs[walls, 0]]))
+        for column in range(2):
+            group = owner[pairs[:, column]]
+            moving = group >= 0
+            np.minimum.at(gap, group[moving], pair_gap[moving])
+        return gap
+
+    def assign_levels(self, block_step):
+        """
+        puts every group into the coarsest level whose time step lets it
+        move at most the clearance to its nearest neighbour, groups with no
+        neighbour within the distance they move over the block take a single
+        step
+        """
+        objects, owner, velocity = self.collect()
+        groups = self.simulation.object_groups
+        speed = np.zeros(len(groups))
+        for i_group, group in enumerate(groups):
+            i_obj = np.flatnonzero(owner == i_group)[0]
+            speed[i_group] = np.linalg.norm(velocity[i_obj])
+        moving = owner >= 0
+        reach = np.zeros(len(objects))
+        reach[moving] = block_step*speed[owner[moving]]
+        gap = self.clearance(objects, owner, reach)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = block_step*speed/gap
+            level = np.ceil(np.log2(ratio))
+        level[speed == 0.] = 0
+        level[np.isnan(level)] = self.max_level
+        self.level = np.clip(level, 0, self.max_level).astype(int)
+        self.next_index = np.zeros(len(groups), dtype=int)
+
+    def stride(self):
+        return 2**(self.max_level-self.level)
+
+    def drift(self, group, time_delta):
+        """
+        moves all objects of a group ballistically without consuming
+        impulses, used to synchronise a group with the current time
+        """
+        canvas = self.simulation.canvas
+        for obj in group.objects:
+            obj.translate(time_delta*obj.physics.velocity)
+            obj.geometry.update(obj)
+            if obj.graphics is not None and canvas is not None:
+                obj.graphics.update(obj.geometry, canvas)
+
+    def promote(self, pairs, owner, active, index, fine_step):
+        """
+        synchronises and promotes inactive groups which may collide with an
+        active group, returns True if a group was promoted
+        """
+        promoted = False
+        for i_obj, j_obj in pairs:
+            group1 = owner[i_obj]
+            group2 = owner[j_obj]
+            if group1 < 0 or group2 < 0 or active[group1] == active[group2]:
+                continue
+            if active[group1]:
+                fast, slow = group1, group2
+            else:
+                fast, slow = group2, group1
+            group = self.simulation.object_groups[slow]
+            self.drift(group, (index-self.next_index[slow])*fine_step)
+            self.level[slow] = max(self.level[slow], self.level[fast])
+            self.next_index[slow] = index
+            active[slow] = True
+            promoted = True
+        return promoted
+
+    def step_pairs(self, objects, owner, velocity, block_pairs, active, index,
+                   fine_step):
+        """
+        pairs of the block list with an active group, and of active objects
+        with static objects, whose bounds swept over the current step of
+        their groups overlap
+        """
+        active_object = np.zeros(len(objects), dtype=bool)
+        moving = owner >= 0
+        active_object[moving] = active[owner[moving]]
+        pairs = block_pairs[active_object[block_pairs[:, 0]] |
+                            active_object[block_pairs[:, 1]]]
+        involved, local = np.unique(
+            np.concatenate([np.flatnonzero(active_object), pairs.ravel()]),
+            return_inverse=True)
+        local = local[np.count_nonzero(active_object):].reshape(-1, 2)
+        group = owner[involved]
+        object_time = self.next_index[group]*fine_step
+        object_step = self.stride()[group]*fine_step
+        drift = velocity[involved]*(index*fine_step-object_time)[:, None]
+        start = get_bounds([objects[i_obj] for i_obj in involved])
+        start += np.tile(drift, 2)
+        end = start+np.tile(velocity[involved]*object_step[:, None], 2)
+        swept = np.concatenate([np.minimum(start[:, :2], end[:, :2]),
+                                np.maximum(start[:, 2:], end[:, 2:])], axis=1)
+        result = [tuple(pair) for pair
+                  in pairs[self.overlapping(swept, local)].tolist()]
+        query = active_object[involved]
+        result += self.static_pairs(objects, owner, swept[query],
+                                    involved[query])
+        return result
+
+    def advance(self, block_step):
+        """
+        advances all groups by block_step, the levels are reassigned at the
+        start of the block
+        """
+        simulation = self.simulation
+        groups = simulation.object_groups
+        self.assign_levels(block_step)
+        n_fine = 2**self.max_level
+        fine_step = block_step/n_fine
+        objects, owner, velocity = self.collect()
+        # a group promoted late in the block may step past its end, by at
+        # most one block step
+        start = get_bounds(objects)
+        end = start+np.tile(velocity*2.*block_step, 2)
+        block_bounds = np.concatenate([np.minimum(start[:, :2], end[:, :2]),
+                                       np.maximum(start[:, 2:], end[:, 2:])],
+                                      axis=1)
+        block_pairs = self.moving_pairs(objects, owner, block_bounds)
+        block_pairs = np.sort(np.array(block_pairs, dtype=int).reshape(-1, 2),
+                              axis=1)
+        group_objects = [np.flatnonzero(owner == i_group)
+                         for i_group in range(len(groups))]
+        for index in range(n_fine):
+            active = self.next_index == index
+            if not np.any(active):
+                continue
+            pairs = self.step_pairs(objects, owner, velocity, block_pairs,
+                                    active, index, fine_step)
+            while self.promote(pairs, owner, active, index, fine_step):
+                pairs = self.step_pairs(objects, owner, velocity, block_pairs,
+                                        active, index, fine_step)
+
+            contact_pairs = []
+            for i_obj, j_obj in pairs:
+                group1 = owner[i_obj]
+                group2 = owner[j_obj]
+                if (group1 < 0 or active[group1]) and (group2 < 0 or
+                                                       active[group2]):
+                    contact_pairs.append((objects[i_obj], objects[j_obj]))
+            simulation.calculate_collisions(contact_pairs)
+
+            stride = self.stride()
+            changed = []
+            for i_group in np.flatnonzero(active):
+                groups[i_group].update(stride[i_group]*fine_step,
+                                       simulation.world, simulation.canvas)
+                self.next_index[i_group] += stride[i_group]
+                self.n_updates += 1
+                members = group_objects[i_group]
+                new_velocity = groups[i_group].objects[0].physics.velocity
+                if not np.array_equal(new_velocity, velocity[members[0]]):
+                    velocity[members] = new_velocity
+                    changed.append(members)
+            if len(changed) > 0:
+                # sweep the new paths over the rest of the block
+                changed = np.concatenate(changed)
+                remaining = (2.*block_step-
+                             self.next_index[owner[changed]]*fine_step)
+                start = get_bounds([objects[i_obj] for i_obj in changed])
+                end = start+np.tile(velocity[changed]*remaining[:, None], 2)
+                block_bounds[changed] = np.concatenate(
+                    [np.minimum(start[:, :2], end[:, :2]),
+                     np.maximum(start[:, 2:], end[:, 2:])], axis=1)
+                new_pairs = self.query_pairs(objects, owner, block_bounds,
+                                             changed)
+                block_pairs = np.unique(
+                    np.concatenate([block_pairs, new_pairs]), axis=0)
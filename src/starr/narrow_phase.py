@@ -0,0 +1,307 @@
+"""
+Implements the narrow-phase of collision detection used for physics based
+mechanical simulations. Contacts between circles and between circles and axis
+aligned rectangles are computed in closed form from the shape parameters,
+contacts of circles with GeneralPolygon objects (e.g. the buffer of the world)
+from the distance of the centre to the edges of the polygon, so circles never
+need a polygon. All other combinations (polygons with each other, rotated
+rectangles) fall back to shapely.
+
+A contact is returned as a tuple (depth, point, normal) where depth is the
+penetration depth, point is the contact point and normal is the unit contact
+normal pointing from the first to the second geometry.
+
+BatchNarrowPhase evaluates many polygon pairs at once with the vectorized
+shapely 2 functions, optionally split over a pool of threads (shapely releases
+the GIL inside these calls).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+from starr.geometry_component import (Circle, Rectangle, GeneralPolygon,
+                                      closest_edge_normals)
+from starr.geometry_array import materialize
+
+
+def is_axis_aligned(rectangle, tolerance=1e-9):
+    remainder = np.mod(rectangle._rotation, 90.)
+    return remainder < tolerance or 90.-remainder < tolerance
+
+def half_extents(rectangle):
+    half = np.array([rectangle.side_length_a, rectangle.side_length_b])*0.5
+    if np.mod(np.round(rectangle._rotation/90.), 2) == 1:
+        half = half[::-1]
+    return half
+
+def is_analytic(geo1, geo2):
+    """
+    returns True if the contact between geo1 and geo2 can be computed without
+    shapely
+    """
+    for geo_a, geo_b in [(geo1, geo2), (geo2, geo1)]:
+        if isinstance(geo_a, Circle):
+            if isinstance(geo_b, Circle):
+                return True
+            if isinstance(geo_b, Rectangle) and is_axis_aligned(geo_b):
+                return True
+            if isinstance(geo_b, GeneralPolygon):
+                return True
+    return False
+
+def circle_circle(circle1, circle2):
+    separation = circle2._position-circle1._position
+    distance = np.hypot(separation[0], separation[1])
+    depth = circle1.radius+circle2.radius-distance
+    if depth <= 0.:
+        return None
+    if distance > 0.:
+        normal = separation/distance
+    else:
+        normal = np.array([1., 0.])
+    point = circle1._position + normal*(circle1.radius-0.5*depth)
+    return depth, point, normal
+
+def circle_rectangle(circle, rectangle):
+    half = half_extents(rectangle)
+    center = rectangle._position
+    local = circle._position-center
+    closest = np.clip(local, -half, half)
+    separation = local-closest
+    distance = np.hypot(separation[0], separation[1])
+    if distance > 0.:
+        depth = circle.radius-distance
+        if depth <= 0.:
+            return None
+        normal = -separation/distance
+        point = center + closest + 0.5*depth*normal
+        return depth, point, normal
+    # circle center inside the rectangle, push out through the nearest side
+    face_distance = np.concatenate([half-local, half+local])
+    side = np.argmin(face_distance)
+    normal = np.zeros(2)
+    normal[side % 2] = -1. if side < 2 else 1.
+    depth = circle.radius+face_distance[side]
+    return depth, np.array(circle._position), normal
+
+def polygon_edges(polygon):
+    """
+    start and end points of the edges of all rings (exterior and holes) of a
+    shapely polygon
+    """
+    coords, index = shapely.get_coordinates(shapely.get_rings(polygon),
+                                            return_index=True)
+    edge = index[:-1] == index[1:]
+    return coords[:-1][edge], coords[1:][edge]
+
+def circle_polygon(circle, polygon):
+    """
+    contact of a circle with a GeneralPolygon from the closest point of the
+    polygon edges to the centre, the circle polygon is not needed
+    """
+    center = circle._position
+    starts, ends = polygon_edges(polygon.polygon)
+    segments = ends-starts
+    length2 = np.sum(segments**2, axis=1)
+    projection = np.sum((center-starts)*segments, axis=1)
+    fraction = np.divide(projection, length2, out=np.zeros_like(projection),
+                         where=length2 > 0.)
+    closest = starts+np.clip(fraction, 0., 1.)[:, None]*segments
+    separation = center-closest
+    distance = np.hypot(separation[:, 0], separation[:, 1])
+    nearest = np.argmin(distance)
+    closest = closest[nearest]
+    separation = separation[nearest]
+    distance = distance[nearest]
+    if distance > 0.:
+        normal = -separation/distance
+    else:
+        normal = np.array([1., 0.])
+    if not shapely.contains_xy(polygon.polygon, center[0], center[1]):
+        depth = circle.radius-distance
+        if depth <= 0.:
+            return None
+        return depth, closest+0.5*depth*normal, normal
+    # circle center inside the polygon, push out through the nearest edge
+    depth = circle.radius+distance
+    return depth, np.array(center), -normal
+
+def circle_contact(circle, geometry):
+    if isinstance(geometry, Circle):
+        return circle_circle(circle, geometry)
+    if isinstance(geometry, GeneralPolygon):
+        return circle_polygon(circle, geometry)
+    return circle_rectangle(circle, geometry)
+
+def analytic_contact(geo1, geo2):
+    if isinstance(geo1, Circle):
+        return circle_contact(geo1, geo2)
+    contact = circle_contact(geo2, geo1)
+    if contact is None:
+        return None
+    depth, point, normal = contact
+    return depth, point, -normal
+
+def translate_polygons(polygons, offsets):
+    """
+    copies of the polygons (object array) translated by offsets (n, 2)
+    """
+    polygons = np.array(polygons, dtype=object)
+    coords, index = shapely.get_coordinates(polygons, return_index=True)
+    return shapely.set_coordinates(polygons, coords+offsets[index])
+
+def orient_normals(normals, polys1, polys2, depths):
+    """
+    flips the (n, 2) normals which point from the second to the first
+    polygon: moving the second polygon by half the depth along the normal
+    has to reduce the overlap. Unlike the direction from the centroid of the
+    first polygon this holds whichever polygon is static, e.g. for the ring
+    shaped buffer whose centroid is not inside it.
+    """
+    normals = np.array(normals, dtype=float).reshape(-1, 2)
+    shift = 0.5*np.reshape(depths, (-1, 1))*normals
+    forward = shapely.area(shapely.intersection(
+        polys1, translate_polygons(polys2, shift)))
+    backward = shapely.area(shapely.intersection(
+        polys1, translate_polygons(polys2, -shift)))
+    normals[forward > backward] *= -1.
+    return normals
+
+def polygon_contact(geo1, geo2):
+    """
+    contact from the shapely intersection of the two polygons. The contact
+    point is the centroid of the intersection, the depth is estimated as
+    twice the intersection area divided by its perimeter and the normal is
+    the normal of the closest edge of geo1, oriented so that moving geo2
+    along it reduces the overlap.
+    """
+    poly1 = geo1.polygon
+    poly2 = geo2.polygon
+    if not poly1.intersects(poly2):
+        return None
+    intersection = poly1.intersection(poly2)
+    center = intersection.centroid
+    point = np.array([center.x, center.y])
+    if intersection.length > 0.:
+        depth = 2.*intersection.area/intersection.length
+    else:
+        depth = 0.
+    normal = orient_normals(geo1.get_normal(point), [poly1], [poly2],
+                            [depth])[0]
+    return depth, point, normal
+
+def get_contact(geo1, geo2):
+    """
+    returns None if the geometries do not overlap, otherwise a tuple
+    (depth, point, normal)
+    """
+    if is_analytic(geo1, geo2):
+        return analytic_contact(geo1, geo2)
+    return polygon_contact(geo1, geo2)
+
+def overlaps(geo1, geo2):
+    if is_analytic(geo1, geo2):
+        return analytic_contact(geo1, geo2) is not None
+    return geo1.polygon.intersects(geo2.polygon)
+
+
+class BatchNarrowPhase():
+    """
+    narrow-phase for a list of candidate pairs. Analytic pairs are handled one
+    by one (they are cheap), all others go through vectorized shapely
+    intersects/intersection calls, split into n_threads chunks.
+    """
+
+    def __init__(self, n_threads=1):
+        self.n_threads = n_threads
+        self.executor = None
+
+    def __getstate__(self):
+        # a thread pool can not be copied or pickled, copies (e.g. the runs
+        # of an ensemble) start their own when they need one
+        state = self.__dict__.copy()
+        state['executor'] = None
+        return state
+
+    def map_chunks(self, function, n_items):
+        if self.n_threads > 1 and n_items > self.n_threads:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.n_threads)
+            chunks = np.array_split(np.arange(n_items), self.n_threads)
+            return list(self.executor.map(function, chunks))
+        return [function(np.arange(n_items))]
+
+    def polygon_pairs(self, pairs):
+        polys1 = materialize([geo1 for geo1, geo2 in pairs])
+        polys2 = materialize([geo2 for geo1, geo2 in pairs])
+        return polys1, polys2
+
+    def contacts(self, pairs):
+        """
+        pairs is a list of (geo1, geo2) tuples, returns a list with a contact
+        tuple (depth, point, normal) or None for every pair
+        """
+        contacts = [None]*len(pairs)
+        polygon_index = []
+        for i_pair, (geo1, geo2) in enumerate(pairs):
+            if is_analytic(geo1, geo2):
+                contacts[i_pair] = analytic_contact(geo1, geo2)
+            else:
+                polygon_index.append(i_pair)
+        if len(polygon_index) == 0:
+            return contacts
+        polys1, polys2 = self.polygon_pairs([pairs[i_pair] for i_pair
+                                             in polygon_index])
+
+        def intersect_chunk(chunk):
+            hit = chunk[shapely.intersects(polys1[chunk], polys2[chunk])]
+            intersection = shapely.intersection(polys1[hit], polys2[hit])
+            centroid = shapely.centroid(intersection)
+            points = np.stack([shapely.get_x(centroid),
+                               shapely.get_y(centroid)], axis=1)
+            area = shapely.area(intersection)
+            length = shapely.length(intersection)
+            depths = np.divide(2.*area, length, out=np.zeros_like(area),
+                               where=length > 0.)
+            normals = orient_normals(
+                closest_edge_normals(polys1[hit], points), polys1[hit],
+                polys2[hit], depths)
+            return hit, points, normals, depths
+
+        for hit, points, normals, depths in self.map_chunks(
+                intersect_chunk, len(polygon_index)):
+            for i_hit, i_poly in enumerate(hit):
+                i_pair = polygon_index[i_poly]
+                geo1 = pairs[i_pair][0]
+                point = points[i_hit]
+                if isinstance(geo1, Circle):
+                    normal = geo1.get_normal(point)
+                else:
+                    normal = normals[i_hit]
+                contacts[i_pair] = (depths[i_hit], point, normal)
+        return contacts
+
+    def overlaps(self, pairs):
+        """
+        returns a boolean array, True for every (geo1, geo2) pair which overlaps
+        """
+        result = np.zeros(len(pairs), dtype=bool)
+        polygon_index = []
+        for i_pair, (geo1, geo2) in enumerate(pairs):
+            if is_analytic(geo1, geo2):
+                result[i_pair] = analytic_contact(geo1, geo2) is not None
+            else:
+                polygon_index.append(i_pair)
+        if len(polygon_index) == 0:
+            return result
+        polygon_index = np.array(polygon_index)
+        polys1, polys2 = self.polygon_pairs([pairs[i_pair] for i_pair
+                                             in polygon_index])
+
+        def intersects_chunk(chunk):
+            return chunk, shapely.intersects(polys1[chunk], polys2[chunk])
+
+        for chunk, hit in self.map_chunks(intersects_chunk,
+                                          len(polygon_index)):
+            result[polygon_index[chunk]] = hit
+        return result
@@ -3,14 +3,24 @@ from starr.geometry_component import Circle, Rectangle, GeneralPolygon
 from starr.physics_component import PhysicsComponent
 from starr.graphics_component import GraphicsComponent
 from starr.misc import is_iterable
+import copy
 import numpy as np
 def insert_defaults(keys):
     default_keys = {'mass':1.0, 'color':'b', 'fill':True,
-                    'edge_color':'k'}
+                    'edge_color':'k', 'graphics':True}
     for key in default_keys:
         if key not in keys:
             keys[key] = default_keys[key]
 
+def make_graphics(keys):
+    """
+    graphics component from the keys, None if keys['graphics'] is False
+    (headless simulations)
+    """
+    if not keys['graphics']:
+        return None
+    return GraphicsComponent(keys['color'], keys['fill'], keys['edge_color'])
+
 def generate_object(keys):
 
     shape = keys['shape']
@@ -25,38 +35,45 @@ def object_from_polygon(keys, polygon):
     insert_defaults(keys)
     geo = GeneralPolygon(polygon)
     phys = PhysicsComponent(keys['mass'])
-    graph = GraphicsComponent(keys['color'], keys['fill'], keys['edge_color'])
+    graph = make_graphics(keys)
     return SimulationObject(geo, phys, graph)
 
 def circle(keys):
-    geo = Circle(keys['radius'])
+    if 'resolution' in keys:
+        geo = Circle(keys['radius'], keys['resolution'])
+    else:
+        geo = Circle(keys['radius'])
     phys = PhysicsComponent(keys['mass'])
-    graph = GraphicsComponent(keys['color'], keys['fill'], keys['edge_color'])
+    graph = make_graphics(keys)
     return SimulationObject(geo, phys, graph)
 
 def rectangle(keys):
     geo = Rectangle(keys['side_length_a'],
                     keys['side_length_b'])
     phys = PhysicsComponent(keys['mass'])
-    graph = GraphicsComponent(keys['color'], keys['fill'], keys['edge_color'])
+    graph = make_graphics(keys)
     return SimulationObject(geo, phys, graph)
 
 def clone(sim_object):
     keys = {}
     keys['mass'] = sim_object.physics.mass
-    keys['color'] = sim_object.graphics.color
+    if sim_object.graphics is None:
+        keys['graphics'] = False
+    else:
+        keys['color'] = sim_object.graphics.color
     pos = np.array(sim_object.position)
     rot = sim_object.rotation
     geo = sim_object.geometry
     if isinstance(geo, Circle):
         keys['radius'] = geo.radius
+        keys['resolution'] = geo.resolution
         clone_obj = circle(keys)
     elif isinstance(geo, Rectangle):
         keys['side_length_a'] = geo.side_length_a
         keys['side_length_b'] = geo.side_length_b
         clone_obj = rectangle(keys)
     elif isinstance(geo, GeneralPolygon):
-        clone_obj = object_from_polygon(keys, geo._polygon)
+        clone_obj = object_from_polygon(keys, geo.local_polygon)
     #clone_obj.physics.velocity = np.array(sim_object.physics.velocity)
     #clone_obj.physics.update_energy()
     #clone_obj.physics.update_momentum()
@@ -95,3 +112,30 @@ def generate_group(keys):
         obj = factory_dict[shape](sliced_keys)
         group.append(obj)
     return group
+
+
+def generate_groups(keys, positions, colors=None):
+    """
+    single object groups of identical objects described by keys, one at
+    every row of positions (n, 2). The objects share the body frame polygon
+    of one prototype shape, colors is an optional list with the color of
+    every object.
+    """
+    insert_defaults(keys)
+    factory_dict = {'Circle': circle,
+                    'Rectangle': rectangle}
+    prototype = factory_dict[keys['shape']](keys).geometry
+    prototype.local_polygon
+    groups = []
+    for i_obj, position in enumerate(np.asarray(positions, dtype=float)):
+        if colors is not None:
+            keys['color'] = colors[i_obj]
+        obj = SimulationObject(copy.copy(prototype),
+                               PhysicsComponent(keys['mass']),
+                               make_graphics(keys))
+        obj.position = np.array(position)
+        obj.geometry.create_polygon(position, 0.)
+        group = ObjectGroup()
+        group.append(obj)
+        groups.append(group)
+    return groups
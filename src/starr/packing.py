@@ -0,0 +1,145 @@
+"""
+Generation of random non-overlapping starting configurations.
+
+Random sequential adsorption (RSA): identical particles are placed one after
+another at uniformly random positions, a position is rejected if the particle
+would overlap one of the particles placed before. Overlaps are only tested
+against the particles in the neighbouring cells of a uniform grid with cells
+of the particle diameter, so every attempt costs O(1). Placement stops when
+the requested number of particles is reached or when many attempts in a row
+are rejected (the jamming limit of RSA, about 0.547 for disks).
+"""
+
+import math
+import numpy as np
+import shapely
+from starr.geometry_component import Rectangle
+
+
+def particle_shape(keys):
+    """
+    half extents of the (axis aligned) particle described by the object
+    keywords and True if it is a circle
+    """
+    if keys['shape'] == 'Circle':
+        return np.array([keys['radius'], keys['radius']]), True
+    if keys['shape'] == 'Rectangle':
+        return np.array([0.5*keys['side_length_a'],
+                         0.5*keys['side_length_b']]), False
+    raise ValueError("random sequential adsorption is not implemented for "+
+                     "shape {}".format(keys['shape']))
+
+def particle_area(half_extents, circle):
+    if circle:
+        return math.pi*half_extents[0]**2
+    return 4.*half_extents[0]*half_extents[1]
+
+def placement_region(boundary, half_extents, circle):
+    """
+    bounds of the positions at which a particle lies completely inside the
+    boundary object and the eroded boundary polygon to test positions
+    against (None if the bounds are exact)
+    """
+    geometry = boundary.geometry
+    if isinstance(geometry, Rectangle) and boundary.rotation == 0.:
+        bounds = np.array(geometry.bounds())
+        return bounds+np.concatenate([half_extents, -half_extents]), None
+    if circle:
+        reach = half_extents[0]
+    else:
+        reach = np.hypot(*half_extents)
+    region = geometry.polygon.buffer(-reach)
+    if region.is_empty:
+        return None, None
+    shapely.prepare(region)
+    return np.array(region.bounds), region
+
+def overlap(dx, dy, half_extents, circle):
+    if circle:
+        diameter = 2.*half_extents[0]
+        return dx*dx+dy*dy < diameter*diameter
+    return (abs(dx) < 2.*half_extents[0]) and (abs(dy) < 2.*half_extents[1])
+
+def random_sequential_adsorption(bounds, half_extents, circle, n_target, rng,
+                                 region=None, static_layer=None,
+                                 max_failures=10000, batch_size=1024):
+    """
+    positions (n, 2) of up to n_target identical particles with centres in
+    bounds (minx, miny, maxx, maxy) and, if given, inside the prepared
+    polygon region. Positions at which the bounding box of a particle
+    touches an object of static_layer are rejected. Particles are circles of
+    radius half_extents[0] if circle, otherwise axis aligned rectangles with
+    the given half extents. rng is a numpy Generator. Stops early after
+    max_failures positions in a row overlapped a placed particle (jamming),
+    or if max_failures positions in a row fell outside region or onto
+    static objects (no free space left).
+    """
+    positions = []
+    if bounds is None or np.any(bounds[2:] < bounds[:2]):
+        return np.zeros((0, 2))
+    cell_size = 2.*np.max(half_extents)
+    cells = {}
+    failures = 0
+    misses = 0
+    while (len(positions) < n_target and failures < max_failures and
+           misses < max_failures):
+        candidates = rng.uniform(bounds[:2], bounds[2:], size=(batch_size, 2))
+        if region is not None:
+            candidates = candidates[shapely.contains_xy(region,
+                                                        candidates[:, 0],
+                                                        candidates[:, 1])]
+        if static_layer is not None and len(static_layer) > 0:
+            boxes = np.concatenate([candidates-half_extents,
+                                    candidates+half_extents], axis=1)
+            blocked = np.zeros(len(candidates), dtype=bool)
+            blocked[static_layer.query(boxes)[:, 0]] = True
+            candidates = candidates[~blocked]
+        if len(candidates) == 0:
+            misses += batch_size
+            continue
+        misses = 0
+        for x, y in candidates.tolist():
+            ix = math.floor(x/cell_size)
+            iy = math.floor(y/cell_size)
+            rejected = False
+            for jx in (ix-1, ix, ix+1):
+                for jy in (iy-1, iy, iy+1):
+                    for i_other in cells.get((jx, jy), ()):
+                        other = positions[i_other]
+                        if overlap(x-other[0], y-other[1], half_extents,
+                                   circle):
+                            rejected = True
+                            break
+                    if rejected:
+                        break
+                if rejected:
+                    break
+            if rejected:
+                failures += 1
+                if failures >= max_failures:
+                    break
+                continue
+            failures = 0
+            cells.setdefault((ix, iy), []).append(len(positions))
+            positions.append((x, y))
+            if len(positions) == n_target:
+                break
+    return np.array(positions, dtype=float).reshape(-1, 2)
+
+def pack(world, keys, target_density, rng, max_failures=10000):
+    """
+    RSA positions of particles described by the object keywords inside the
+    boundary of world and clear of its static objects, until the area
+    fraction reaches target_density or the jamming limit is reached. Returns
+    the positions and the density.
+    """
+    half_extents, circle = particle_shape(keys)
+    area = particle_area(half_extents, circle)
+    domain_area = world.boundary.geometry.area()
+    n_target = int(math.ceil(target_density*domain_area/area))
+    bounds, region = placement_region(world.boundary, half_extents, circle)
+    positions = random_sequential_adsorption(bounds, half_extents, circle,
+                                             n_target, rng, region=region,
+                                             static_layer=world.static_layer,
+                                             max_failures=max_failures)
+    return positions, len(positions)*area/domain_area
@@ -1,6 +1,43 @@
 import numpy as np
 import itertools
-class PhysicsComponent():
+from starr.body_store import Stored, StoredAttribute
+
+RESTITUTION = 0.90
+
+def resolve_contacts(store, body1, body2, normal, restitution=RESTITUTION):
+    """
+    applies the collision impulses of all contacts of a step in one pass.
+    body1, body2 are arrays of body indices into the BodyStore and normal is
+    an (n_contacts, 2) array. This is equivalent to calling
+    PhysicsComponent.collision for both bodies of every contact, except that
+    static bodies are treated as having infinite mass.
+    """
+    body1 = np.asarray(body1, dtype=int)
+    body2 = np.asarray(body2, dtype=int)
+    normal = np.asarray(normal, dtype=float).reshape(-1, 2)
+    inverse_mass = np.where(store.static, 0., 1./store.mass)
+    inverse_mass1 = inverse_mass[body1]
+    inverse_mass2 = inverse_mass[body2]
+    denom = inverse_mass1+inverse_mass2
+    v12 = store.velocity[body1]-store.velocity[body2]
+    numerator = -(1+restitution)*np.sum(v12*normal, axis=1)
+    impulse = np.zeros(body1.size)
+    valid = denom > 0.
+    impulse[valid] = numerator[valid]/denom[valid]
+    np.add.at(store.acceleration, body1,
+              (impulse*inverse_mass1)[:, None]*normal)
+    np.add.at(store.acceleration, body2,
+              -(impulse*inverse_mass2)[:, None]*normal)
+
+class PhysicsComponent(Stored):
+    static = StoredAttribute()
+    mass = StoredAttribute()
+    velocity = StoredAttribute()
+    acceleration = StoredAttribute()
+    kinetic_energy = StoredAttribute()
+    momentum = StoredAttribute()
+    stored_attributes = ('static', 'mass', 'velocity', 'acceleration',
+                         'kinetic_energy', 'momentum')
 
     def __init__(self, mass, static=False):
         #self.parent = parent
@@ -54,7 +91,7 @@ class PhysicsComponent():
         v2c_init = v2_init
 
         v12_init = v1c_init - v2c_init
-        j = self.get_impulse(0.90, v12_init, normal, m1, m2)
+        j = self.get_impulse(RESTITUTION, v12_init, normal, m1, m2)
         self.apply_force((j*normal/m1))
         self.previous_collisions[0] = other
 
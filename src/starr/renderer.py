@@ -0,0 +1,99 @@
+"""
+A renderer which draws all moving objects of a simulation as a single
+matplotlib PolyCollection instead of one descartes PolygonPatch per object.
+
+Every frame, the exterior vertices of all polygons are gathered with one
+shapely call and handed to the collection, colours are only converted when
+they change. The static world (buffer, boundary and obstacles) is drawn once as
+PathPatches and becomes part of the cached background of the Canvas, the
+collection is an animated artist which is blitted on top of it.
+"""
+
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+from starr.geometry_array import materialize
+
+
+def polygon_path(polygon):
+    """
+    matplotlib Path of a shapely polygon including its holes
+    """
+    from matplotlib.path import Path
+    polygon = orient(polygon)
+    rings = [polygon.exterior]+list(polygon.interiors)
+    vertices = []
+    codes = []
+    for ring in rings:
+        coords = np.asarray(ring.coords)
+        ring_codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+        ring_codes[0] = Path.MOVETO
+        ring_codes[-1] = Path.CLOSEPOLY
+        vertices.append(coords)
+        codes.append(ring_codes)
+    return Path(np.concatenate(vertices), np.concatenate(codes))
+
+
+class CollectionRenderer():
+
+    def __init__(self, canvas):
+        from matplotlib.collections import PolyCollection
+        self.canvas = canvas
+        self.collection = PolyCollection([], closed=False, zorder=2)
+        canvas.axes.add_collection(self.collection)
+        canvas.add_animated(self.collection)
+        canvas.renderer = self
+        self.colors = None
+
+    def draw_world(self, world):
+        """
+        draws the static objects of the world once, same order as World.plot
+        """
+        from matplotlib.patches import PathPatch
+        objects = []
+        if world.buffer is not None:
+            objects.append(world.buffer)
+        objects.append(world.boundary)
+        objects += world.obstacles()
+        for obj in objects:
+            graphics = obj.graphics
+            patch = PathPatch(polygon_path(obj.geometry.polygon),
+                              fc=graphics.color, ec=graphics.edge_color,
+                              fill=graphics.fill)
+            self.canvas.axes.add_patch(patch)
+        self.canvas.fig.canvas.draw()
+
+    def snapshot(self, objects):
+        """
+        exterior vertices of the polygons of all objects with a graphics
+        component as one (n_vertices, 2) array, the indices at which it is
+        split into polygons and the colours (color, edge_color, fill)
+        """
+        objects = [obj for obj in objects if obj.graphics is not None]
+        if len(objects) == 0:
+            return np.zeros((0, 2)), np.zeros(0, dtype=int), []
+        rings = shapely.get_exterior_ring(materialize([obj.geometry
+                                                       for obj in objects]))
+        coords, index = shapely.get_coordinates(rings, return_index=True)
+        splits = np.flatnonzero(np.diff(index))+1
+        colors = [(obj.graphics.color, obj.graphics.edge_color,
+                   obj.graphics.fill) for obj in objects]
+        return coords, splits, colors
+
+    def draw(self, coords, splits, colors):
+        """
+        sets the vertices and, if they changed, the colours of the collection
+        """
+        if len(colors) == 0:
+            self.collection.set_verts([])
+            return
+        self.collection.set_verts(np.split(coords, splits), closed=False)
+        if colors != self.colors:
+            self.collection.set_facecolor([color if fill else 'none'
+                                           for color, edge, fill in colors])
+            self.collection.set_edgecolor([edge for color, edge, fill
+                                           in colors])
+            self.colors = colors
+
+    def update(self, objects):
+        self.draw(*self.snapshot(objects))
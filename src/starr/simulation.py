@@ -5,38 +5,81 @@ A class for running physics based mechanics simulations
 import random
 import itertools
 import numpy as np
-import matplotlib.colors
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-from random import uniform, seed
-from starr.canvas import Canvas
 from starr.world import World
 from starr.simulation_object import ObjectGroup
-from starr.geometry_component import Circle
-from starr.object_factory import generate_group
+from starr.geometry_component import (Circle, Rectangle, circle_resolution,
+                                      DEFAULT_CIRCLE_RESOLUTION)
+from starr.object_factory import generate_group, generate_groups
 from starr.grid import Grid
-from starr.misc import (square_number_ceil, plot_vector,
+from starr.broad_phase import (make_broad_phase, get_bounds, bounds_overlap,
+                               periodic_bounds_overlap)
+from starr.narrow_phase import get_contact, overlaps, BatchNarrowPhase
+from starr.geometry_array import GeometryArray, PolygonView
+from starr.body_store import BodyStore
+from starr.physics_component import resolve_contacts
+from starr.event_driven import EventDrivenEngine
+from starr.time_of_impact import time_of_impact, swept_bounds, step_velocity
+from starr.multi_rate import MultiRateStepper
+from starr.renderer import CollectionRenderer
+from starr.frame_pipeline import FramePipeline
+from starr.trajectory import TrajectoryWriter
+from starr.packing import pack
+from starr.minimize import FireMinimizer, particle_extents
+from starr.checkpoint import save_checkpoint
+from starr.misc import (is_iterable, square_number_ceil, plot_vector,
                                  order_blockwise_radially, create_regular_grid)
 
 
+def get_cmap(name, n_colors=None):
+    """
+    colormap by name, resampled to n_colors if given (matplotlib.cm.get_cmap
+    was removed in matplotlib 3.9)
+    """
+    try:
+        from matplotlib import colormaps
+    except ImportError:
+        import matplotlib.cm as cm
+        return cm.get_cmap(name, n_colors)
+    if n_colors is None:
+        return colormaps[name]
+    return colormaps[name].resampled(n_colors)
+
 def get_color_list(n_colors):
-    paired = cm.get_cmap('Paired', n_colors)
+    import matplotlib.colors
+    paired = get_cmap('Paired', n_colors)
     color_list = []
     for row in range(n_colors):
         color_list.append(matplotlib.colors.to_hex(paired.colors[row, :]))
     return color_list
 
 def get_color_map():
-    return cm.get_cmap('magma')
+    return get_cmap('magma')
 
 class Simulation():
 
-    def __init__(self, world_kws, fig=None, axes=None):
+    def __init__(self, world_kws, fig=None, axes=None,
+                 broad_phase='brute_force', vectorized=False, n_threads=1,
+                 renderer='patches', circle_tolerance=None):
+        if renderer not in ('patches', 'collection'):
+            raise ValueError("unknown renderer: {}, ".format(renderer) +
+                             "choose from ['patches', 'collection']")
         self.object_groups = []
+        self.circle_tolerance = circle_tolerance
+        self.i_step = 0
+        self.world = None
+        # per simulation random stream, derived from the global generator so
+        # that scripts calling random.seed stay reproducible
+        self.rng = random.Random(random.getrandbits(64))
+        self.set_broad_phase(broad_phase)
+        self.set_vectorized(vectorized, n_threads=n_threads)
         self.world = self.make_world(world_kws)
+        self.broad_phase.set_box(self.world.image_box())
         if fig is not None and axes is not None:
             self.canvas = self.make_canvas(fig, axes)
-            self.world.plot(self.canvas)
+            if renderer == 'collection':
+                CollectionRenderer(self.canvas).draw_world(self.world)
+            else:
+                self.world.plot(self.canvas)
         else:
             self.canvas = None
         #self.make_objects(object_kws)
@@ -46,39 +89,83 @@ class Simulation():
 
 
     def set_seed(self, seed):
-        random.seed(seed)
+        self.rng = random.Random(seed)
+
+    def set_broad_phase(self, broad_phase, **broad_phase_kws):
+        """
+        select the broad-phase used to find candidate collision pairs, one of
+        'brute_force' (all pairs), 'spatial_hash' (uniform grid) or
+        'sweep_and_prune' (incremental sorted endpoints, suited to dense,
+        slowly moving packings). Keywords are passed to the broad-phase, e.g.
+        cell_size for the spatial hash.
+        """
+        self.broad_phase = make_broad_phase(broad_phase, **broad_phase_kws)
+        if self.world is not None:
+            self.broad_phase.set_box(self.world.image_box())
+
+    def set_vectorized(self, vectorized, n_threads=1):
+        """
+        if vectorized, the state of all bodies is kept in a BodyStore and
+        integrated in one go, the polygons needed by the narrow-phase are
+        built with one shapely 2 coordinate operation and the polygon
+        narrow-phase runs as vectorized shapely calls, split over n_threads
+        threads.
+        """
+        if vectorized:
+            self.store = BodyStore()
+            self.geometry_array = GeometryArray()
+            self.narrow_phase = BatchNarrowPhase(n_threads=n_threads)
+        else:
+            self.store = None
+            self.geometry_array = None
+            self.narrow_phase = None
 
     def make_canvas(self, fig, axes):
+        from starr.canvas import Canvas
         return Canvas(fig, axes)
 
     def make_world(self, keys):
         world = World(keys)
         return world
 
+    def color_list(self, n_colors):
+        """
+        colors for n_colors groups, headless simulations (without canvas) do
+        not look up colormaps
+        """
+        if self.canvas is None:
+            return ['b']*n_colors
+        return get_color_list(n_colors)
+
+    def circle_resolution(self, radius):
+        """
+        segments per quarter circle for circles of radius, the polygon
+        deviates at most circle_tolerance from the circle. Without a
+        tolerance, drawn simulations use half a pixel of the view and
+        headless simulations the default resolution.
+        """
+        tolerance = self.circle_tolerance
+        if tolerance is None and self.canvas is not None:
+            tolerance = 0.5*self.canvas.pixel_size()
+        if tolerance is None:
+            return DEFAULT_CIRCLE_RESOLUTION
+        return circle_resolution(radius, tolerance)
+
     def make_objects(self, object_kws, group_objects=False):
+        if self.canvas is None:
+            object_kws['graphics'] = False
+        if object_kws['shape'] == 'Circle' and 'resolution' not in object_kws:
+            if is_iterable(object_kws['radius']):
+                object_kws['resolution'] = [self.circle_resolution(radius)
+                                            for radius in object_kws['radius']]
+            else:
+                object_kws['resolution'] = self.circle_resolution(
+                    object_kws['radius'])
         if "target_density" in object_kws:
-            target_density = object_kws['target_density']
-            density = 0.0
-            n_particles = 0
-            domain_area = self.world.boundary.geometry.area()
-            object_kws['n_objects'] = 1
-            colors = get_color_list(8)
-            while density < target_density:
-                object_kws['color'] = colors[n_particles]
-                new_obj_group = generate_group(object_kws)
-                new_obj_group.update(0.0, self.world, self.canvas)
-                area = new_obj_group.objects[0].geometry.area()
-                self.object_groups.append(new_obj_group)
-                density += area/domain_area
-                n_particles += 1
-                if n_particles % 8 == 0:
-                    colors += colors
-            print(n_particles)
-            print(density)
-            self.n_particles = n_particles
+            self.make_packing(object_kws)
         else:
             n_particles = object_kws['n_particles']
-            colors = get_color_list(n_particles)
+            colors = self.color_list(n_particles)
             self.n_particles = n_particles
 
             if group_objects:
@@ -96,12 +183,59 @@ class Simulation():
                     new_obj_group.update(0.0, self.world, self.canvas)
                     self.object_groups.append(new_obj_group)
 
+    def make_packing(self, object_kws):
+        """
+        places single object groups by random sequential adsorption (see
+        packing) until their area fraction reaches
+        object_kws['target_density'] or no further object fits,
+        object_kws['max_failures'] is the number of rejected positions in a
+        row after which placement stops (default 10000). The reached
+        density is stored in self.density.
+        """
+        if 'max_failures' in object_kws:
+            max_failures = object_kws['max_failures']
+        else:
+            max_failures = 10000
+        rng = np.random.default_rng(self.rng.getrandbits(64))
+        positions, self.density = pack(self.world, object_kws,
+                                       object_kws['target_density'], rng,
+                                       max_failures=max_failures)
+        n_particles = len(positions)
+        groups = generate_groups(object_kws, positions,
+                                 self.color_list(n_particles))
+        if self.canvas is not None:
+            for group in groups:
+                group.update(0.0, self.world, self.canvas)
+        self.object_groups += groups
+        self.n_particles = n_particles
+
     def all_objects(self):
         obj_list = []
         for group in self.object_groups:
             obj_list += group.objects
         return obj_list
 
+    def static_objects(self):
+        """
+        the static objects of the world (buffer and obstacles)
+        """
+        return self.world.static_objects()
+
+    def sync_store(self):
+        """
+        binds all objects and the static world objects to the body store,
+        returns the list of (non static) objects
+        """
+        objects = []
+        groups = []
+        for i_group, group in enumerate(self.object_groups):
+            objects += group.objects
+            groups += [i_group]*len(group.objects)
+        static_objects = self.static_objects()
+        self.store.sync(objects+static_objects,
+                        groups+[-1]*len(static_objects))
+        return objects
+
     def arange_regular_grid(self, grid_kws, group='all', checkerboard=False):
         """
         given a dict of keywords, attempts to arange objects from a certain
@@ -168,105 +302,572 @@ class Simulation():
         for group in self.object_groups:
             obj = group.objects[0]
             velocity = object_kws['velocity']
-            angle = uniform(0.0, 2*np.pi)
+            angle = self.rng.uniform(0.0, 2*np.pi)
             #angle = 0.0
             velocity_x = velocity*np.cos(angle)
             velocity_y = velocity*np.sin(angle)
             v_init = np.array([velocity_x, velocity_y])
             obj.physics.velocity = v_init
 
-    def run(self, object_kws, sim_kws, seed=None):
+    def run(self, object_kws, sim_kws, seed=None, resume=False):
+        """
+        time stepped simulation for at least sim_kws['min_steps'] steps until
+        the configuration is valid, or for sim_kws['max_steps'] steps. With
+        resume the velocities and the step counter of the simulation (e.g.
+        restored by load_checkpoint) are kept instead of starting at step 0
+        with new random velocities. If sim_kws['checkpoint_every'] is given,
+        a checkpoint is written every that many steps (see write_checkpoint).
+        With sim_kws['async_frames'] the returned state also holds the
+        number of frames published, dropped and drawn by the frame pipeline.
+        """
         if seed is not None:
             self.set_seed(seed)
-        self.init_velocity(object_kws)
+        if not resume:
+            self.init_velocity(object_kws)
         min_steps = sim_kws['min_steps']
         max_steps = sim_kws['max_steps']
         time_step = sim_kws['time_step']
+        if 'time_of_impact' in sim_kws:
+            sub_stepping = sim_kws['time_of_impact']
+        else:
+            sub_stepping = False
+        if 'max_sub_steps' in sim_kws:
+            max_sub_steps = sim_kws['max_sub_steps']
+        else:
+            max_sub_steps = 10
+        if 'max_level' in sim_kws:
+            stepper = MultiRateStepper(self, max_level=sim_kws['max_level'])
+        else:
+            stepper = None
+        if 'verbose' in sim_kws:
+            verbose = sim_kws['verbose']
+        else:
+            verbose = True
         valid_finish = False
-        self.i_step = 0
+        if not resume:
+            self.i_step = 0
         distance = object_kws['velocity']*sim_kws['time_step']
+        if resume:
+            # continue with the time step adapted to the restored velocities
+            time_step = self.compute_diags(distance)['time_step']
+        diagnostics = {'energy': [], 'momentum': [], 'max_velocity': [],
+                       'time_step': []}
+        pipeline = self.make_frame_pipeline(sim_kws)
+        recorder = self.make_recorder(sim_kws, resume=resume)
+        elapsed = 0.
+        completed = False
         try:
-            self.canvas.saving()
-            self.canvas.write()
+            if self.canvas is not None:
+                self.canvas.saving()
+                self.write_frame()
+            if pipeline is not None:
+                pipeline.start()
             while not valid_finish:
-                if self.i_step % 10 == 0:
+                if verbose and self.i_step % 10 == 0:
                     print(self.i_step)
-                """
-                collision_pair = self.detect_first_collision(time_step)
-                if collision_pair is not None:
-                    time_step = self.seek_collision_time()
-                    #self.calculate_collisions()
-                    self.calculate_collision(collision_pair)
+                if stepper is not None:
+                    stepper.advance(time_step*2**stepper.max_level)
+                    elapsed += time_step*2**stepper.max_level
+                elif sub_stepping:
+                    self.advance_to_impacts(time_step, max_sub_steps)
+                    elapsed += time_step
                 else:
-                    time_step =
-                """
-                self.calculate_collisions()
-
-                for group in self.object_groups:
-                    group.update(time_step, self.world, self.canvas)
+                    self.calculate_collisions()
+                    self.update_groups(time_step)
+                    elapsed += time_step
 
                 self.world.update(self.object_groups)
 
-                [time_step,v_max] = self.report_diags(distance)
-
-                self.recolor_groups(v_max)
+                diags = self.compute_diags(distance)
+                for key in diagnostics:
+                    diagnostics[key].append(diags[key])
+                if recorder is not None:
+                    recorder.append(self.trajectory_values(elapsed, diags))
+                time_step = diags['time_step']
                 #time_step = distance/max_v
 
                 if self.i_step >= min_steps:
                     valid_finish = self.valid_configuration()
-                if self.i_step == max_steps:
+                if self.i_step >= max_steps:
                     valid_finish = True
 
-                self.canvas.write()
+                if pipeline is not None:
+                    self.recolor_groups(diags['max_velocity'])
+                    pipeline.publish(self.i_step,
+                                     lambda: self.frame_state(diags))
+                elif self.canvas is not None:
+                    self.report(diags)
+                    self.recolor_groups(diags['max_velocity'])
+                    self.write_frame()
                 self.i_step += 1
+                self.write_checkpoint(sim_kws, recorder)
+            completed = True
         finally:
-            self.canvas.finish()
-
-    def detect_first_collision(self, time_step):
-        buffer_group = ObjectGroup()
-        if self.world.buffer is not None:
-            buffer_group.append(self.world.buffer)
-        all_groups = self.object_groups + [buffer_group]
-        test_time_step = time_step
-        for group1, group2 in itertools.combinations(all_groups, 2):
-            for obj1 in group1.objects:
-                for obj2 in group2.objects:
-                    poly1 = obj1.geometry.polygon
-                    poly2 = obj2.geometry.polygon
-                    if poly1.intersects(poly2):
-                        save_pos1 = obj1.position
-                        save_pos2 = obj2.position
-                        intersection = poly1.intersection(poly2)
-                        interestion_area = intersection.area
-                        while interestion_area > obj1.area*1e-2:
-                            test_time_step = -0.5* test_time_step
-                            trans1 = test_time_step*obj1.physics.velocity
-                            trans2 = test_time_step*obj2.physics.velocity
-                            poly1 = poly1.affinity.translate()
-                            obj1.translate( )
-                            obj2.translate( test_time_step*obj2.physics.velocity)
-
-                            new_area = poly1.intersection(poly2)
-
-
-                        intersection = poly1.intersection(poly2)
-                        center = intersection.centroid
-                        collision = np.array([center.x, center.y])
-                        normal1 = obj1.geometry.get_normal(collision)
-                        normal2 = obj1.geometry.get_normal(collision)
-                        """
-                        if not self.valid_collision(normal1, normal2,
-                                                    obj1.physics,
-                                                    obj2.physics):
-                            # not working well
-                            continue
-                        """
-
-                        #for obj11 in group1.objects:
-                        obj1.physics.collision(obj2.physics, normal1)
-                        #for obj22 in group2.objects:
-                        obj2.physics.collision(obj1.physics, normal2)
+            if recorder is not None:
+                recorder.close()
+            if pipeline is not None:
+                # an error of the render thread must not mask one raised
+                # by the loop
+                pipeline.stop(raise_error=completed)
+            if self.canvas is not None:
+                self.canvas.finish()
+        state = self.get_state(diagnostics)
+        if pipeline is not None:
+            state['frames_published'] = pipeline.n_published
+            state['frames_dropped'] = pipeline.n_dropped
+            state['frames_drawn'] = pipeline.n_drawn
+        return state
+
+    def write_checkpoint(self, sim_kws, recorder=None):
+        """
+        writes a checkpoint to sim_kws['checkpoint_path'] (default
+        'checkpoint.npz') if sim_kws['checkpoint_every'] is given and the
+        step counter is a multiple of it, see load_checkpoint for restarting.
+        The buffered steps of recorder are written first, so that a resumed
+        run finds all steps up to the checkpoint in the trajectory.
+        """
+        if 'checkpoint_every' not in sim_kws:
+            return
+        if self.i_step % sim_kws['checkpoint_every'] != 0:
+            return
+        if recorder is not None:
+            recorder.flush()
+        if 'checkpoint_path' in sim_kws:
+            path = sim_kws['checkpoint_path']
+        else:
+            path = 'checkpoint.npz'
+        save_checkpoint(self, path)
 
+    def make_recorder(self, sim_kws, resume=False):
+        """
+        TrajectoryWriter into the directory sim_kws['trajectory'], if given.
+        sim_kws['trajectory_chunk_steps'] sets the number of steps kept in
+        memory before they are written (default 100). With resume the
+        trajectory is continued after the current step counter.
+        """
+        if 'trajectory' not in sim_kws:
+            return None
+        if 'trajectory_chunk_steps' in sim_kws:
+            chunk_steps = sim_kws['trajectory_chunk_steps']
+        else:
+            chunk_steps = 100
+        if resume:
+            resume_steps = self.i_step
+        else:
+            resume_steps = None
+        return TrajectoryWriter(sim_kws['trajectory'], len(self.object_groups),
+                                chunk_steps=chunk_steps,
+                                resume_steps=resume_steps)
+
+    def group_state(self):
+        """
+        position, velocity and rotation of the first object of every group
+        (periodic clones are left out, so the shapes do not change)
+        """
+        n_groups = len(self.object_groups)
+        position = np.zeros((n_groups, 2))
+        velocity = np.zeros((n_groups, 2))
+        rotation = np.zeros(n_groups)
+        for i_group, group in enumerate(self.object_groups):
+            obj = group.objects[0]
+            position[i_group] = obj.position
+            velocity[i_group] = obj.physics.velocity
+            rotation[i_group] = obj.rotation
+        return {'position': position,
+                'velocity': velocity,
+                'rotation': rotation}
+
+    def trajectory_values(self, time, diags):
+        """
+        per group state and diagnostics of the current step, as recorded by
+        TrajectoryWriter
+        """
+        values = self.group_state()
+        values.update({'time': time,
+                       'energy': diags['energy'],
+                       'momentum_x': diags['momentum'][0],
+                       'momentum_y': diags['momentum'][1],
+                       'max_velocity': diags['max_velocity'],
+                       'time_step': diags['time_step']})
+        return values
+
+    def get_state(self, diagnostics=None):
+        """
+        final state of the simulation as a dict of arrays: position, rotation
+        and velocity of all objects, the index of their group, the number of
+        steps and, if given, the per step diagnostics (energy, momentum,
+        max_velocity and time_step)
+        """
+        objects = self.all_objects()
+        groups = []
+        for i_group, group in enumerate(self.object_groups):
+            groups += [i_group]*len(group.objects)
+        state = {'position': np.array([obj.position for obj in objects],
+                                      dtype=float).reshape(-1, 2),
+                 'rotation': np.array([obj.rotation for obj in objects],
+                                      dtype=float),
+                 'velocity': np.array([obj.physics.velocity for obj
+                                       in objects], dtype=float).reshape(-1, 2),
+                 'group': np.array(groups, dtype=int),
+                 'n_steps': self.i_step}
+        if diagnostics is not None:
+            for key, values in diagnostics.items():
+                state[key] = np.array(values, dtype=float)
+        return state
+
+    def update_groups(self, time_step):
+        if self.geometry_array is None:
+            for group in self.object_groups:
+                group.update(time_step, self.world, self.canvas)
+            return
+        objects = self.sync_store()
+        self.store.integrate(time_step)
+        self.geometry_array.update(objects)
+        if self.canvas is not None and self.canvas.renderer is None:
+            for obj in objects:
+                if obj.graphics is not None:
+                    obj.graphics.update(obj.geometry, self.canvas)
+
+    def write_frame(self):
+        """
+        writes a frame of the movie, passing the objects to the renderer of
+        the canvas if there is one
+        """
+        if self.canvas.renderer is not None:
+            self.canvas.renderer.update(self.all_objects())
+        self.canvas.write()
+
+    def make_frame_pipeline(self, sim_kws):
+        """
+        asynchronous frame pipeline if sim_kws['async_frames'] is set, frames
+        are taken every sim_kws['frame_interval'] steps (default 1) and at
+        most sim_kws['frame_rate'] times per second (default unlimited).
+        Requires the 'collection' renderer.
+        """
+        if self.canvas is None or 'async_frames' not in sim_kws:
+            return None
+        if not sim_kws['async_frames']:
+            return None
+        if self.canvas.renderer is None:
+            raise ValueError("asynchronous frames require the 'collection' "+
+                             "renderer")
+        # frames are drawn on the render thread, which GUI canvases forbid
+        if self.canvas.fig.canvas.required_interactive_framework is not None:
+            raise ValueError("asynchronous frames require a non-interactive "+
+                             "canvas, e.g. the 'Agg' backend")
+        if 'frame_interval' in sim_kws:
+            frame_interval = sim_kws['frame_interval']
+        else:
+            frame_interval = 1
+        if 'frame_rate' in sim_kws:
+            frame_rate = sim_kws['frame_rate']
+        else:
+            frame_rate = None
+        return FramePipeline(self.draw_frame_state,
+                             frame_interval=frame_interval,
+                             frame_rate=frame_rate)
+
+    def frame_state(self, diags):
+        """
+        snapshot of everything the render thread needs to draw a frame
+        """
+        coords, splits, colors = self.canvas.renderer.snapshot(
+            self.all_objects())
+        return {'coords': coords, 'splits': splits, 'colors': colors,
+                'messages': self.report_messages(diags)}
+
+    def draw_frame_state(self, buffer):
+        self.canvas.renderer.draw(buffer['coords'], buffer['splits'],
+                                  buffer['colors'])
+        self.canvas.report(buffer['messages'])
+        self.canvas.write()
+
+    def first_impacts(self, time_step):
+        """
+        earliest time of impact within time_step of all candidate pairs (from
+        bounding boxes swept over the step) and the pairs which touch at that
+        time as (obj1, obj2, normal) tuples. Returns (None, []) if nothing
+        collides within the step.
+        """
+        impacts = []
+        for obj1, obj2 in self.collision_candidates(sweep=time_step):
+            if self.is_wall_pair(obj1, obj2):
+                impact = self.world.wall_impact(
+                    np.array(obj1.geometry.bounds()), step_velocity(obj1),
+                    time_step)
+            else:
+                shift = self.world.image_shift(obj1.position, obj2.position)
+                impact = time_of_impact(obj1, obj2, time_step, shift=shift)
+            if impact is not None:
+                impacts.append((impact[0], obj1, obj2, impact[1]))
+        if len(impacts) == 0:
+            return None, []
+        first_time = min(impact[0] for impact in impacts)
+        tolerance = 1e-9*max(time_step, 1.0)
+        pairs = [(obj1, obj2, normal) for impact_time, obj1, obj2, normal
+                 in impacts if impact_time <= first_time+tolerance]
+        return first_time, pairs
+
+    def advance_to_impacts(self, time_step, max_sub_steps=10):
+        """
+        sub-stepping alternative to calculate_collisions followed by
+        update_groups. Objects are moved to the first time of impact within
+        the step, the touching pairs collide and the rest of the step is
+        continued, for up to max_sub_steps impacts. Overlaps which exist at
+        the start of the step are resolved by calculate_collisions as before,
+        anything missed after max_sub_steps impacts is resolved at the start
+        of the next step.
+        """
+        self.calculate_collisions()
+        remaining = time_step
+        for i_sub in range(max_sub_steps):
+            impact_time, pairs = self.first_impacts(remaining)
+            if impact_time is None:
+                break
+            self.update_groups(impact_time)
+            for obj1, obj2, normal in pairs:
+                obj1.physics.collision(obj2.physics, normal)
+                obj2.physics.collision(obj1.physics, normal)
+            remaining -= impact_time
+        self.update_groups(remaining)
+
+    def run_event_driven(self, object_kws, sim_kws, seed=None, resume=False):
+        """
+        event driven alternative to run for systems of Circle objects in a
+        rectangular world with a physical boundary. Disks move ballistically
+        between exactly computed collisions, so there is no time step and
+        there are never any overlaps. sim_kws must contain 'max_time' and
+        'frame_time', the interval at which the objects are updated and a
+        frame is written. Optional keys are 'max_events' and 'restitution'
+        (default 1.0, elastic). With resume the velocities are kept and the
+        events are counted on from the step counter (see run). Returns the
+        EventDrivenEngine.
+        """
+        if seed is not None:
+            self.set_seed(seed)
+        if not resume:
+            self.init_velocity(object_kws)
+        max_time = sim_kws['max_time']
+        frame_time = sim_kws['frame_time']
+        if 'max_events' in sim_kws:
+            max_events = sim_kws['max_events']
+        else:
+            max_events = None
+        if 'restitution' in sim_kws:
+            restitution = sim_kws['restitution']
+        else:
+            restitution = 1.0
+        engine = EventDrivenEngine(self.all_objects(), self.world,
+                                   restitution=restitution)
+        if not resume:
+            self.i_step = 0
+        first_step = self.i_step
+        try:
+            if self.canvas is not None:
+                self.canvas.saving()
+                self.write_frame()
+            while engine.time < max_time:
+                engine.advance(min(engine.time+frame_time, max_time),
+                               max_events=max_events)
+                engine.write_back()
+                for group in self.object_groups:
+                    group.update(0.0, self.world, self.canvas)
+                self.i_step = first_step+engine.n_events
+                if self.canvas is not None:
+                    self.write_frame()
+                if max_events is not None and engine.n_events >= max_events:
+                    break
+        finally:
+            if self.canvas is not None:
+                self.canvas.finish()
+        return engine
+
+    def packing_fraction(self):
+        """
+        area of the groups (periodic clones are left out) over the area of
+        the world boundary
+        """
+        area = sum(group.objects[0].geometry.area() for group
+                   in self.object_groups)
+        return area/self.world.boundary.geometry.area()
+
+    def scale_objects(self, factor):
+        """
+        scales the shapes of all objects in place by factor
+        """
+        for obj in self.all_objects():
+            obj.geometry.scale(factor)
+
+    def compress_event_driven(self, object_kws, sim_kws, seed=None,
+                              resume=False):
+        """
+        Lubachevsky-Stillinger compression of Circle objects with the event
+        driven engine: the radii grow as r(0)*(1+sim_kws['growth_rate']*t)
+        until the packing fraction reaches sim_kws['target_density'], there
+        are never any overlaps. Every sim_kws['frame_time'] the velocities
+        are scaled back to the initial kinetic energy, the objects are
+        updated and a frame is written. The optional 'max_events' stops the
+        compression near jamming, where the collision rate diverges, and
+        'restitution' defaults to 1.0. resume works as in run_event_driven.
+        Returns the EventDrivenEngine, the reached density is stored in
+        self.density.
+        """
+        if seed is not None:
+            self.set_seed(seed)
+        if not resume:
+            self.init_velocity(object_kws)
+        target_density = sim_kws['target_density']
+        growth_rate = sim_kws['growth_rate']
+        frame_time = sim_kws['frame_time']
+        if 'max_events' in sim_kws:
+            max_events = sim_kws['max_events']
+        else:
+            max_events = None
+        if 'restitution' in sim_kws:
+            restitution = sim_kws['restitution']
+        else:
+            restitution = 1.0
+        self.density = self.packing_fraction()
+        if self.density >= target_density:
+            max_time = 0.
+        else:
+            max_time = (np.sqrt(target_density/self.density)-1.)/growth_rate
+        engine = EventDrivenEngine(self.all_objects(), self.world,
+                                   restitution=restitution,
+                                   growth_rate=growth_rate)
+        kinetic_energy = 0.5*np.sum(engine.mass*np.sum(engine.velocity**2,
+                                                       axis=1))
+        if not resume:
+            self.i_step = 0
+        first_step = self.i_step
+        try:
+            if self.canvas is not None:
+                self.canvas.saving()
+                self.write_frame()
+            while engine.time < max_time:
+                engine.advance(min(engine.time+frame_time, max_time),
+                               max_events=max_events)
+                engine.rescale_velocities(kinetic_energy)
+                engine.write_back()
+                for group in self.object_groups:
+                    group.update(0.0, self.world, self.canvas)
+                self.i_step = first_step+engine.n_events
+                if self.canvas is not None:
+                    self.write_frame()
+                if max_events is not None and engine.n_events >= max_events:
+                    break
+        finally:
+            if self.canvas is not None:
+                self.canvas.finish()
+        self.density = self.packing_fraction()
+        return engine
+
+    def minimize_overlaps(self, minimize_kws=None):
+        """
+        removes the overlaps of the groups by FIRE energy minimization (see
+        minimize) instead of a collision simulation, e.g. after make_objects
+        or arange_regular_grid. Only Circle and unrotated Rectangle objects
+        in a rectangular world without obstacles are supported. Optional
+        minimize_kws are 'tolerance' (default 1e-3), 'max_iterations'
+        (default 10000) and 'skin' of the neighbour list. Nothing is drawn.
+        Returns a dict with the number of iterations, the largest remaining
+        overlap and whether the configuration is valid.
+        """
+        if minimize_kws is None:
+            minimize_kws = {}
+        if 'tolerance' in minimize_kws:
+            tolerance = minimize_kws['tolerance']
+        else:
+            tolerance = 1e-3
+        if 'max_iterations' in minimize_kws:
+            max_iterations = minimize_kws['max_iterations']
+        else:
+            max_iterations = 10000
+        if 'skin' in minimize_kws:
+            skin = minimize_kws['skin']
+        else:
+            skin = None
+        boundary = self.world.boundary
+        if (not isinstance(boundary.geometry, Rectangle) or
+                boundary.rotation != 0.):
+            raise ValueError("overlap minimization requires a rectangular "+
+                             "world")
+        if len(self.world.obstacles()) > 0:
+            raise ValueError("overlap minimization does not support "+
+                             "obstacles")
+        if self.world.boundary_type == 'Physical':
+            walls = np.array(boundary.geometry.bounds())
+            box = None
+        else:
+            conditions = self.world.conditions
+            walls = None
+            box = np.array([conditions['right']-conditions['left'],
+                            conditions['up']-conditions['down']])
+        objects = [group.objects[0] for group in self.object_groups]
+        half_extents, radius = particle_extents(objects)
+        positions = np.array([obj.position for obj in objects],
+                             dtype=float).reshape(-1, 2)
+        minimizer = FireMinimizer(positions, half_extents, radius,
+                                  walls=walls, box=box, tolerance=tolerance,
+                                  skin=skin)
+        max_overlap = minimizer.minimize(max_iterations)
+        shift = minimizer.positions-positions
+        for group, group_shift in zip(self.object_groups, shift):
+            for obj in group.objects:
+                obj.position = obj.position+group_shift
+            group.update(0.0, self.world, self.canvas)
+        self.world.update(self.object_groups)
+        return {'n_iterations': minimizer.n_iterations,
+                'max_overlap': max_overlap,
+                'valid': self.valid_configuration()}
+
+    def compress_minimized(self, sim_kws):
+        """
+        grows all objects and removes the overlaps by FIRE minimization
+        after every growth (see minimize_overlaps), until their packing
+        fraction reaches sim_kws['target_density'] or after
+        sim_kws['max_steps'] steps. This is not a Lubachevsky-Stillinger
+        compression: the objects do not move between the steps, every step
+        scales the shapes by 1+sim_kws['growth'] and jumps to the nearest
+        overlap free configuration. Once the overlaps can not be removed any
+        more the packing is jammed, the last growth is undone and the
+        compression stops. Optional keywords of the minimizer are given in
+        sim_kws['minimize_kws'], the supported shapes and worlds are those of
+        minimize_overlaps. Nothing is drawn. Returns the state (see
+        get_state) with the reached density and whether the configuration is
+        valid.
+        """
+        target_density = sim_kws['target_density']
+        growth = sim_kws['growth']
+        max_steps = sim_kws['max_steps']
+        if 'minimize_kws' in sim_kws:
+            minimize_kws = sim_kws['minimize_kws']
+        else:
+            minimize_kws = {}
+        if 'tolerance' in minimize_kws:
+            tolerance = minimize_kws['tolerance']
+        else:
+            tolerance = 1e-3
+        self.minimize_overlaps(minimize_kws)
+        self.density = self.packing_fraction()
+        self.i_step = 0
+        while self.i_step < max_steps and self.density < target_density:
+            step_growth = min(growth,
+                              np.sqrt(target_density/self.density)-1.)
+            self.scale_objects(1.+step_growth)
+            result = self.minimize_overlaps(minimize_kws)
+            if result['max_overlap'] >= tolerance:
+                # jammed, the overlaps of the growth can not be removed
+                self.scale_objects(1./(1.+step_growth))
+                self.minimize_overlaps(minimize_kws)
+                self.density = self.packing_fraction()
+                break
+            self.density = self.packing_fraction()
+            self.i_step += 1
+        state = self.get_state()
+        state['density'] = self.density
+        state['valid'] = self.valid_configuration()
+        return state
 
     def recolor_groups(self, v_max):
         cmap = get_color_map()
@@ -279,55 +880,172 @@ class Simulation():
 
 
 
-    def report_diags(self, distance):
-        total_energy = 0.0
-        total_momentum = np.zeros(2)
-        n_groups = len(self.object_groups)
-        max_v = 0.0
-        for group in self.object_groups:
-            total_energy += group.get_energy()/n_groups
-            total_momentum += group.get_momentum()/n_groups
-            group_v = group.get_velocity()
-            if group_v > max_v:
-                max_v = group_v
+    def compute_diags(self, distance):
+        """
+        mean energy and momentum of the groups, the maximum group velocity and
+        the time step in which the fastest group moves by distance
+        """
+        if self.store is not None:
+            self.sync_store()
+            total_energy = self.store.get_energy()
+            total_momentum = self.store.get_momentum()
+            max_v = self.store.get_max_velocity()
+        else:
+            total_energy = 0.0
+            total_momentum = np.zeros(2)
+            n_groups = len(self.object_groups)
+            max_v = 0.0
+            for group in self.object_groups:
+                total_energy += group.get_energy()/n_groups
+                total_momentum += group.get_momentum()/n_groups
+                group_v = group.get_velocity()
+                if group_v > max_v:
+                    max_v = group_v
         time_step = distance / max_v
-        self.canvas.report( [("i",self.i_step),
-                             ('E',total_energy),
-                             ('M_x',total_momentum[0]),
-                             ('M_y', total_momentum[1]),
-                             ('V_max',max_v),
-                             ('t',time_step*1e6)])
-        return [time_step, max_v]
-
-
-    def calculate_collisions(self):
-        buffer_group = ObjectGroup()
-        if self.world.buffer is not None:
-            buffer_group.append(self.world.buffer)
-        all_groups = self.object_groups + [buffer_group]
-        for group1, group2 in itertools.combinations(all_groups, 2):
-            for obj1 in group1.objects:
-                for obj2 in group2.objects:
-                    poly1 = obj1.geometry.polygon
-                    poly2 = obj2.geometry.polygon
-                    if poly1.intersects(poly2):
-                        intersection = poly1.intersection(poly2)
-                        center = intersection.centroid
-                        collision = np.array([center.x, center.y])
-                        normal1 = obj1.geometry.get_normal(collision)
-                        normal2 = obj1.geometry.get_normal(collision)
-                        """
-                        if not self.valid_collision(normal1, normal2,
-                                                    obj1.physics,
-                                                    obj2.physics):
-                            # not working well
-                            continue
-                        """
-
-                        #for obj11 in group1.objects:
-                        obj1.physics.collision(obj2.physics, normal1)
-                        #for obj22 in group2.objects:
-                        obj2.physics.collision(obj1.physics, normal2)
+        return {'energy': total_energy,
+                'momentum': np.array(total_momentum, dtype=float),
+                'max_velocity': max_v,
+                'time_step': time_step}
+
+    def report_messages(self, diags):
+        return [("i",self.i_step),
+                ('E',diags['energy']),
+                ('M_x',diags['momentum'][0]),
+                ('M_y', diags['momentum'][1]),
+                ('V_max',diags['max_velocity']),
+                ('t',diags['time_step']*1e6)]
+
+    def report(self, diags):
+        if self.canvas is None:
+            return
+        self.canvas.report(self.report_messages(diags))
+
+    def report_diags(self, distance):
+        diags = self.compute_diags(distance)
+        self.report(diags)
+        return [diags['time_step'], diags['max_velocity']]
+
+
+    def collision_candidates(self, include_static=True, sweep=None,
+                             margin=None):
+        """
+        yields the pairs of objects which may be in contact: first the pairs
+        of objects from different groups reported by the broad-phase (the
+        first object of a pair always belongs to the group with the lower
+        index), then, unless include_static is False, the pairs of an object
+        and a static object (buffer or obstacle) found by the static layer of
+        the world (or its analytic walls). If sweep is given, the bounding
+        boxes are swept over a step of that length and only the pairs whose
+        swept boxes overlap are kept, whatever the broad-phase reports. If
+        margin is given the boxes are enlarged by margin on every side.
+        """
+        objects = []
+        group_ids = []
+        for i_group, group in enumerate(self.object_groups):
+            objects += group.objects
+            group_ids += [i_group]*len(group.objects)
+        if sweep is None:
+            bounds = get_bounds(objects)
+        else:
+            bounds = swept_bounds(objects, sweep)
+        if margin is not None:
+            bounds = bounds+np.array([-1., -1., 1., 1.])*margin
+        polygons = PolygonView(objects)
+        keys = [id(obj) for obj in objects]
+        pairs = self.broad_phase.candidate_pairs(bounds, polygons, keys=keys)
+        if sweep is not None and len(pairs) > 0:
+            pairs = np.array(list(pairs))
+            if self.broad_phase.box is None:
+                pairs = pairs[bounds_overlap(bounds, pairs)]
+            else:
+                pairs = pairs[periodic_bounds_overlap(bounds, pairs,
+                                                      self.broad_phase.box)]
+        for i_obj, j_obj in pairs:
+            if group_ids[i_obj] == group_ids[j_obj]:
+                continue
+            yield objects[i_obj], objects[j_obj]
+        if include_static:
+            yield from self.world.static_layer.candidate_pairs(objects, bounds)
+            for i_obj in self.world.touching_walls(bounds):
+                yield objects[i_obj], self.world.buffer
+
+    def image_geometries(self, obj1, obj2):
+        """
+        geometries of a pair of objects, in a periodic world with the minimum
+        image convention the second one is moved to its periodic image
+        closest to the first one
+        """
+        if not self.world.minimum_image:
+            return obj1.geometry, obj2.geometry
+        shift = self.world.image_shift(obj1.position, obj2.position)
+        if not np.any(shift):
+            return obj1.geometry, obj2.geometry
+        return obj1.geometry, obj2.geometry.shifted(shift)
+
+    def is_wall_pair(self, obj1, obj2):
+        return self.world.analytic_walls and obj2 is self.world.buffer
+
+    def find_contacts(self, pairs):
+        """
+        contact (depth, point, normal) or None for every pair of objects,
+        contacts with analytic walls are computed in one vectorized pass
+        """
+        wall_index = [i_pair for i_pair, (obj1, obj2) in enumerate(pairs)
+                      if self.is_wall_pair(obj1, obj2)]
+        if len(wall_index) == 0:
+            return self.object_contacts(pairs)
+        is_wall = np.zeros(len(pairs), dtype=bool)
+        is_wall[wall_index] = True
+        contacts = [None]*len(pairs)
+        object_index = np.flatnonzero(~is_wall)
+        object_contacts = self.object_contacts([pairs[i_pair] for i_pair
+                                                in object_index])
+        for i_pair, contact in zip(object_index, object_contacts):
+            contacts[i_pair] = contact
+        wall_contacts = self.world.wall_contacts(
+            get_bounds([pairs[i_pair][0] for i_pair in wall_index]))
+        for i_pair, contact in zip(wall_index, wall_contacts):
+            contacts[i_pair] = contact
+        return contacts
+
+    def object_contacts(self, pairs):
+        geometry_pairs = [self.image_geometries(obj1, obj2)
+                          for obj1, obj2 in pairs]
+        if self.narrow_phase is not None:
+            return self.narrow_phase.contacts(geometry_pairs)
+        return [get_contact(geo1, geo2) for geo1, geo2 in geometry_pairs]
+
+    def calculate_collisions(self, pairs=None):
+        """
+        resolves the contacts of the given object pairs, by default of all
+        candidate pairs of the broad-phase
+        """
+        if pairs is None:
+            pairs = list(self.collision_candidates())
+        contacts = self.find_contacts(pairs)
+        if self.store is not None:
+            self.resolve_contacts(pairs, contacts)
+            return
+        for (obj1, obj2), contact in zip(pairs, contacts):
+            if contact is None:
+                continue
+            depth, collision, normal = contact
+            obj1.physics.collision(obj2.physics, normal)
+            obj2.physics.collision(obj1.physics, normal)
+
+    def resolve_contacts(self, pairs, contacts):
+        """
+        resolves all contacts of a step in one vectorized pass on the store
+        """
+        self.sync_store()
+        touching = [i_pair for i_pair, contact in enumerate(contacts)
+                    if contact is not None]
+        if len(touching) == 0:
+            return
+        body1 = self.store.body_index([pairs[i_pair][0] for i_pair in touching])
+        body2 = self.store.body_index([pairs[i_pair][1] for i_pair in touching])
+        normal = np.array([contacts[i_pair][2] for i_pair in touching])
+        resolve_contacts(self.store, body1, body2, normal)
 
     def valid_collision(self, normal1, normal2, physics1, physics2):
 
@@ -343,13 +1061,13 @@ class Simulation():
 
 
     def valid_configuration(self):
-        for group1, group2 in itertools.combinations(self.object_groups, 2):
-            for obj1 in group1.objects:
-                for obj2 in group2.objects:
-                    poly1 = obj1.geometry.polygon
-                    poly2 = obj2.geometry.polygon
-                    if poly1.intersects(poly2):
-                        return False
+        if self.narrow_phase is not None:
+            pairs = [self.image_geometries(obj1, obj2) for obj1, obj2
+                     in self.collision_candidates(include_static=False)]
+            return not np.any(self.narrow_phase.overlaps(pairs))
+        for obj1, obj2 in self.collision_candidates(include_static=False):
+            if overlaps(*self.image_geometries(obj1, obj2)):
+                return False
         return True
 
 
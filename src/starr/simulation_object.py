@@ -1,14 +1,18 @@
 import numpy as np
 import copy
 from starr.graphics_component import GraphicsComponent
-class SimulationObject():
+from starr.body_store import Stored, StoredAttribute
+class SimulationObject(Stored):
     #class for generating 2D regular objects
+    position = StoredAttribute()
+    rotation = StoredAttribute()
+    stored_attributes = ('position', 'rotation')
+
     def __init__(self, geometry, physics, graphics):
         self.name = ""
         self.position = np.zeros(2)
         self.rotation = 0.0
         self.geometry = geometry
-        self.geometry.create_polygon(self.position, self.rotation)
         self.physics = physics
         self.graphics = graphics
 
@@ -70,7 +74,8 @@ class ObjectGroup():
 
     def remove(self, obj):
         self.objects.remove(obj)
-        obj.graphics.remove()
+        if obj.graphics is not None:
+            obj.graphics.remove()
 
     def get_energy(self):
         total_energy = 0.0
@@ -0,0 +1,64 @@
+"""
+Static layer of the world: the buffer of a physical boundary and any number
+of fixed obstacles.
+
+Static objects never move, so they are indexed once: their polygons are put
+into a shapely STRtree and prepared in place. Moving objects are matched
+against the layer by their bounding boxes, first through the tree and then
+with an exact intersects test of the box against the prepared polygon. An
+object in the interior of a ring shaped buffer is therefore rejected without
+a full polygon test, only objects near the edges of static objects are
+passed on to the narrow-phase.
+"""
+
+import numpy as np
+import shapely
+
+
+class StaticLayer():
+
+    def __init__(self):
+        self.objects = []
+        self.polygons = None
+        self.tree = None
+
+    def __len__(self):
+        return len(self.objects)
+
+    def add(self, obj):
+        """
+        adds a static object, the index is rebuilt on the next query
+        """
+        obj.physics.static = True
+        obj.geometry.update(obj)
+        self.objects.append(obj)
+        self.tree = None
+
+    def build(self):
+        self.polygons = np.array([obj.geometry.polygon for obj
+                                  in self.objects], dtype=object)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+
+    def query(self, bounds):
+        """
+        index pairs (i_bounds, i_static) of the bounding boxes (n, 4) which
+        touch a static object
+        """
+        if len(self.objects) == 0 or len(bounds) == 0:
+            return np.zeros((0, 2), dtype=int)
+        if self.tree is None:
+            self.build()
+        boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2],
+                            bounds[:, 3])
+        i_box, i_static = self.tree.query(boxes)
+        touching = shapely.intersects(self.polygons[i_static], boxes[i_box])
+        return np.stack([i_box[touching], i_static[touching]], axis=1)
+
+    def candidate_pairs(self, objects, bounds):
+        """
+        (obj, static_obj) pairs of the objects with the given bounding boxes
+        which may be in contact with a static object
+        """
+        return [(objects[i_obj], self.objects[i_static])
+                for i_obj, i_static in self.query(bounds).tolist()]
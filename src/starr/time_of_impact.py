@@ -0,0 +1,150 @@
+"""
+Time of impact for pairs of translating polygons (Rectangle, GeneralPolygon,
+Circle) by conservative advancement on shapely distances.
+
+Objects do not rotate during a step. For convex polygons the distance between
+the two is then a convex function of time, so a Newton step along the closing
+speed (the relative velocity projected onto the direction between the closest
+points) never overshoots the time of first contact and converges in a few
+iterations. For non-convex polygons the distance can not shrink faster than
+the relative speed, advancing by distance/relative speed is safe but may
+converge slowly, so if it stalls the remaining interval is bisected on the
+intersection test.
+
+Pairs of Circle objects do not need their polygons, their time of impact is
+the root of the same quadratic the event driven engine solves.
+"""
+
+import numpy as np
+import shapely.affinity as affinity
+from shapely.ops import nearest_points
+from starr.geometry_component import Circle
+from starr.event_driven import contact_times
+
+
+def step_velocity(obj):
+    """
+    velocity an object will move with during the next update, including the
+    acceleration (impulses) collected so far
+    """
+    if obj.physics is None:
+        return np.zeros(2)
+    return obj.physics.velocity+obj.physics.acceleration
+
+def swept_bounds(objects, time_step):
+    """
+    bounding boxes of the objects swept over a step of length time_step
+    """
+    bounds = np.zeros((len(objects), 4))
+    for i_obj, obj in enumerate(objects):
+        start = np.array(obj.geometry.bounds())
+        shift = np.tile(time_step*step_velocity(obj), 2)
+        bounds[i_obj, :2] = np.minimum(start[:2], start[:2]+shift[:2])
+        bounds[i_obj, 2:] = np.maximum(start[2:], start[2:]+shift[2:])
+    return bounds
+
+def contact_normal(poly1, poly2):
+    """
+    unit vector from the closest point of poly1 to the closest point of poly2,
+    None if the polygons touch in more than a point
+    """
+    point1, point2 = nearest_points(poly1, poly2)
+    direction = np.array([point2.x-point1.x, point2.y-point1.y])
+    length = np.linalg.norm(direction)
+    if length == 0.:
+        return None
+    return direction/length
+
+def is_convex(polygon, tolerance=1e-9):
+    if len(polygon.interiors) > 0:
+        return False
+    return polygon.convex_hull.area-polygon.area <= tolerance*polygon.area
+
+def circle_time_of_impact(obj1, obj2, time_step, shift=None):
+    """
+    time_of_impact of two Circle objects in closed form
+    """
+    separation = obj2.geometry._position-obj1.geometry._position
+    if shift is not None:
+        separation = separation+shift
+    sigma = obj1.geometry.radius+obj2.geometry.radius
+    if np.dot(separation, separation) < sigma**2:
+        return None
+    relative_velocity = step_velocity(obj2)-step_velocity(obj1)
+    time = contact_times(separation[None, :], relative_velocity[None, :],
+                         np.array([sigma]))[0]
+    if time > time_step:
+        return None
+    contact = separation+relative_velocity*time
+    return time, contact/np.linalg.norm(contact)
+
+def time_of_impact(obj1, obj2, time_step, tolerance=1e-6, max_iterations=50,
+                   shift=None):
+    """
+    returns (time, normal) where time in [0, time_step] is the time at which
+    obj1 and obj2 come within tolerance of each other while approaching and
+    normal is the unit vector from obj1 to obj2 at contact, or None if they do
+    not collide within the step. Pairs which already overlap at the start of
+    the step are ignored (None). If given, obj2 is translated by shift (its
+    periodic image).
+    """
+    if isinstance(obj1.geometry, Circle) and isinstance(obj2.geometry, Circle):
+        return circle_time_of_impact(obj1, obj2, time_step, shift=shift)
+    poly1 = obj1.geometry.polygon
+    poly2 = obj2.geometry.polygon
+    if shift is not None and np.any(shift):
+        poly2 = affinity.translate(poly2, *shift)
+    if poly1.intersects(poly2):
+        return None
+    relative_velocity = step_velocity(obj2)-step_velocity(obj1)
+    speed = np.linalg.norm(relative_velocity)
+    if speed == 0.:
+        return None
+    convex = is_convex(poly1) and is_convex(poly2)
+
+    time = 0.
+    # used if the polygons start out touching, obj2 approaches against the
+    # relative velocity
+    normal = -relative_velocity/speed
+    for iteration in range(max_iterations):
+        moved = affinity.translate(poly2, *(relative_velocity*time))
+        point1, point2 = nearest_points(poly1, moved)
+        direction = np.array([point2.x-point1.x, point2.y-point1.y])
+        distance = np.linalg.norm(direction)
+        if distance > 0.:
+            normal = direction/distance
+        closing_speed = -np.dot(relative_velocity, normal)
+        if distance <= tolerance:
+            if closing_speed > 0.:
+                return time, normal
+            if convex:
+                return None
+            # touching but separating, another part of a non-convex polygon
+            # may still be hit later in the step
+            time += tolerance/speed
+        elif convex:
+            if closing_speed <= 0.:
+                return None
+            time += distance/closing_speed
+        else:
+            time += distance/speed
+        if time > time_step:
+            return None
+
+    # stalled, bisect on the intersection test
+    moved = affinity.translate(poly2, *(relative_velocity*time_step))
+    if not poly1.intersects(moved):
+        return None
+    lower = time
+    upper = time_step
+    for iteration in range(max_iterations):
+        middle = 0.5*(lower+upper)
+        moved = affinity.translate(poly2, *(relative_velocity*middle))
+        if poly1.intersects(moved):
+            upper = middle
+        else:
+            lower = middle
+            normal = contact_normal(poly1, moved)
+        if upper-lower < tolerance/speed:
+            break
+    return lower, normal
@@ -0,0 +1,170 @@
+"""
+Binary trajectory recording for long simulation runs.
+
+TrajectoryWriter collects the per step state of all object groups (position
+and rotation of the first object of a group, velocity of the group) and the
+diagnostics of the step in preallocated chunk buffers of chunk_steps steps.
+Full chunks are appended to one raw binary file per field, so memory use is
+bounded by the chunk size and the disk is written sequentially. An index
+(index.json) records the number of steps, the shape and dtype of every field
+and the step range of every chunk.
+
+A run resumed from a checkpoint continues an existing trajectory: the
+steps recorded after the checkpoint are cut off, new chunks are appended to
+the files and the index.
+
+TrajectoryReader memory maps the raw files, so single steps or time series
+of single groups can be read without loading the whole trajectory.
+"""
+
+import json
+import os
+import numpy as np
+
+INDEX_FILE = 'index.json'
+DIAGNOSTICS = ('time', 'energy', 'momentum_x', 'momentum_y', 'max_velocity',
+               'time_step')
+
+
+def trajectory_fields(n_groups):
+    """
+    shape (per step) of every recorded field
+    """
+    fields = {'position': (n_groups, 2),
+              'velocity': (n_groups, 2),
+              'rotation': (n_groups,)}
+    for name in DIAGNOSTICS:
+        fields[name] = ()
+    return fields
+
+
+class TrajectoryWriter():
+    """
+    with resume_steps, the trajectory in directory is continued after its
+    first resume_steps steps (e.g. the step counter of a checkpoint), the
+    steps recorded after them are discarded. Without it, a new trajectory
+    replaces any previous one.
+    """
+
+    def __init__(self, directory, n_groups, chunk_steps=100, dtype='float64',
+                 resume_steps=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_steps = chunk_steps
+        self.dtype = np.dtype(dtype)
+        self.shapes = trajectory_fields(n_groups)
+        self.n_buffered = 0
+        self.n_steps = 0
+        self.chunks = []
+        if resume_steps is not None:
+            self.truncate(resume_steps)
+            mode = 'ab'
+        else:
+            mode = 'wb'
+        self.buffers = {}
+        self.files = {}
+        for name, shape in self.shapes.items():
+            self.buffers[name] = np.zeros((chunk_steps,)+shape,
+                                          dtype=self.dtype)
+            self.files[name] = open(self.path(name), mode)
+        self.write_index()
+
+    def truncate(self, n_steps):
+        """
+        keeps the first n_steps steps of the existing trajectory and
+        continues its chunk list
+        """
+        with open(os.path.join(self.directory, INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+        fields = {name: tuple(shape) for name, shape
+                  in index['fields'].items()}
+        if fields != self.shapes or np.dtype(index['dtype']) != self.dtype:
+            raise ValueError("the trajectory in {} ".format(self.directory)+
+                             "has different fields, it can not be continued")
+        if index['n_steps'] < n_steps:
+            raise ValueError("the trajectory in {} ".format(self.directory)+
+                             "has {} steps, ".format(index['n_steps'])+
+                             "can not resume after step {}".format(n_steps))
+        for name, shape in self.shapes.items():
+            step_size = self.dtype.itemsize*int(np.prod(shape, dtype=int))
+            os.truncate(self.path(name), n_steps*step_size)
+        for start, length in index['chunks']:
+            if start >= n_steps:
+                break
+            self.chunks.append([start, min(length, n_steps-start)])
+        self.n_steps = n_steps
+
+    def path(self, name):
+        return os.path.join(self.directory, name+'.bin')
+
+    def append(self, values):
+        """
+        values is a dict with an array for every field of the step, see
+        trajectory_fields
+        """
+        for name, buffer in self.buffers.items():
+            buffer[self.n_buffered] = values[name]
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        if self.n_buffered == 0:
+            return
+        for name, buffer in self.buffers.items():
+            self.files[name].write(buffer[:self.n_buffered].tobytes())
+            self.files[name].flush()
+        self.chunks.append([self.n_steps, self.n_buffered])
+        self.n_steps += self.n_buffered
+        self.n_buffered = 0
+        self.write_index()
+
+    def write_index(self):
+        index = {'n_steps': self.n_steps,
+                 'chunk_steps': self.chunk_steps,
+                 'dtype': self.dtype.str,
+                 'fields': {name: list(shape) for name, shape
+                            in self.shapes.items()},
+                 'chunks': self.chunks}
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path+'.tmp', 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(path+'.tmp', path)
+
+    def close(self):
+        self.flush()
+        for data_file in self.files.values():
+            data_file.close()
+        self.files = {}
+
+
+class TrajectoryReader():
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as index_file:
+            self.index = json.load(index_file)
+        self.n_steps = self.index['n_steps']
+        self.dtype = np.dtype(self.index['dtype'])
+        self.fields = {}
+        for name, shape in self.index['fields'].items():
+            shape = (self.n_steps,)+tuple(shape)
+            if self.n_steps == 0:
+                self.fields[name] = np.zeros(shape, dtype=self.dtype)
+                continue
+            self.fields[name] = np.memmap(
+                os.path.join(directory, name+'.bin'), dtype=self.dtype,
+                mode='r', shape=shape)
+
+    def __len__(self):
+        return self.n_steps
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def step(self, i_step):
+        """
+        all fields of a single step as a dict
+        """
+        return {name: np.array(field[i_step]) for name, field
+                in self.fields.items()}
@@ -4,9 +4,15 @@ A class that sets the boundaries of the 2D world for a physics based simulation
 import sys
 import numpy as np
 #from starr.geometry_component import Circle, Rectangle
+from starr.geometry_component import Circle
 from starr.object_factory import generate_object, object_from_polygon
 from starr.simulation_object import SimulationObject
 from starr.object_factory import clone
+from starr.static_layer import StaticLayer
+
+# outward normals of the left, bottom, right and top wall
+WALL_NORMALS = np.array([[-1., 0.], [0., -1.], [1., 0.], [0., 1.]])
+
 
 class World():
 
@@ -19,28 +25,149 @@ class World():
             kwds['boundary_type'] = boundary_type
         self.origin = np.zeros(2)
         self.buffer = None
+        self.static_layer = StaticLayer()
+        self.minimum_image = False
+        self.analytic_walls = False
         self.boundary = generate_object(kwds)
         self.boundary.static = True
         if 'color' not in kwds:
             self.boundary.graphics.color = 'w'
         else:
             self.boundary.graphics.color = kwds['color']
-        self.boundary_type = boundary_type
-        if boundary_type == "Physical":
+        self.boundary_type = kwds['boundary_type']
+        self.keys = kwds
+        if self.boundary_type == "Physical":
             if 'buffer_thickness' not in kwds:
                 kwds['buffer_thickness'] = 5.
             thickness = kwds['buffer_thickness']
+            if 'analytic_walls' not in kwds:
+                kwds['analytic_walls'] = False
+            self.analytic_walls = kwds['analytic_walls']
+            if self.analytic_walls and kwds['shape'] != 'Rectangle':
+                raise ValueError("analytic walls require a rectangular world")
             self.create_buffer(thickness)
-        elif boundary_type == 'Periodic':
+        elif self.boundary_type == 'Periodic':
+            if 'minimum_image' not in kwds:
+                kwds['minimum_image'] = False
             self.set_periodic_conditions(kwds)
             #self.boundary.physics = None
             #self.create_physical_boundary(kwds)
+        if 'obstacles' in kwds:
+            for obstacle_keys in kwds['obstacles']:
+                self.add_obstacle(obstacle_keys)
 
     def create_buffer(self, thickness):
         buffer = self.boundary.geometry.make_buffer(thickness)
         self.buffer = object_from_polygon({'color':self.boundary.graphics.color}, buffer)        
         self.buffer.physics.mass = 1e21
         self.buffer.physics.static = True
+        if self.analytic_walls:
+            # the walls are half-planes, the buffer is only drawn
+            self.walls = np.array(self.boundary.geometry.bounds())
+        else:
+            self.static_layer.add(self.buffer)
+
+    def static_objects(self):
+        """
+        all static objects (buffer and obstacles) which take part in
+        collisions
+        """
+        objects = list(self.static_layer.objects)
+        if self.analytic_walls:
+            objects.append(self.buffer)
+        return objects
+
+    def touching_walls(self, bounds):
+        """
+        indices of the bounding boxes (n, 4) which reach into a wall
+        """
+        if not self.analytic_walls or len(bounds) == 0:
+            return np.zeros(0, dtype=int)
+        outside = ((bounds[:, 0] < self.walls[0]) |
+                   (bounds[:, 1] < self.walls[1]) |
+                   (bounds[:, 2] > self.walls[2]) |
+                   (bounds[:, 3] > self.walls[3]))
+        return np.flatnonzero(outside)
+
+    def wall_contacts(self, bounds):
+        """
+        contacts (depth, point, normal) of the bounding boxes (n, 4) with the
+        walls, or None for boxes which do not reach into a wall. Of several
+        touched walls the deepest one is used, the normal points into the
+        wall.
+        """
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        depths = np.stack([self.walls[0]-bounds[:, 0],
+                           self.walls[1]-bounds[:, 1],
+                           bounds[:, 2]-self.walls[2],
+                           bounds[:, 3]-self.walls[3]], axis=1)
+        side = np.argmax(depths, axis=1)
+        depth = depths[np.arange(len(bounds)), side]
+        normal = WALL_NORMALS[side]
+        center = 0.5*(bounds[:, :2]+bounds[:, 2:])
+        # the contact point lies on the wall, level with the box center
+        point = np.where(normal != 0., self.walls[side][:, None]-
+                         0.5*depth[:, None]*normal, center)
+        contacts = []
+        for i_box in range(len(bounds)):
+            if depth[i_box] <= 0.:
+                contacts.append(None)
+            else:
+                contacts.append((depth[i_box], point[i_box], normal[i_box]))
+        return contacts
+
+    def wall_distance(self, bounds):
+        """
+        distance of the bounding boxes (n, 4) to the nearest wall, zero for
+        boxes which reach into a wall
+        """
+        distance = np.min(np.stack([bounds[:, 0]-self.walls[0],
+                                    bounds[:, 1]-self.walls[1],
+                                    self.walls[2]-bounds[:, 2],
+                                    self.walls[3]-bounds[:, 3]], axis=1),
+                          axis=1)
+        return np.maximum(distance, 0.)
+
+    def wall_impact(self, bounds, velocity, time_step):
+        """
+        (time, normal) at which the bounding box reaches a wall while moving
+        with velocity, None if it does not within time_step or already
+        reaches into the wall
+        """
+        reach = np.array([self.walls[0]-bounds[0], self.walls[1]-bounds[1],
+                          bounds[2]-self.walls[2], bounds[3]-self.walls[3]])
+        if np.any(reach > 0.):
+            return None
+        speed = np.concatenate([-velocity, velocity])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            times = np.where(speed > 0., -reach/speed, np.inf)
+        side = np.argmin(times)
+        if times[side] > time_step:
+            return None
+        return times[side], WALL_NORMALS[side]
+
+    def add_obstacle(self, keys):
+        """
+        adds a fixed obstacle to the static layer. keys are the object
+        keywords (shape, radius or side lengths, color) and the position
+        (and optionally rotation) of the obstacle. Obstacles given in the
+        world keywords ('obstacles', a list of such dicts) are recreated
+        when a checkpoint is loaded.
+        """
+        keys = dict(keys)
+        if 'color' not in keys:
+            keys['color'] = 'gray'
+        obstacle = generate_object(keys)
+        obstacle.position = np.array(keys['position'], dtype=float)
+        if 'rotation' in keys:
+            obstacle.rotation = keys['rotation']
+        obstacle.physics.mass = 1e21
+        self.static_layer.add(obstacle)
+        return obstacle
+
+    def obstacles(self):
+        return [obj for obj in self.static_layer.objects
+                if obj is not self.buffer]
 
     def plot(self, canvas):
         if self.buffer is not None:
@@ -48,10 +175,14 @@ class World():
                                         canvas)
         self.boundary.graphics.update(self.boundary.geometry,
                                       canvas)
+        for obstacle in self.obstacles():
+            obstacle.graphics.update(obstacle.geometry, canvas)
 
     def update(self, object_groups):
         if self.boundary_type == 'Physical':
             pass
+        elif self.minimum_image:
+            self.wrap_groups(object_groups)
         elif self.boundary_type == 'Periodic':
             for group in object_groups:
                 self.cleanup_group(group)
@@ -73,6 +204,48 @@ class World():
                 """
         #self.snap_edges(object_groups)
 
+    def image_box(self):
+        """
+        side lengths of the periodic box if pairs are found with the minimum
+        image convention, None otherwise
+        """
+        if not self.minimum_image:
+            return None
+        return np.array([self.conditions['right']-self.conditions['left'],
+                         self.conditions['up']-self.conditions['down']])
+
+    def wrap(self, position):
+        """
+        periodic image of position inside the box
+        """
+        box = self.image_box()
+        lower = np.array([self.conditions['left'], self.conditions['down']])
+        return lower+np.mod(position-lower, box)
+
+    def image_shift(self, position1, position2):
+        """
+        translation which moves position2 to its periodic image closest to
+        position1, zero without the minimum image convention
+        """
+        if not self.minimum_image:
+            return np.zeros(2)
+        box = self.image_box()
+        delta = np.asarray(position2)-np.asarray(position1)
+        return -box*np.round(delta/box)
+
+    def wrap_groups(self, object_groups):
+        """
+        moves every object which left the box to its image inside the box,
+        no clones are created
+        """
+        for group in object_groups:
+            for obj in group.objects:
+                wrapped = self.wrap(obj.position)
+                if np.array_equal(wrapped, obj.position):
+                    continue
+                obj.position = wrapped
+                obj.geometry.update(obj)
+
     def snap_edges(self, object_groups):
         overlaps = True
         pass
@@ -80,7 +253,7 @@ class World():
     def cleanup_group(self, group):
 
         for obj in group.objects:
-            if obj.geometry.polygon.disjoint(self.boundary.geometry.polygon):
+            if self.disjoint(obj):
                 center_vector = obj.position-self.origin
                 if obj.physics.velocity.dot(center_vector) > 0.0:
                     group.remove(obj)
@@ -89,7 +262,33 @@ class World():
 
 
     def out_of_bounds(self, obj):
-        return not obj.geometry.polygon.within(self.boundary.geometry.polygon)
+        """
+        True if obj is not completely inside the periodic (axis aligned
+        rectangle) boundary, decided from the bounds of obj
+        """
+        minx, miny, maxx, maxy = obj.geometry.bounds()
+        return (minx < self.conditions['left'] or
+                maxx > self.conditions['right'] or
+                miny < self.conditions['down'] or
+                maxy > self.conditions['up'])
+
+    def disjoint(self, obj):
+        """
+        True if obj does not touch the periodic boundary, analytic for
+        circles
+        """
+        minx, miny, maxx, maxy = obj.geometry.bounds()
+        if (maxx < self.conditions['left'] or
+            minx > self.conditions['right'] or
+            maxy < self.conditions['down'] or
+            miny > self.conditions['up']):
+            return True
+        if isinstance(obj.geometry, Circle):
+            closest = np.clip(obj.position,
+                              [self.conditions['left'], self.conditions['down']],
+                              [self.conditions['right'], self.conditions['up']])
+            return np.linalg.norm(obj.position-closest) > obj.geometry.radius
+        return obj.geometry.polygon.disjoint(self.boundary.geometry.polygon)
 
     def clone_exists(self, group, condition):
         obj_base = group.objects[0]
@@ -185,6 +384,7 @@ class World():
         self.conditions['up'] = 0.5*slb
         self.conditions['down'] = -0.5*slb
         self.conditions['down_to_up'] = np.array([0., slb])
+        self.minimum_image = keys['minimum_image']
 
 
         """
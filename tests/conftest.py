@@ -0,0 +1,47 @@
+import pytest
+
+
+class StubWriter():
+    """
+    stands in for the ffmpeg movie writer of the Canvas, counts the frames
+    """
+
+    frame_format = 'rgba'
+
+    def __init__(self, fps=None):
+        self.fps = fps
+        self.n_frames = 0
+        self.n_buffer_frames = 0
+        self.finished = False
+
+    def setup(self, fig, outfile, dpi=None):
+        self.fig = fig
+        fig.canvas.draw()
+        self.frame_size = fig.canvas.get_width_height(physical=True)
+
+    def grab_frame(self, from_buffer=False, **savefig_kwargs):
+        if from_buffer:
+            self.fig.canvas.buffer_rgba()
+            self.n_buffer_frames += 1
+        else:
+            self.fig.canvas.draw()
+        self.n_frames += 1
+
+    def finish(self):
+        self.finished = True
+
+
+@pytest.fixture
+def canvas_figure(monkeypatch):
+    """
+    an Agg figure and axes whose Canvas writes to a StubWriter instead of
+    ffmpeg
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import starr.canvas
+    monkeypatch.setattr(starr.canvas, 'BufferWriter', StubWriter)
+    fig, axes = plt.subplots(figsize=(4, 4), dpi=50)
+    yield fig, axes
+    plt.close(fig)
@@ -0,0 +1,94 @@
+import numpy as np
+from starr.body_store import BodyStore
+from starr.object_factory import generate_object, clone
+
+
+def make_objects(n_objects):
+    objects = []
+    for i_obj in range(n_objects):
+        obj = generate_object({'shape': 'Circle', 'radius': 1.0,
+                               'graphics': False})
+        obj.position = np.array([3.*i_obj, 0.])
+        obj.physics.velocity = np.array([1., -0.5*i_obj])
+        objects.append(obj)
+    return objects
+
+def test_objects_are_views_into_the_store():
+    objects = make_objects(3)
+    store = BodyStore()
+    store.sync(objects)
+    objects[1].position = np.array([5., 6.])
+    np.testing.assert_array_equal(store.position[1], [5., 6.])
+    store.velocity[2] = [7., 8.]
+    np.testing.assert_array_equal(objects[2].physics.velocity, [7., 8.])
+
+def test_store_stays_consistent_after_clone_and_removal():
+    objects = make_objects(3)
+    image = clone(objects[1])
+    image.position = objects[1].position+np.array([20., 0.])
+    store = BodyStore()
+    store.sync(objects+[image])
+    # the clone shares the body (physics) of the object it was cloned from
+    assert len(store.bodies) == 3
+    assert store.object_body[3] == store.object_body[1]
+    store.velocity[store.object_body[1]] = [2., 3.]
+    np.testing.assert_array_equal(image.physics.velocity, [2., 3.])
+    store.integrate(0.5)
+    np.testing.assert_array_equal(image.position,
+                                  objects[1].position+[20., 0.])
+
+    store.sync([objects[0], objects[2]])
+    # the removed clone keeps its last state outside the store
+    assert image.store is None
+    np.testing.assert_array_equal(image.position, [24., 1.5])
+    # the remaining objects are re-indexed
+    assert [obj.store_index for obj in [objects[0], objects[2]]] == [0, 1]
+    np.testing.assert_array_equal(store.position,
+                                  [objects[0].position, objects[2].position])
+    objects[2].position = np.array([-1., -1.])
+    np.testing.assert_array_equal(store.position[1], [-1., -1.])
+
+def test_integrate_matches_per_object_kinematics():
+    objects = make_objects(4)
+    expected = make_objects(4)
+    for obj in objects+expected:
+        obj.physics.apply_force(np.array([0.25, 0.5]))
+    store = BodyStore()
+    store.sync(objects)
+    store.integrate(0.1)
+    for obj in expected:
+        obj.physics.update(obj, None, 0.1)
+    for obj, reference in zip(objects, expected):
+        np.testing.assert_allclose(obj.position, reference.position)
+        np.testing.assert_allclose(obj.physics.velocity,
+                                   reference.physics.velocity)
+        np.testing.assert_allclose(obj.physics.kinetic_energy,
+                                   reference.physics.kinetic_energy)
+
+def test_batched_impulses_match_pairwise_collisions():
+    from starr.physics_component import resolve_contacts
+    objects = make_objects(4)
+    wall = generate_object({'shape': 'Circle', 'radius': 1.0,
+                            'graphics': False})
+    wall.physics.mass = 1e21
+    wall.physics.static = True
+    objects[1].physics.mass = 3.
+    # body 0 touches two bodies and the static wall in the same step
+    contacts = [(0, 1, [1., 0.]), (0, 2, [0.6, 0.8]), (3, 2, [-1., 0.]),
+                (0, 4, [-0.8, -0.6])]
+    expected = make_objects(4)+[wall]
+    expected[1].physics.mass = 3.
+    for i_body, j_body, normal in contacts:
+        physics1 = expected[i_body].physics
+        physics2 = expected[j_body].physics
+        physics1.collision(physics2, np.array(normal))
+        physics2.collision(physics1, np.array(normal))
+
+    store = BodyStore()
+    store.sync(objects+[wall])
+    body1, body2, normal = zip(*contacts)
+    resolve_contacts(store, body1, body2, normal)
+    for i_body, obj in enumerate(expected):
+        np.testing.assert_allclose(store.acceleration[i_body],
+                                   obj.physics.acceleration, atol=1e-12)
+    np.testing.assert_array_equal(store.acceleration[4], [0., 0.])
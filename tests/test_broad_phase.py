@@ -0,0 +1,62 @@
+import numpy as np
+from starr.broad_phase import BruteForce, bounds_overlap, make_broad_phase
+
+
+def random_bounds(rng, n_objects, size=20.):
+    centers = rng.uniform(-size, size, (n_objects, 2))
+    half = rng.uniform(0.5, 2., (n_objects, 2))
+    return np.hstack([centers-half, centers+half])
+
+def overlapping_pairs(bounds):
+    """
+    reference result: all pairs of brute force whose boxes overlap
+    """
+    pairs = np.array(BruteForce().candidate_pairs(bounds))
+    pairs = pairs[bounds_overlap(bounds, pairs)]
+    return set(tuple(pair) for pair in pairs.tolist())
+
+def test_sweep_and_prune_matches_brute_force_while_moving():
+    rng = np.random.default_rng(0)
+    bounds = random_bounds(rng, 60)
+    velocity = rng.normal(0., 0.5, (60, 2))
+    broad_phase = make_broad_phase('sweep_and_prune')
+    spatial_hash = make_broad_phase('spatial_hash')
+    previous = set()
+    for i_step in range(50):
+        pairs = set(broad_phase.candidate_pairs(bounds))
+        expected = overlapping_pairs(bounds)
+        assert pairs == expected
+        assert set(spatial_hash.candidate_pairs(bounds)) == expected
+        assert broad_phase.added == expected-previous
+        assert broad_phase.removed == previous-expected
+        previous = expected
+        bounds = bounds+np.tile(velocity, 2)
+
+def test_sweep_and_prune_handles_new_objects_and_jumps():
+    rng = np.random.default_rng(1)
+    broad_phase = make_broad_phase('sweep_and_prune')
+    for n_objects in [10, 30, 30, 5]:
+        bounds = random_bounds(rng, n_objects)
+        keys = list(range(n_objects))
+        pairs = set(broad_phase.candidate_pairs(bounds, keys=keys))
+        assert pairs == overlapping_pairs(bounds)
+
+def test_sweep_and_prune_adds_pairs_which_come_to_touch():
+    broad_phase = make_broad_phase('sweep_and_prune')
+    assert broad_phase.candidate_pairs(np.array([[0., 0., 1., 1.],
+                                                 [2., 0., 3., 1.]])) == []
+    pairs = broad_phase.candidate_pairs(np.array([[0., 0., 1., 1.],
+                                                  [1., 0., 2., 1.]]))
+    assert pairs == [(0, 1)]
+    assert broad_phase.added == {(0, 1)}
+
+def test_sweep_and_prune_matches_brute_force_on_a_lattice():
+    # integer moves make boxes touch exactly on both axes
+    rng = np.random.default_rng(2)
+    corners = rng.integers(-10, 10, (40, 2)).astype(float)
+    broad_phase = make_broad_phase('sweep_and_prune')
+    for i_step in range(30):
+        bounds = np.hstack([corners, corners+2.])
+        assert set(broad_phase.candidate_pairs(bounds)) == \
+            overlapping_pairs(bounds)
+        corners += rng.integers(-1, 2, corners.shape)
@@ -0,0 +1,35 @@
+import os
+import stat
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from starr.canvas import BufferWriter
+
+
+def fake_ffmpeg(tmp_path):
+    """
+    executable standing in for ffmpeg, copies the piped frames to the output
+    file (the last argument)
+    """
+    path = tmp_path/'ffmpeg'
+    path.write_text('#!/bin/sh\nfor last; do :; done\ncat > "$last"\n')
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+def test_buffer_and_rendered_frames_go_to_the_pipe(tmp_path, monkeypatch):
+    monkeypatch.setitem(matplotlib.rcParams, 'animation.ffmpeg_path',
+                        fake_ffmpeg(tmp_path))
+    fig, axes = plt.subplots(figsize=(3.01, 3), dpi=50)
+    axes.plot([0, 1], [0, 1])
+    writer = BufferWriter(fps=10)
+    outfile = str(tmp_path/'movie.mp4')
+    writer.setup(fig, outfile, 50)
+    width, height = writer.frame_size
+    assert width % 2 == 0 and height % 2 == 0
+    fig.canvas.draw()
+    assert fig.canvas.get_width_height(physical=True) == writer.frame_size
+    writer.grab_frame()
+    writer.grab_frame(from_buffer=True)
+    writer.finish()
+    plt.close(fig)
+    assert os.path.getsize(outfile) == 2*width*height*4
@@ -0,0 +1,68 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.checkpoint import save_checkpoint, load_checkpoint
+
+SIM_KWS = {'min_steps': 10, 'max_steps': 10, 'time_step': 0.1,
+           'verbose': False}
+
+
+def make_simulation():
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(3)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.4,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    return sim, object_kws
+
+def assert_same_state(state1, state2):
+    assert state1['n_steps'] == state2['n_steps']
+    for key in ['position', 'rotation', 'velocity', 'group']:
+        np.testing.assert_array_equal(state1[key], state2[key])
+
+def test_save_load_keeps_the_state(tmp_path):
+    sim, object_kws = make_simulation()
+    sim.run(object_kws, SIM_KWS, seed=1)
+    path = str(tmp_path/'checkpoint.npz')
+    save_checkpoint(sim, path)
+    restored = load_checkpoint(path)
+    assert_same_state(sim.get_state(), restored.get_state())
+    assert restored.rng.getstate() == sim.rng.getstate()
+
+def test_resume_matches_an_uninterrupted_run(tmp_path):
+    sim, object_kws = make_simulation()
+    long_kws = dict(SIM_KWS, min_steps=20, max_steps=20)
+    uninterrupted = sim.run(object_kws, long_kws, seed=1)
+
+    sim, object_kws = make_simulation()
+    sim.run(object_kws, SIM_KWS, seed=1)
+    path = str(tmp_path/'checkpoint.npz')
+    save_checkpoint(sim, path)
+    restored = load_checkpoint(path)
+    resumed = restored.run(object_kws, long_kws, resume=True)
+    assert_same_state(uninterrupted, resumed)
+
+def test_restore_onto_a_canvas_and_draw(tmp_path, canvas_figure):
+    fig, axes = canvas_figure
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'},
+                     fig=fig, axes=axes, renderer='collection')
+    sim.set_seed(3)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.4,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    # recolor_groups sets RGBA tuples as colours
+    sim.run(object_kws, dict(SIM_KWS, min_steps=2, max_steps=2), seed=1)
+    path = str(tmp_path/'checkpoint.npz')
+    save_checkpoint(sim, path)
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(figsize=(4, 4), dpi=50)
+    restored = load_checkpoint(path, fig=fig, axes=axes,
+                               renderer='collection')
+    colors = [obj.graphics.color for obj in sim.all_objects()]
+    assert [obj.graphics.color for obj in restored.all_objects()] == [
+        tuple(float(value) for value in color) for color in colors]
+    restored.run(object_kws, dict(SIM_KWS, min_steps=4, max_steps=4),
+                 resume=True)
+    assert restored.canvas.writer.n_frames == 3
+    plt.close(fig)
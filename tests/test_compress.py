@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from starr.simulation import Simulation
+
+
+def make_disks(seed=1):
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(seed)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    return sim, object_kws
+
+def test_compress_event_driven_reaches_the_target_without_overlaps():
+    sim, object_kws = make_disks()
+    radius = sim.all_objects()[0].geometry.radius
+    sim.compress_event_driven(object_kws, {'target_density': 0.7,
+                                           'growth_rate': 0.02,
+                                           'frame_time': 1.0}, seed=1)
+    assert sim.density == pytest.approx(0.7)
+    assert sim.packing_fraction() == pytest.approx(0.7)
+    assert sim.all_objects()[0].geometry.radius > radius
+    assert sim.valid_configuration()
+
+def test_compress_event_driven_keeps_the_kinetic_energy():
+    sim, object_kws = make_disks()
+    engine = sim.compress_event_driven(object_kws, {'target_density': 0.6,
+                                                    'growth_rate': 0.02,
+                                                    'frame_time': 1.0},
+                                       seed=1)
+    energy = 0.5*np.sum(engine.mass*np.sum(engine.velocity**2, axis=1))
+    expected = 0.5*np.sum(engine.mass)*object_kws['velocity']**2
+    assert energy == pytest.approx(expected)
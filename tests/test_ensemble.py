@@ -0,0 +1,33 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.ensemble import run_ensemble, make_configurations
+
+OBJECT_KWS = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+              'velocity': 1.0}
+SIM_KWS = {'min_steps': 5, 'max_steps': 10, 'time_step': 0.1}
+
+
+def make_prototype():
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(11)
+    sim.make_objects(dict(OBJECT_KWS))
+    return sim
+
+def test_ensemble_runs_are_deterministic_per_seed():
+    prototype = make_prototype()
+    configurations = make_configurations([1, 2, 1], OBJECT_KWS, SIM_KWS)
+    pooled = run_ensemble(prototype, configurations, n_workers=2)
+    serial = run_ensemble(prototype, configurations, n_workers=1)
+    for key in ['position', 'velocity', 'n_steps', 'energy']:
+        np.testing.assert_array_equal(pooled[key], serial[key])
+    # the same seed gives the same run, whichever worker ran it
+    np.testing.assert_array_equal(pooled['position'][0],
+                                  pooled['position'][2])
+    assert not np.array_equal(pooled['velocity'][0], pooled['velocity'][1])
+
+def test_spawned_seeds_give_independent_runs():
+    prototype = make_prototype()
+    configurations = make_configurations([None, None], OBJECT_KWS, SIM_KWS)
+    results = run_ensemble(prototype, configurations, n_workers=1)
+    assert not np.array_equal(results['velocity'][0], results['velocity'][1])
@@ -0,0 +1,48 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.event_driven import EventDrivenEngine, LEFT, RIGHT, DOWN, UP
+
+
+def make_disks(seed=1):
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(seed)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    sim.init_velocity(object_kws)
+    return sim
+
+def kinetic_energy(engine):
+    return 0.5*np.sum(engine.mass*np.sum(engine.velocity**2, axis=1))
+
+def test_advance_leaves_no_overlaps():
+    sim = make_disks()
+    engine = EventDrivenEngine(sim.all_objects(), sim.world)
+    for end_time in np.linspace(1., 20., 20):
+        engine.advance(end_time)
+        engine.write_back()
+        for group in sim.object_groups:
+            group.update(0.0, sim.world, sim.canvas)
+        assert sim.valid_configuration()
+    assert engine.n_events > 0
+
+def test_elastic_collisions_conserve_energy():
+    sim = make_disks()
+    engine = EventDrivenEngine(sim.all_objects(), sim.world)
+    energy = kinetic_energy(engine)
+    engine.advance(200.)
+    assert engine.n_events > 1000
+    assert np.isclose(kinetic_energy(engine), energy, rtol=1e-10, atol=0.)
+
+def test_disks_stay_inside_the_walls():
+    sim = make_disks()
+    engine = EventDrivenEngine(sim.all_objects(), sim.world)
+    engine.advance(50.)
+    low = engine.position-engine.radius[:, None]
+    high = engine.position+engine.radius[:, None]
+    tolerance = 1e-9
+    assert np.all(low >= np.array([engine.walls[LEFT],
+                                   engine.walls[DOWN]])-tolerance)
+    assert np.all(high <= np.array([engine.walls[RIGHT],
+                                    engine.walls[UP]])+tolerance)
@@ -0,0 +1,43 @@
+import time
+import matplotlib.pyplot as plt
+from starr.simulation import Simulation
+from conftest import StubWriter
+
+
+class SlowWriter(StubWriter):
+    """
+    stub writer slower than the physics, so the render thread falls behind
+    """
+
+    def grab_frame(self, from_buffer=False, **savefig_kwargs):
+        time.sleep(0.01)
+        super().grab_frame(from_buffer, **savefig_kwargs)
+
+
+def test_async_frames_are_drawn_or_counted_as_dropped(canvas_figure,
+                                                      monkeypatch):
+    import starr.canvas
+    monkeypatch.setattr(starr.canvas, 'BufferWriter', SlowWriter)
+    fig, axes = canvas_figure
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'},
+                     fig=fig, axes=axes, renderer='collection')
+    sim.set_seed(2)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'n_particles': 4,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    # the report must go to the simulation axes, not the current pyplot axes
+    other_fig, other_axes = plt.subplots()
+    sim_kws = {'min_steps': 60, 'max_steps': 60, 'time_step': 0.1,
+               'verbose': False, 'async_frames': True}
+    state = sim.run(object_kws, sim_kws, seed=1)
+    plt.close(other_fig)
+    writer = sim.canvas.writer
+    assert writer.finished
+    assert state['frames_dropped'] > 0
+    assert state['frames_published']+state['frames_dropped'] == state['n_steps']
+    assert state['frames_drawn'] == state['frames_published']
+    # one frame is written before the pipeline starts
+    assert writer.n_frames == state['frames_drawn']+1
+    assert len(axes.texts) > 0
+    assert len(other_axes.texts) == 0
@@ -0,0 +1,121 @@
+import numpy as np
+import shapely
+from starr.object_factory import generate_object
+from starr.geometry_array import materialize
+
+
+def rectangle(position, rotation):
+    obj = generate_object({'shape': 'Rectangle', 'side_length_a': 2.,
+                           'side_length_b': 1., 'graphics': False})
+    obj.position = np.array(position, dtype=float)
+    obj.rotation = rotation
+    obj.geometry.update(obj)
+    return obj
+
+def test_polygons_are_built_on_demand():
+    obj = rectangle([1., 2.], 0.)
+    for i_step in range(10):
+        obj.translate(np.array([0.5, 0.]))
+        obj.geometry.update(obj)
+        assert obj.geometry._polygon is None
+    # bounds of unrotated shapes do not need the polygon either
+    np.testing.assert_allclose(obj.geometry.bounds(), [5., 1.5, 7., 2.5])
+    assert obj.geometry._polygon is None
+    np.testing.assert_allclose(obj.geometry.polygon.bounds,
+                               [5., 1.5, 7., 2.5])
+
+def test_rotations_do_not_drift():
+    obj = rectangle([3., -1.], 0.)
+    start = shapely.get_coordinates(obj.geometry.polygon)
+    for i_step in range(36):
+        obj.rotate(10.)
+        obj.geometry.update(obj)
+        obj.geometry.polygon
+    quarter = rectangle([3., -1.], 90.)
+    np.testing.assert_allclose(
+        shapely.get_coordinates(obj.geometry.polygon), start, atol=1e-12)
+    np.testing.assert_allclose(quarter.geometry.polygon.bounds,
+                               [2.5, -2., 3.5, 0.], atol=1e-12)
+
+def test_materialize_matches_single_polygons():
+    rng = np.random.default_rng(3)
+    objects = [rectangle(rng.uniform(-5., 5., size=2),
+                         rng.uniform(0., 360.)) for i_obj in range(5)]
+    expected = [shapely.get_coordinates(obj.geometry.polygon)
+                for obj in objects]
+    for obj in objects:
+        obj.geometry._polygon = None
+    polygons = materialize([obj.geometry for obj in objects])
+    for polygon, coords in zip(polygons, expected):
+        np.testing.assert_allclose(shapely.get_coordinates(polygon), coords,
+                                   atol=1e-12)
+
+def test_circle_resolution_meets_the_tolerance():
+    from starr.geometry_component import Circle, circle_resolution
+    for radius in [0.5, 1., 4.]:
+        for tolerance in [1e-3, 1e-2, 0.1]:
+            circle = Circle(radius, circle_resolution(radius, tolerance))
+            # the largest deviation is at the middle of the edges
+            coords = shapely.get_coordinates(circle.local_polygon)
+            middles = 0.5*(coords[1:]+coords[:-1])
+            deviation = radius-np.min(np.linalg.norm(middles, axis=1))
+            assert deviation <= tolerance
+    assert circle_resolution(1., 0.1) < circle_resolution(10., 0.1)
+    # large circles at a fine tolerance are capped
+    assert circle_resolution(20., 1e-3) == 64
+
+def test_circle_resolution_adapts_to_the_radius():
+    from starr.simulation import Simulation
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'},
+                     circle_tolerance=0.01)
+    object_kws = {'shape': 'Circle', 'radius': [0.5, 1., 2.],
+                  'n_particles': 3, 'velocity': 1.0}
+    sim.make_objects(object_kws, group_objects=True)
+    resolutions = [obj.geometry.resolution for obj in sim.all_objects()]
+    assert resolutions[0] < resolutions[1] < resolutions[2]
+
+def test_circle_runs_never_build_polygons():
+    from starr.simulation import Simulation
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    object_kws = {'shape': 'Circle', 'radius': 1.5, 'n_particles': 4,
+                  'velocity': 5.0}
+    sim.make_objects(object_kws)
+    for i_obj, obj in enumerate(sim.all_objects()):
+        obj.position = np.array([4.*i_obj-6., 0.])
+        obj.geometry.update(obj)
+    state = sim.run(object_kws, {'min_steps': 30, 'max_steps': 30,
+                                 'time_step': 0.1, 'verbose': False}, seed=2)
+    # the circles collided with each other and with the walls
+    assert not np.allclose(np.linalg.norm(state['velocity'], axis=1), 5.)
+    for obj in sim.all_objects():
+        assert obj.geometry._local_polygon is None
+        assert obj.geometry._polygon is None
+
+def reference_normal(polygon, point):
+    """
+    normal of the closest edge, found one shapely segment at a time
+    """
+    coords = np.asarray(polygon.exterior.coords)
+    distances = [shapely.LineString([coords[i], coords[i+1]]).distance(
+        shapely.Point(point)) for i in range(len(coords)-1)]
+    start, end = coords[np.argmin(distances)], coords[np.argmin(distances)+1]
+    direction = (end-start)/np.linalg.norm(end-start)
+    return np.array([-direction[1], direction[0]])
+
+def test_edge_normals_match_a_per_segment_search():
+    from starr.geometry_component import closest_edge_normals
+    rng = np.random.default_rng(8)
+    objects = [rectangle(rng.uniform(-5., 5., size=2),
+                         rng.uniform(0., 360.)) for i_obj in range(6)]
+    points = np.array([obj.position+rng.uniform(-1.5, 1.5, size=2)
+                       for obj in objects])
+    expected = [reference_normal(obj.geometry.polygon, point)
+                for obj, point in zip(objects, points)]
+    for obj, point, normal in zip(objects, points, expected):
+        np.testing.assert_allclose(obj.geometry.get_normal(point), normal,
+                                   atol=1e-12)
+    polygons = np.array([obj.geometry.polygon for obj in objects])
+    np.testing.assert_allclose(closest_edge_normals(polygons, points),
+                               expected, atol=1e-12)
@@ -0,0 +1,51 @@
+"""
+Simulation.run without fig and axes: no graphics components, no plotting
+modules and the final state and diagnostics returned as arrays
+"""
+
+import os
+import subprocess
+import sys
+import numpy as np
+from starr.simulation import Simulation
+
+HEADLESS_SCRIPT = """
+import sys
+from starr.simulation import Simulation
+sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                  'side_length_b': 20., 'boundary_type': 'Physical'})
+object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+              'velocity': 1.0}
+sim.make_objects(object_kws)
+sim.run(object_kws, {'min_steps': 5, 'max_steps': 5, 'time_step': 0.1,
+                     'verbose': False}, seed=1)
+print(",".join(name for name in ("matplotlib", "descartes")
+               if name in sys.modules))
+"""
+
+
+def test_headless_run_skips_graphics():
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    object_kws = {'shape': 'Rectangle', 'side_length_a': 1.,
+                  'side_length_b': 2., 'n_particles': 6, 'velocity': 1.0}
+    sim.make_objects(object_kws)
+    assert sim.canvas is None
+    assert all(obj.graphics is None for obj in sim.all_objects())
+    state = sim.run(object_kws, {'min_steps': 5, 'max_steps': 5,
+                                 'time_step': 0.1, 'verbose': False}, seed=1)
+    assert state['position'].shape == (6, 2)
+    assert state['velocity'].shape == (6, 2)
+    assert state['n_steps'] == 6
+    for key in ['energy', 'max_velocity', 'time_step']:
+        assert isinstance(state[key], np.ndarray)
+        assert state[key].shape == (6,)
+    assert state['momentum'].shape == (6, 2)
+
+def test_headless_run_does_not_load_plotting_modules():
+    # a fresh interpreter, the test session may have loaded matplotlib
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, "-c", HEADLESS_SCRIPT], env=env,
+                            check=True, capture_output=True,
+                            text=True).stdout
+    assert output.strip() == ""
@@ -0,0 +1,30 @@
+"""
+import time regression check: importing starr and its simulation modules
+must not load the plotting modules, these are only needed once a Canvas or
+GraphicsComponent is used
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+HEAVY_MODULES = ("matplotlib", "descartes")
+
+IMPORT_SCRIPT = """
+import sys
+import {module}
+print(",".join(name for name in {heavy} if name in sys.modules))
+"""
+
+
+@pytest.mark.parametrize("module", ["starr", "starr.simulation",
+                                    "starr.event_driven"])
+def test_import_skips_plotting(module):
+    # a fresh interpreter, the test session may have loaded matplotlib
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], env=env,
+                            check=True, capture_output=True,
+                            text=True).stdout
+    assert output.strip() == ""
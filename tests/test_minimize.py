@@ -0,0 +1,84 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.minimize import FireMinimizer
+
+
+def make_overlapping_grid(spacing=1.6):
+    """
+    disks of radius 1 on a square lattice closer than their diameter
+    """
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 40.,
+                      'side_length_b': 40., 'boundary_type': 'Physical'})
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'n_particles': 49,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    for i_group, group in enumerate(sim.object_groups):
+        group.objects[0].position = spacing*np.array(
+            [i_group % 7-3., i_group//7-3.])
+        group.update(0.0, sim.world, sim.canvas)
+    return sim
+
+def grid_minimizer():
+    positions = 1.6*np.stack(np.meshgrid(np.arange(7.)-3., np.arange(7.)-3.),
+                             axis=-1).reshape(-1, 2)
+    return FireMinimizer(positions, np.zeros((49, 2)), np.ones(49),
+                         walls=np.array([-20., -20., 20., 20.]))
+
+def test_overlapping_grid_becomes_valid():
+    sim = make_overlapping_grid()
+    assert not sim.valid_configuration()
+    result = sim.minimize_overlaps()
+    assert result['max_overlap'] < 1e-3
+    assert result['valid']
+    assert sim.valid_configuration()
+
+def test_first_step_keeps_the_initial_time_step():
+    minimizer = grid_minimizer()
+    forces, max_overlap = minimizer.forces()
+    minimizer.step(forces)
+    assert minimizer.time_step == 0.1
+    assert minimizer.n_positive == 0
+    assert np.any(minimizer.velocity != 0.)
+
+def test_energy_does_not_increase_over_accepted_steps():
+    minimizer = grid_minimizer()
+    forces, max_overlap = minimizer.forces()
+    energy = minimizer.energy
+    start = energy
+    for iteration in range(300):
+        minimizer.step(forces)
+        forces, max_overlap = minimizer.forces()
+        # a step is rejected (velocity reset) if it went uphill
+        uphill = np.sum(forces*minimizer.velocity) < 0.
+        if not uphill:
+            assert minimizer.energy <= energy*(1.+1e-12)
+        energy = minimizer.energy
+        if max_overlap < minimizer.tolerance:
+            break
+    assert energy < 1e-3*start
+
+def test_compress_minimized_reaches_the_target_without_overlaps():
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(1)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    state = sim.compress_minimized({'target_density': 0.7, 'growth': 0.02,
+                                    'max_steps': 1000})
+    assert np.isclose(state['density'], 0.7)
+    assert np.isclose(sim.packing_fraction(), state['density'])
+    assert state['valid']
+
+def test_compress_minimized_stops_when_jammed():
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'})
+    sim.set_seed(1)
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'target_density': 0.3,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    state = sim.compress_minimized({'target_density': 0.99, 'growth': 0.02,
+                                    'max_steps': 1000})
+    assert 0.7 < state['density'] < 0.91
+    assert state['n_steps'] < 1000
+    assert state['valid']
@@ -0,0 +1,47 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.multi_rate import MultiRateStepper
+
+
+def make_sparse_disks(seed=2):
+    """
+    disks on a wide lattice in the middle of a large world, they do not
+    reach each other or the walls over the test
+    """
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 200.,
+                      'side_length_b': 200., 'boundary_type': 'Physical'})
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'n_particles': 16,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    for i_group, group in enumerate(sim.object_groups):
+        group.objects[0].position = np.array([20.*(i_group % 4)-30.,
+                                              20.*(i_group//4)-30.])
+        group.update(0.0, sim.world, sim.canvas)
+    sim.set_seed(seed)
+    sim.init_velocity(object_kws)
+    # a spread of speeds, some groups at rest
+    for i_group, group in enumerate(sim.object_groups):
+        physics = group.objects[0].physics
+        physics.velocity = physics.velocity*(i_group % 4)/2.
+    return sim
+
+def test_multi_rate_matches_fixed_steps_without_contacts():
+    max_level = 3
+    time_step = 0.25
+    n_blocks = 4
+    fixed = make_sparse_disks()
+    for i_step in range(n_blocks*2**max_level):
+        fixed.calculate_collisions()
+        fixed.update_groups(time_step)
+
+    multi_rate = make_sparse_disks()
+    stepper = MultiRateStepper(multi_rate, max_level=max_level)
+    for i_block in range(n_blocks):
+        stepper.advance(time_step*2**max_level)
+
+    np.testing.assert_allclose(multi_rate.get_state()['position'],
+                               fixed.get_state()['position'], atol=1e-9)
+    np.testing.assert_array_equal(multi_rate.get_state()['velocity'],
+                                  fixed.get_state()['velocity'])
+    # isolated groups take a single step per block
+    assert stepper.n_updates == n_blocks*len(multi_rate.object_groups)
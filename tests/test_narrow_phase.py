@@ -0,0 +1,114 @@
+import numpy as np
+from starr.simulation import Simulation
+from starr.narrow_phase import BatchNarrowPhase, get_contact, overlaps
+
+SIM_KWS = {'min_steps': 20, 'max_steps': 20, 'time_step': 0.1,
+           'verbose': False}
+
+
+def rotated_rectangles(spacing, vectorized=False):
+    """
+    rotated rectangles on a grid with spacing, close enough for polygon
+    contacts with each other and with the buffer of the world (bodies
+    overlapping several others at once gain energy, so the runs use wider
+    spacings)
+    """
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Physical'},
+                     vectorized=vectorized)
+    sim.set_seed(4)
+    object_kws = {'shape': 'Rectangle', 'side_length_a': 3.,
+                  'side_length_b': 1.5, 'n_particles': 10, 'velocity': 1.0}
+    sim.make_objects(object_kws)
+    rng = np.random.default_rng(7)
+    for i_obj, obj in enumerate(sim.all_objects()):
+        obj.position = spacing*np.array([i_obj % 5-2., i_obj//5-0.5])
+        obj.rotation = rng.uniform(0., 180.)
+        obj.geometry.update(obj)
+    return sim, object_kws
+
+def assert_same_contacts(contacts1, contacts2):
+    assert len(contacts1) == len(contacts2)
+    for contact1, contact2 in zip(contacts1, contacts2):
+        assert (contact1 is None) == (contact2 is None)
+        if contact1 is None:
+            continue
+        for value1, value2 in zip(contact1, contact2):
+            np.testing.assert_allclose(value1, value2, atol=1e-12)
+
+def test_batch_contacts_match_pairwise_contacts():
+    sim, object_kws = rotated_rectangles(2.8)
+    pairs = [(obj1.geometry, obj2.geometry) for obj1, obj2
+             in sim.collision_candidates()]
+    expected = [get_contact(geo1, geo2) for geo1, geo2 in pairs]
+    assert sum(contact is not None for contact in expected) > 0
+    for n_threads in [1, 3]:
+        narrow_phase = BatchNarrowPhase(n_threads=n_threads)
+        assert_same_contacts(narrow_phase.contacts(pairs), expected)
+        np.testing.assert_array_equal(
+            narrow_phase.overlaps(pairs),
+            [overlaps(geo1, geo2) for geo1, geo2 in pairs])
+
+def test_vectorized_run_matches_scalar_run():
+    states = []
+    for vectorized in [False, True]:
+        sim, object_kws = rotated_rectangles(3.2, vectorized=vectorized)
+        states.append(sim.run(object_kws, SIM_KWS, seed=1))
+    for key in ['position', 'rotation', 'velocity', 'energy']:
+        np.testing.assert_allclose(states[0][key], states[1][key],
+                                   rtol=1e-9, atol=1e-9)
+
+def test_analytic_circle_contacts():
+    from starr.world import World
+    from starr.object_factory import generate_object
+    world = World({'shape': 'Rectangle', 'side_length_a': 20.,
+                   'side_length_b': 20., 'boundary_type': 'Physical'})
+    circle = generate_object({'shape': 'Circle', 'radius': 1.0,
+                              'graphics': False})
+    box = generate_object({'shape': 'Rectangle', 'side_length_a': 2.,
+                           'side_length_b': 4., 'graphics': False})
+    circle.position = np.array([9.5, 3.])
+    circle.geometry.update(circle)
+    box.position = np.array([7.75, 4.])
+    box.geometry.update(box)
+    # circle reaching 0.5 into the right wall, normal into the wall
+    depth, point, normal = get_contact(circle.geometry,
+                                       world.buffer.geometry)
+    assert np.isclose(depth, 0.5)
+    np.testing.assert_allclose(normal, [1., 0.], atol=1e-12)
+    # circle reaching 0.25 into the box on its left
+    depth, point, normal = get_contact(circle.geometry, box.geometry)
+    assert np.isclose(depth, 0.25)
+    np.testing.assert_allclose(normal, [-1., 0.], atol=1e-12)
+    depth, point, normal = get_contact(box.geometry, circle.geometry)
+    np.testing.assert_allclose(normal, [1., 0.], atol=1e-12)
+    assert circle.geometry._local_polygon is None
+
+def test_polygon_normals_do_not_depend_on_the_order():
+    from starr.world import World
+    from starr.object_factory import generate_object
+    world = World({'shape': 'Rectangle', 'side_length_a': 20.,
+                   'side_length_b': 20., 'boundary_type': 'Physical'})
+    pairs = []
+    for position, rotation in [([9.6, 2.], 30.), ([-3., -9.4], 80.),
+                               ([-9.5, 9.5], 45.)]:
+        box = generate_object({'shape': 'Rectangle', 'side_length_a': 2.,
+                               'side_length_b': 1., 'graphics': False})
+        box.position = np.array(position)
+        box.rotation = rotation
+        box.geometry.update(box)
+        pairs.append((box.geometry, world.buffer.geometry))
+    swapped = [(geo2, geo1) for geo1, geo2 in pairs]
+    for narrow_phase in [None, BatchNarrowPhase()]:
+        if narrow_phase is None:
+            contacts = [get_contact(*pair) for pair in pairs]
+            swapped_contacts = [get_contact(*pair) for pair in swapped]
+        else:
+            contacts = narrow_phase.contacts(pairs)
+            swapped_contacts = narrow_phase.contacts(swapped)
+        for (geo1, geo2), contact, swapped_contact in zip(
+                pairs, contacts, swapped_contacts):
+            # from the box into the wall, away from the world centre
+            assert np.dot(contact[2], geo1._position) > 0.
+            # from the buffer towards the box
+            assert np.dot(swapped_contact[2], geo1._position) < 0.
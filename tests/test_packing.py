@@ -0,0 +1,40 @@
+import numpy as np
+from starr.simulation import Simulation
+
+
+def make_packing(target_density, max_failures=10000, shape_kws=None):
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 30.,
+                      'side_length_b': 30., 'boundary_type': 'Physical'},
+                     broad_phase='spatial_hash')
+    sim.set_seed(5)
+    if shape_kws is None:
+        shape_kws = {'shape': 'Circle', 'radius': 1.0}
+    object_kws = dict(shape_kws, target_density=target_density,
+                      velocity=1.0, max_failures=max_failures)
+    sim.make_objects(object_kws)
+    return sim
+
+def created_density(sim):
+    area = sum(obj.geometry.area() for obj in sim.all_objects())
+    return area/sim.world.boundary.geometry.area()
+
+def test_packing_reaches_the_target_without_overlaps():
+    sim = make_packing(0.3)
+    assert sim.valid_configuration()
+    assert sim.n_particles == len(sim.all_objects())
+    assert sim.density >= 0.3
+    assert np.isclose(sim.density, created_density(sim))
+
+def test_packing_of_rectangles_has_no_overlaps():
+    sim = make_packing(0.3, shape_kws={'shape': 'Rectangle',
+                                       'side_length_a': 2.,
+                                       'side_length_b': 1.})
+    assert sim.valid_configuration()
+    assert np.isclose(sim.density, created_density(sim))
+
+def test_packing_stops_at_jamming():
+    sim = make_packing(0.9, max_failures=2000)
+    assert sim.valid_configuration()
+    # the jamming limit of random sequential adsorption of disks is 0.547
+    assert 0.4 < sim.density < 0.56
+    assert np.isclose(sim.density, created_density(sim))
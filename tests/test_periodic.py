@@ -0,0 +1,56 @@
+import numpy as np
+from starr.simulation import Simulation
+
+
+def crossing_circles(minimum_image):
+    """
+    circles which collide with the periodic images of circles crossing the
+    right and the upper side of the box
+    """
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 20., 'boundary_type': 'Periodic',
+                      'minimum_image': minimum_image})
+    object_kws = {'shape': 'Circle', 'radius': 1.0, 'n_particles': 4,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    positions = [[9.2, 0.], [-8.7, 0.3], [2., 9.4], [1.5, -8.5]]
+    velocities = [[1., 0.], [0., 0.], [0., 1.], [0., -0.5]]
+    for obj, position, velocity in zip(sim.all_objects(), positions,
+                                       velocities):
+        obj.position = np.array(position)
+        obj.geometry.update(obj)
+        obj.physics.velocity = np.array(velocity)
+    sim.world.update(sim.object_groups)
+    return sim
+
+def group_state(sim):
+    """
+    position (wrapped into the box) and velocity of every group
+    """
+    position = np.array([np.mod(group.objects[0].position+10., 20.)-10.
+                         for group in sim.object_groups])
+    velocity = np.array([group.objects[0].physics.velocity
+                         for group in sim.object_groups])
+    return position, velocity
+
+def test_minimum_image_matches_clone_mode():
+    states = []
+    for minimum_image in [False, True]:
+        sim = crossing_circles(minimum_image)
+        n_objects = []
+        for i_step in range(40):
+            sim.calculate_collisions()
+            sim.update_groups(0.1)
+            sim.world.update(sim.object_groups)
+            n_objects.append(len(sim.all_objects()))
+        if minimum_image:
+            assert max(n_objects) == 4
+        else:
+            assert max(n_objects) > 4
+        states.append(group_state(sim))
+    (position1, velocity1), (position2, velocity2) = states
+    # the circles collided across the boundary
+    assert not np.allclose(velocity1[1], 0.)
+    assert not np.allclose(velocity1[3], [0., -0.5])
+    np.testing.assert_allclose(velocity1, velocity2, atol=1e-12)
+    np.testing.assert_allclose(position1, position2, atol=1e-9)
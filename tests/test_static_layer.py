@@ -0,0 +1,57 @@
+import numpy as np
+import shapely
+from starr.simulation import Simulation
+
+
+def obstacle_field():
+    """
+    a world with a 6 by 6 field of posts
+    """
+    posts = [{'shape': 'Circle', 'radius': 0.5, 'position': [x, y]}
+             for x in np.linspace(-10., 10., 6)
+             for y in np.linspace(-10., 10., 6)]
+    return Simulation({'shape': 'Rectangle', 'side_length_a': 30.,
+                       'side_length_b': 30., 'boundary_type': 'Physical',
+                       'obstacles': posts})
+
+def test_query_matches_testing_every_static_object():
+    sim = obstacle_field()
+    layer = sim.world.static_layer
+    assert len(sim.world.obstacles()) == 36
+    rng = np.random.default_rng(6)
+    corners = rng.uniform(-16., 15., size=(500, 2))
+    bounds = np.concatenate([corners, corners+rng.uniform(0.1, 2., size=(500, 2))],
+                            axis=1)
+    boxes = shapely.box(*bounds.T)
+    expected = {(i_box, i_static)
+                for i_box, box in enumerate(boxes)
+                for i_static, obj in enumerate(layer.objects)
+                if obj.geometry.polygon.intersects(box)}
+    found = set(map(tuple, layer.query(bounds).tolist()))
+    assert len(found) > 0
+    assert found == expected
+
+def test_objects_in_the_interior_are_not_candidates():
+    sim = obstacle_field()
+    object_kws = {'shape': 'Circle', 'radius': 0.5, 'n_particles': 3,
+                  'velocity': 1.0}
+    sim.make_objects(object_kws)
+    objects = sim.all_objects()
+    # free space, touching a post and touching the buffer
+    for obj, position in zip(objects, [[-4., -4.], [-2.5, 2.], [14.8, 1.]]):
+        obj.position = np.array(position)
+        obj.geometry.update(obj)
+    static_pairs = [(obj1, obj2) for obj1, obj2 in sim.collision_candidates()
+                    if obj2.physics.static]
+    assert [objects.index(obj1) for obj1, obj2 in static_pairs] == [1, 2]
+    assert static_pairs[1][1] is sim.world.buffer
+
+def test_packing_avoids_obstacles():
+    sim = obstacle_field()
+    sim.set_seed(1)
+    sim.make_objects({'shape': 'Circle', 'radius': 0.5,
+                      'target_density': 0.3, 'velocity': 1.0})
+    for obj1, obj2 in sim.collision_candidates():
+        if obj2.physics.static:
+            assert not obj1.geometry.polygon.intersects(
+                obj2.geometry.polygon)
@@ -0,0 +1,42 @@
+import numpy as np
+from starr.simulation import Simulation
+
+
+def fast_body_and_thin_wall(shape_kws):
+    """
+    a body moving at 20 towards a wall of thickness 0.2 three units away
+    """
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 40.,
+                      'side_length_b': 40., 'boundary_type': 'Physical',
+                      'obstacles': [{'shape': 'Rectangle',
+                                     'side_length_a': 0.2,
+                                     'side_length_b': 30.,
+                                     'position': [0., 0.]}]})
+    object_kws = dict(shape_kws, n_particles=1, velocity=20.)
+    sim.make_objects(object_kws)
+    obj = sim.all_objects()[0]
+    obj.position = np.array([-3., 0.5])
+    obj.geometry.update(obj)
+    obj.physics.velocity = np.array([20., 0.])
+    return sim, obj
+
+def test_large_step_tunnels_without_time_of_impact():
+    sim, obj = fast_body_and_thin_wall({'shape': 'Rectangle',
+                                        'side_length_a': 1.,
+                                        'side_length_b': 1.})
+    sim.calculate_collisions()
+    sim.update_groups(0.5)
+    assert obj.position[0] > 0.
+
+def test_time_of_impact_stops_fast_bodies_at_a_thin_wall():
+    for shape_kws in [{'shape': 'Rectangle', 'side_length_a': 1.,
+                       'side_length_b': 1.},
+                      {'shape': 'Circle', 'radius': 0.5}]:
+        sim, obj = fast_body_and_thin_wall(shape_kws)
+        sim.advance_to_impacts(0.5)
+        assert obj.position[0] < -0.5
+        assert obj.physics.velocity[0] < 0.
+        # back and forth between the thin wall and the world boundary
+        for i_step in range(10):
+            sim.advance_to_impacts(0.5)
+            assert -20. < obj.position[0] < -0.5
@@ -0,0 +1,83 @@
+import numpy as np
+from starr.trajectory import TrajectoryWriter, TrajectoryReader, DIAGNOSTICS
+from starr.simulation import Simulation
+from starr.checkpoint import load_checkpoint
+
+
+def step_values(i_step, n_groups):
+    values = {'position': np.full((n_groups, 2), i_step, dtype=float),
+              'velocity': np.full((n_groups, 2), -i_step, dtype=float),
+              'rotation': np.arange(n_groups)+i_step}
+    for name in DIAGNOSTICS:
+        values[name] = 0.5*i_step
+    return values
+
+def write_steps(writer, steps, n_groups):
+    for i_step in steps:
+        writer.append(step_values(i_step, n_groups))
+
+def test_chunks_are_flushed_and_read_back(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path), 3, chunk_steps=4)
+    write_steps(writer, range(10), 3)
+    # two full chunks are on disk, the rest is buffered
+    assert writer.chunks == [[0, 4], [4, 4]]
+    assert len(TrajectoryReader(str(tmp_path))) == 8
+    writer.close()
+    reader = TrajectoryReader(str(tmp_path))
+    assert len(reader) == 10
+    assert reader.index['chunks'] == [[0, 4], [4, 4], [8, 2]]
+    assert isinstance(reader['position'], np.memmap)
+    for i_step in range(10):
+        for name, value in step_values(i_step, 3).items():
+            np.testing.assert_array_equal(reader[name][i_step], value)
+    np.testing.assert_array_equal(reader['energy'], 0.5*np.arange(10))
+
+def test_resume_cuts_off_later_steps_and_appends(tmp_path):
+    writer = TrajectoryWriter(str(tmp_path), 2, chunk_steps=4)
+    write_steps(writer, range(10), 2)
+    writer.close()
+    writer = TrajectoryWriter(str(tmp_path), 2, chunk_steps=4,
+                              resume_steps=6)
+    write_steps(writer, range(100, 103), 2)
+    writer.close()
+    reader = TrajectoryReader(str(tmp_path))
+    assert len(reader) == 9
+    assert reader.index['chunks'] == [[0, 4], [4, 2], [6, 3]]
+    np.testing.assert_array_equal(reader['time'],
+                                  0.5*np.array([0, 1, 2, 3, 4, 5,
+                                                100, 101, 102]))
+
+def test_resumed_run_continues_the_trajectory(tmp_path):
+    def make_simulation():
+        sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                          'side_length_b': 20.,
+                          'boundary_type': 'Physical'})
+        sim.set_seed(3)
+        object_kws = {'shape': 'Circle', 'radius': 1.0,
+                      'target_density': 0.4, 'velocity': 1.0}
+        sim.make_objects(object_kws)
+        return sim, object_kws
+
+    sim_kws = {'min_steps': 12, 'max_steps': 12, 'time_step': 0.1,
+               'verbose': False, 'trajectory_chunk_steps': 4}
+    sim, object_kws = make_simulation()
+    sim.run(object_kws, dict(sim_kws, trajectory=str(tmp_path/'full')),
+            seed=1)
+
+    # interrupted after the checkpoint of step 5
+    interrupted_kws = dict(sim_kws, trajectory=str(tmp_path/'resumed'),
+                           checkpoint_every=5,
+                           checkpoint_path=str(tmp_path/'checkpoint.npz'))
+    sim, object_kws = make_simulation()
+    sim.run(object_kws, dict(interrupted_kws, min_steps=7, max_steps=7),
+            seed=1)
+    restored = load_checkpoint(str(tmp_path/'checkpoint.npz'))
+    assert restored.i_step == 5
+    restored.run(object_kws, dict(interrupted_kws, checkpoint_every=100),
+                 resume=True)
+
+    full = TrajectoryReader(str(tmp_path/'full'))
+    resumed = TrajectoryReader(str(tmp_path/'resumed'))
+    assert len(resumed) == len(full) == 13
+    for name in ['position', 'velocity', 'energy']:
+        np.testing.assert_array_equal(resumed[name], full[name])
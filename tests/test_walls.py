@@ -0,0 +1,55 @@
+import numpy as np
+from starr.simulation import Simulation
+
+SIM_KWS = {'min_steps': 40, 'max_steps': 40, 'time_step': 0.1,
+           'verbose': False}
+
+
+def walled_simulation(analytic_walls, shape_kws, positions):
+    sim = Simulation({'shape': 'Rectangle', 'side_length_a': 20.,
+                      'side_length_b': 16., 'boundary_type': 'Physical',
+                      'analytic_walls': analytic_walls})
+    object_kws = dict(shape_kws, n_particles=len(positions), velocity=4.0)
+    sim.make_objects(object_kws)
+    for obj, position in zip(sim.all_objects(), positions):
+        obj.position = np.array(position, dtype=float)
+        obj.geometry.update(obj)
+    return sim, object_kws
+
+def wall_contacts(sim):
+    pairs = [(obj1, obj2) for obj1, obj2 in sim.collision_candidates()
+             if obj2 is sim.world.buffer]
+    index = [sim.all_objects().index(obj1) for obj1, obj2 in pairs]
+    return index, sim.find_contacts(pairs)
+
+# inside, reaching into the left, right, bottom and top wall
+POSITIONS = [[0., 0.], [-9.4, 1.], [9.7, -2.], [3., -7.6], [-4., 7.9]]
+
+def test_analytic_wall_contacts_match_buffer_contacts():
+    for shape_kws in [{'shape': 'Circle', 'radius': 1.0},
+                      {'shape': 'Rectangle', 'side_length_a': 2.,
+                       'side_length_b': 1.}]:
+        results = [wall_contacts(walled_simulation(analytic_walls, shape_kws,
+                                                   POSITIONS)[0])
+                   for analytic_walls in [False, True]]
+        (index1, contacts1), (index2, contacts2) = results
+        assert sorted(index1) == sorted(index2) == [1, 2, 3, 4]
+        contacts1 = dict(zip(index1, contacts1))
+        for i_obj, contact in zip(index2, contacts2):
+            np.testing.assert_allclose(contact[2], contacts1[i_obj][2],
+                                       atol=1e-9)
+            if shape_kws['shape'] == 'Circle':
+                # exact for circles, the polygon depth is an estimate
+                assert np.isclose(contact[0], contacts1[i_obj][0])
+
+def test_analytic_wall_runs_match_buffer_runs():
+    states = []
+    for analytic_walls in [False, True]:
+        sim, object_kws = walled_simulation(
+            analytic_walls, {'shape': 'Circle', 'radius': 1.0},
+            [[-5., -3.], [0., 0.], [5., 3.], [-5., 3.]])
+        states.append(sim.run(object_kws, SIM_KWS, seed=3))
+    # the circles bounced off the walls
+    assert not np.allclose(np.linalg.norm(states[0]['velocity'], axis=1), 4.)
+    for key in ['position', 'velocity']:
+        np.testing.assert_allclose(states[0][key], states[1][key], atol=1e-9)